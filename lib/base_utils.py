@@ -26,25 +26,39 @@ Update time: 2021-02-13 10:06:58.
 # --------Import modules--------------
 from __future__ import print_function
 import re
-import copy
 import warnings
+import functools
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import json
+import contextlib
+import contextvars
+from collections.abc import Mapping
 import numpy as np
 import matplotlib
-import matplotlib.pyplot as plt
 from matplotlib.colors import Normalize
-from matplotlib import ticker
-from matplotlib.pyplot import MaxNLocator
 from matplotlib.colors import LinearSegmentedColormap
-import matplotlib.colorbar as mcbar
 from matplotlib import colors
-from gplot.lib import modplot
+# NOTE: pyplot, colorbar, font and backend modules, scipy, basemap, cartopy
+# and the netcdf interfaces are imported when first used, to keep
+# `import gplot` fast.
 
 __all__=[
-        'rcParams',
+        'rcParams', 'Params', 'getParams', 'useParams',
         'restoreParams', 'mkscale', 'index2Letter', 'remappedColorMap2',
-        'getColormap', 'getColorbarPad', 'pickPoint', 'getSlab', 'regridToReso',
-        'getMissingMask', 'getQuantiles', 'getRange', 'alternateTicks', 'plot2',
-        'Isofill', 'Isoline', 'Boxfill', 'Pcolor', 'Hatch', 'Shading', 'GIS', 'Quiver',
+        'getColormap', 'getColorbarPad', 'pickPoint', 'getSlab', 'iterSlabs',
+        'regridToReso',
+        'getMissingMask', 'getQuantiles', 'getRange', 'getRangeFromStats',
+        'getParallelRange', 'getSlabRange',
+        'DataStats', 'HistogramSketch', 'MagnitudeSketch',
+        'getKeyLength', 'alternateTicks', 'plot2', 'plot2Bytes',
+        'RenderContext', 'PlotTracer', 'countArtists',
+        'Isofill', 'Isoline', 'Boxfill', 'Pcolor', 'SharedLevels', 'Hatch',
+        'Shading', 'GIS', 'Quiver',
         'Plot2D', 'Plot2Quiver'
         ]
 
@@ -65,7 +79,8 @@ rcParams = {
     'geo_interface': 'basemap',
     'fontsize': 11,
     'verbose': True,
-    'default_cmap': plt.cm.RdBu_r
+    'default_cmap': 'RdBu_r',
+    'lean': False
 }
 
 # a backup copy, deepcopy produces issue in autodoc
@@ -85,11 +100,125 @@ _default_rcParams = {
     'geo_interface': 'basemap',
     'fontsize': 11,
     'verbose': True,
-    'default_cmap': plt.cm.RdBu_r
+    'default_cmap': 'RdBu_r',
+    'lean': False
 }
 
 #_default_rcParams = copy.deepcopy(rcParams)
 
+# -----------------------------------------------------------------------
+# -                          Scoped parameters                          -
+# -----------------------------------------------------------------------
+
+
+class Params(Mapping):
+    '''Immutable set of plotting parameters'''
+    __slots__ = ('_data',)
+
+    def __init__(self, data=None, **kwargs):
+        '''Immutable set of plotting parameters
+
+        Keyword Args:
+            data (dict, Params or None): parameters to copy.
+            **kwargs: parameters overriding those in <data>.
+
+        Values are stored in a flat dict, so reading a parameter is a single
+        dict lookup. Use override() to get a new layer with some values
+        changed, or useParams() to make a layer the current parameters.
+        '''
+
+        flat = dict(data or {})
+        flat.update(kwargs)
+        object.__setattr__(self, '_data', flat)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __setitem__(self, key, value):
+        raise Exception("Params are immutable, use override() or useParams().")
+
+    def __setattr__(self, key, value):
+        raise Exception("Params are immutable, use override() or useParams().")
+
+    def __repr__(self):
+        return 'Params(%r)' % self._data
+
+    def override(self, **kwargs):
+        '''Get a new Params with some values overridden
+
+        Keyword Args:
+            **kwargs: parameters to override.
+        Returns:
+            params (Params): new Params. self is returned if no <kwargs>.
+        '''
+
+        if len(kwargs) == 0:
+            return self
+
+        return Params(self._data, **kwargs)
+
+
+# Params of the current thread/asyncio task, None for the global rcParams
+_params_scope = contextvars.ContextVar('gplot_params', default=None)
+
+
+def getParams():
+    '''Get the current plotting parameters
+
+    Returns:
+        params (Params): parameters of the innermost useParams() scope of
+            the current thread. If not in any scope, a snapshot of the global
+            rcParams.
+    '''
+
+    params = _params_scope.get()
+    if params is None:
+        params = Params(rcParams)
+
+    return params
+
+
+@contextlib.contextmanager
+def useParams(params=None, **kwargs):
+    '''Context manager to change plotting parameters in a scope
+
+    Keyword Args:
+        params (Params, dict or None): parameters to use in the scope. If
+            None, use the current parameters.
+        **kwargs: parameters overriding those in <params>.
+    Returns:
+        params (Params): parameters in the scope.
+
+    Scopes can be nested, and are local to the thread (or asyncio task), so
+    concurrent renders can use different parameters without affecting each
+    other or the global rcParams. E.g.
+
+        with gplot.useParams(fontsize=4, legend='local'):
+            gplot.plot2(var, gplot.Isofill(var), ax)
+    '''
+
+    unknown = set(kwargs).difference(rcParams)
+    if len(unknown) > 0:
+        raise Exception("Unknown parameters: %s" % ', '.join(sorted(unknown)))
+
+    if params is None:
+        params = getParams()
+    elif not isinstance(params, Params):
+        params = Params(params)
+    params = params.override(**kwargs)
+
+    token = _params_scope.set(params)
+    try:
+        yield params
+    finally:
+        _params_scope.reset(token)
+
 # -----------------------------------------------------------------------
 # -                          Utility functions                          -
 # -----------------------------------------------------------------------
@@ -336,7 +465,6 @@ def remappedColorMap(
         cdict['blue'].append((si, b, b))
         cdict['alpha'].append((si, a, a))
     newcmap = LinearSegmentedColormap(name, cdict, N=256)
-    plt.register_cmap(cmap=newcmap)
 
     return newcmap
 
@@ -395,7 +523,6 @@ def remappedColorMap2(cmap, vmin, vmax, vcenter, name='shiftedcmap'):
         cdict['blue'].append((si, b, b))
         cdict['alpha'].append((si, a, a))
     newcmap = LinearSegmentedColormap(name, cdict, N=256)
-    plt.register_cmap(cmap=newcmap)
 
     return newcmap
 
@@ -405,24 +532,145 @@ def getColormap(cmap):
 
     Args:
         cmap (matplotlib colormap, str or None): if colormap, return as is.
-            if str, get a colormap by name: getattr(plt.cm, cmap).
-            If None, use default of rcParams['default_cmap'].
+            if str, get a colormap by name: matplotlib.cm.get_cmap(cmap).
+            If None, use default of the 'default_cmap' parameter.
     Returns:
         cmap (matplotlib colormap): matplotlib colormap.
     '''
 
     if cmap is None:
-        cmap = rcParams['default_cmap']
-    elif cmap is not None and isinstance(cmap, str):
+        cmap = getParams()['default_cmap']
+    if isinstance(cmap, str):
+        from matplotlib import cm
         try:
-            cmap = getattr(plt.cm, cmap)
+            cmap = cm.get_cmap(cmap)
         except:
             raise Exception("Color map name wrong.")
 
     return cmap
 
 
-def getColorbarPad(ax, orientation, base_pad=0.0):
+_font_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=2048)
+def getTextExtent(text, fontsize, family='sans-serif', dpi=72.):
+    '''Get the size of a single line text from cached font metrics
+
+    Args:
+        text (str): text string.
+        fontsize (float): font size in points.
+    Keyword Args:
+        family (str): font family.
+        dpi (float): resolution at which the font glyphs are measured.
+    Returns:
+        width (float): width of the text, in points.
+        height (float): height of the text line, in points. Same as
+            matplotlib, this is at least the height of the string 'lp'.
+
+    Metrics are read from the font file directly, without creating a text
+    artist or a renderer. Results are cached for each text, font family,
+    size and dpi.
+    '''
+
+    from matplotlib.font_manager import FontProperties, findfont, get_font
+    from matplotlib.backends.backend_agg import get_hinting_flag
+
+    prop = FontProperties(family=family, size=fontsize)
+    font = get_font(findfont(prop))
+    extents = []
+    # font objects are shared, guard against measuring in multiple threads
+    with _font_lock:
+        for tii in [text, 'lp']:
+            font.clear()
+            font.set_size(fontsize, dpi)
+            font.set_text(tii, 0.0, flags=get_hinting_flag())
+            extents.append(font.get_width_height())
+
+    # font metrics are in 1/64 pixels
+    width = extents[0][0] / 64. * 72. / dpi
+    height = max(extents[0][1], extents[1][1]) / 64. * 72. / dpi
+
+    return width, height
+
+
+def getTextBox(ax, fontsize=12, text='0.0'):
+    '''Get the box of a text in axes coordinates, without rendering it
+
+    Args:
+        ax (plt axis): axis whose coordinates the text box is measured in.
+    Keyword Args:
+        fontsize (int): font size of the text.
+        text (str): text string.
+    Returns:
+        box (matplotlib Bbox): bbox of the text, in axes coordinates.
+
+    Analytic replacement of createDummyTextBox().
+    '''
+
+    fig = ax.get_figure()
+    bbox = ax.get_position(original=True)
+    width, height = getTextExtent(text, fontsize, dpi=fig.dpi)
+    from matplotlib.transforms import Bbox
+
+    box = Bbox.from_bounds(
+        0, 0, width / (bbox.width * fig.get_figwidth() * 72.),
+        height / (bbox.height * fig.get_figheight() * 72.))
+
+    return box
+
+
+def getAxisExtent(axis, side, dpi=72.):
+    '''Get the space taken by ticks, ticklabels and label outside an axis
+
+    Args:
+        axis (XAxis or YAxis): the x- or y- axis obj.
+        side (str): 'bottom' or 'top' for x-axis, 'left' or 'right' for y-axis.
+    Keyword Args:
+        dpi (float): resolution at which the font glyphs are measured.
+    Returns:
+        space (float): space outside the axes box on side <side>, in points.
+
+    Tick labels are formatted using the axis formatter and measured using
+    getTextExtent(), instead of drawing the axis.
+    '''
+
+    isfirst = side in ['bottom', 'left']
+    isx = side in ['bottom', 'top']
+    tick = axis.majorTicks[0]
+    tickline = tick.tick1line if isfirst else tick.tick2line
+    ticklabel = tick.label1 if isfirst else tick.label2
+
+    space = 0.
+    if tickline.get_visible():
+        space = tick.get_tick_padding()
+
+    # ----------------Tick labels----------------
+    if ticklabel.get_visible():
+        labels = axis.get_major_formatter().format_ticks(
+            axis.get_majorticklocs())
+        prop = ticklabel.get_fontproperties()
+        extents = [getTextExtent(lii, prop.get_size_in_points(),
+                                 prop.get_family()[0], dpi)
+                   for lii in labels if lii]
+        if len(extents) > 0:
+            size = max([eii[1] if isx else eii[0] for eii in extents])
+            space = tick.get_tick_padding() + tick.get_pad() + size
+
+    # ----------------Axis label----------------
+    label = axis.label
+    if label.get_visible() and label.get_text() and\
+            axis.get_label_position() == side:
+        prop = label.get_fontproperties()
+        width, height = getTextExtent(label.get_text(),
+                                      prop.get_size_in_points(),
+                                      prop.get_family()[0], dpi)
+        space += axis.labelpad + (height if isx else width)
+
+    return space
+
+
+def getColorbarPad(ax, orientation, base_pad=0.0, analytic=True):
     '''Compute padding value for colorbar axis creation
 
     Args:
@@ -431,10 +679,32 @@ def getColorbarPad(ax, orientation, base_pad=0.0):
     Keyword Args:
         base_pad (float): default pad. The resultant pad value is the computed
             space + base_pad.
+        analytic (bool): if True, compute the space taken by axis ticks and
+            ticklabels from font metrics, see getAxisExtent(). If False,
+            measure it from `ax.get_tightbbox()`, which requires a full
+            layout pass by the renderer.
     Returns:
         pad (float): the pad argument passed to make_axes_gridspec() function.
     '''
 
+    if analytic:
+        try:
+            fig = ax.get_figure()
+            bbox = ax.get_position(original=True)
+            if orientation == 'horizontal':
+                space = getAxisExtent(ax.xaxis, 'bottom', fig.dpi)
+                pad = space / (bbox.height * fig.get_figheight() * 72.) + base_pad
+            elif orientation == 'vertical':
+                space = getAxisExtent(ax.yaxis, 'right', fig.dpi)
+                pad = space / (bbox.width * fig.get_figwidth() * 72.) + base_pad
+        except:
+            pad = 0.15
+        else:
+            if np.isnan(pad):
+                pad = 0.15
+
+        return pad
+
     try:
         aspect = ax.get_aspect()
         ax.set_aspect('auto')
@@ -469,6 +739,7 @@ def createDummyTextBox(ax=None, fontsize=12):
     '''
 
     if ax is None:
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots()
 
     dummytext = ax.text(
@@ -509,35 +780,125 @@ def pickPoint(ax, color='y'):
     return np.array(points)
 
 
-def getSlab(var, index1=-1, index2=-2, verbose=True):
+def getSlab(var, index1=-1, index2=-2, indices=None, verbose=True):
     '''Get a slab from a variable
 
     Args:
-        var: (ndarray): ndarray with dimension >=2.
+        var: (ndarray): ndarray with dimension >=2, or a lazily read netcdf
+            variable.
     Keyword Args:
         index1,index2 (int): indices denoting the dimensions that define a 2d
             slab.
+        indices (list, tuple, dict or None): indices to select in the other
+            dimensions. If list or tuple, an int index for each of the other
+            dimensions, in order. If dict, int indices keyed by dimension
+            positions or names, e.g. {'time': 5, 'level': -1}, dimensions
+            not in the dict use index 0. If None, use index 0 of all other
+            dimensions. Negative indices count from the end.
     Returns:
-        slab (ndarray): the (1st) slab from <var>.
+        slab (ndarray): the selected slab from <var>.
            E.g. <var> has dimension (12,1,241,480), getSlab(var) will
-           return the 1st time point with singleton dimension squeezed.
+           return the 1st time point, and getSlab(var, indices=(5, 0))
+           the 6th, with the other dimensions removed.
+
+    The other dimensions are selected by integer indexing, so the slab of
+    an ndarray is a view into <var> and no data are copied. The slab of
+    the last 2 dimensions of a C-contiguous <var> is also C-contiguous.
+    Only the slab is read from a lazily read netcdf variable.
     '''
 
     ndim = np.ndim(var)
     if ndim < 2:
         raise Exception('Dimension in <var> is smaller than 2.')
+
+    shape = np.shape(var)
+    slab_axes = [index1 % ndim, index2 % ndim]
+    if slab_axes[0] == slab_axes[1]:
+        raise Exception("<index1> and <index2> denote the same dimension.")
+    axes = [ii for ii in range(ndim) if ii not in slab_axes]
+
+    # ----------------Get other indices----------------
+    if indices is None:
+        indices = {}
+    if isinstance(indices, dict):
+        if hasattr(var, 'dimensions'):
+            # netcdf4 variable
+            names = list(var.dimensions)
+        elif hasattr(var, 'dims'):
+            # xarray DataArray
+            names = list(var.dims)
+        elif hasattr(var, 'getAxisIds'):
+            # cdms variable
+            names = var.getAxisIds()
+        else:
+            names = []
+
+        selected = {}
+        for kk, vv in indices.items():
+            if isinstance(kk, str):
+                if kk not in names:
+                    raise Exception("Dimension not found in <var>: %s" % kk)
+                aii = names.index(kk)
+            elif -ndim <= kk < ndim:
+                aii = kk % ndim
+            else:
+                raise Exception("Dimension out of range: %d" % kk)
+            if aii not in axes:
+                raise Exception("Dimension %s is a slab dimension." % kk)
+            selected[aii] = vv
+        indices = [selected.get(aii, 0) for aii in axes]
+    elif len(indices) != len(axes):
+        raise Exception("<indices> needs to have %d elements, got %d." %
+                        (len(axes), len(indices)))
+
+    slicer = [slice(None), ]*ndim
+    for aii, idx in zip(axes, indices):
+        idx = int(idx)
+        if idx < -shape[aii] or idx >= shape[aii]:
+            raise Exception("Index %d out of range for dimension %d of size %d."
+                            % (idx, aii, shape[aii]))
+        slicer[aii] = idx
+
     if ndim == 2:
         return var
 
-    slicer = [slice(0, 1), ]*ndim
-    slicer[index1] = slice(None)
-    slicer[index2] = slice(None)
-    result = var[tuple(slicer)]
-    try:
-        result = np.squeeze(result)
-    except:
-        result = result(squeeze=1)
-    return np.array(result)
+    # integer indexing drops the other dimensions, no need to squeeze
+    return np.asanyarray(var[tuple(slicer)])
+
+
+def iterSlabs(var, index1=-1, index2=-2):
+    '''Iterate over all slabs of a variable
+
+    Args:
+        var: (ndarray): ndarray with dimension >=2, or a lazily read netcdf
+            variable.
+    Keyword Args:
+        index1,index2 (int): indices denoting the dimensions that define a 2d
+            slab.
+    Yields:
+        indices (tuple): indices of the other dimensions of the slab.
+        slab (ndarray): the slab, see getSlab().
+
+    Slabs are yielded in the order of the other dimensions, the last one
+    varying fastest, e.g. for a (time, level, lat, lon) variable, all levels
+    of the 1st time point come first. Each slab is a view into <var>, or
+    read only when reached for a lazily read netcdf variable, so batch
+    and animation drivers can go through large variables slab by slab:
+
+        for (tt, ), slab in iterSlabs(var):
+            plot2(slab, method, ax, title='t = %d' % tt)
+    '''
+
+    ndim = np.ndim(var)
+    if ndim < 2:
+        raise Exception('Dimension in <var> is smaller than 2.')
+
+    shape = np.shape(var)
+    slab_axes = [index1 % ndim, index2 % ndim]
+    other_shape = [shape[ii] for ii in range(ndim) if ii not in slab_axes]
+
+    for idx in np.ndindex(*other_shape):
+        yield idx, getSlab(var, index1, index2, indices=idx)
 
 
 def regridToReso(var, inlat, inlon, dlat, dlon, lat_idx=-2, lon_idx=-1,
@@ -695,7 +1056,7 @@ def getQuantiles(slab, quantiles=None, verbose=True):
 
 
 def getRange(vars, min_level=None, max_level=None, ql=None, qr=None,
-             verbose=True):
+             verbose=True, workers=None):
     '''Get min/max value
 
     Args:
@@ -705,6 +1066,9 @@ def getRange(vars, min_level=None, max_level=None, ql=None, qr=None,
         max_level (None or float): given maximum level.
         ql (None or float): given left quantile.
         qr (None or float): given right quantile.
+        verbose (bool): whether to print some info or not.
+        workers (int or None): if not None, compute in a pool of this many
+            threads, see getParallelRange().
     Returns:
         vmin (float): lowest level to take from variables.
         vmax (float): highest level to take from variables.
@@ -712,43 +1076,181 @@ def getRange(vars, min_level=None, max_level=None, ql=None, qr=None,
         data_max (float): highest level among variables.
     '''
 
-    # -------------------Cat all vars-------------------
-    for ii, vii in enumerate(vars):
-        vii = vii.flatten()
-        maskii = getMissingMask(vii)
-        vii = np.where(maskii, np.nan, vii)
-        if ii == 0:
-            var_all = vii
-        else:
-            var_all = np.concatenate((var_all, vii), axis=0)
+    if workers is not None:
+        return getParallelRange(vars, min_level, max_level, ql, qr,
+                                verbose=verbose, workers=workers)
+
+    # ------------Scan all vars in 1 pass------------
+    # only keep valid values if quantiles are needed, and concatenate them
+    # once at the end.
+    need_quantiles = ql is not None or qr is not None
+    data_min = np.inf
+    data_max = -np.inf
+    valids = []
+    for vii in vars:
+        vii = np.ma.filled(np.ma.ravel(vii).astype('float'), np.nan)
+        vii = vii[~np.isnan(vii)]
+        if vii.size == 0:
+            continue
+        data_min = min(data_min, np.min(vii))
+        data_max = max(data_max, np.max(vii))
+        if need_quantiles:
+            valids.append(vii)
+
+    if data_min > data_max:
+        # no valid data
+        data_min = data_max = np.nan
 
     # ------------------Get quantiles------------------
-    if ql is not None or qr is not None:
+    if need_quantiles:
+        var_all = np.concatenate(valids) if len(valids) > 0 else np.array([np.nan])
         if ql is not None:
             left_quantile = getQuantiles(var_all, ql, verbose)[0]
         if qr is not None:
             right_quantile = getQuantiles(var_all, 1-qr, verbose)[0]
 
-    # -------Get min/max from all vars-----------------
-    data_min = np.nanmin(var_all)
-    data_max = np.nanmax(var_all)
+    return getRangeFromStats(
+        data_min, data_max, min_level, max_level,
+        left_quantile if ql is not None else None,
+        right_quantile if qr is not None else None)
+
+
+def getParallelRange(vars, min_level=None, max_level=None, ql=None, qr=None,
+                     verbose=True, workers=4, chunk_size=2**20, nbins=4096):
+    '''Get min/max value, computed in a thread pool
+
+    Args:
+        vars (list): a list of ndarrays.
+    Keyword Args:
+        min_level (None or float): given minimum level.
+        max_level (None or float): given maximum level.
+        ql (None or float): given left quantile.
+        qr (None or float): given right quantile.
+        verbose (bool): whether to print some info or not.
+        workers (int): number of threads.
+        chunk_size (int): number of values in each chunk that the flattened
+            arrays are split into.
+        nbins (int): number of histogram bins used to locate the quantiles.
+    Returns:
+        vmin, vmax, data_min, data_max (floats): see getRange().
+
+    Chunks are processed in parallel, as numpy reductions release the GIL,
+    and the partial results are merged: min/max first, then histograms
+    with common bins to find the bins containing the quantiles, and
+    finally the values in those bins to get the same quantiles as
+    getRange(). No concatenated copy of the inputs is created.
+    '''
+
+    chunks = []
+    for vii in vars:
+        vii = np.ma.ravel(vii)
+        chunks.extend([vii[ii:ii+chunk_size] for ii in
+                       range(0, vii.size, chunk_size)])
+
+    def getValid(chunk):
+        chunk = np.ma.filled(chunk.astype('float'), np.nan)
+        return chunk[~np.isnan(chunk)]
+
+    def getMinMax(chunk):
+        valid = getValid(chunk)
+        if valid.size == 0:
+            return np.inf, -np.inf, 0
+        return np.min(valid), np.max(valid), valid.size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        # -------------------Get min/max-------------------
+        results = list(pool.map(getMinMax, chunks))
+        data_min = min([rii[0] for rii in results] + [np.inf, ])
+        data_max = max([rii[1] for rii in results] + [-np.inf, ])
+        count = sum([rii[2] for rii in results])
+        if count == 0:
+            data_min = data_max = np.nan
+
+        # ------------------Get quantiles------------------
+        probs = [pii for pii in [ql, None if qr is None else 1-qr]
+                 if pii is not None]
+        values = {}
+        if len(probs) > 0 and count > 0:
+            width = float(data_max - data_min) / nbins or 1.
+
+            def getBins(valid):
+                return np.clip(((valid - data_min) / width).astype('int'),
+                               0, nbins - 1)
+
+            def getCounts(chunk):
+                return np.bincount(getBins(getValid(chunk)), minlength=nbins)
+
+            cdf = np.cumsum(sum(pool.map(getCounts, chunks)))
+
+            # bins containing the 2 ranks around each quantile
+            ranks = []
+            for pii in probs:
+                pos = pii * (count - 1)
+                k0 = int(np.floor(pos))
+                k1 = min(k0 + 1, count - 1)
+                b0 = int(np.searchsorted(cdf, k0, 'right'))
+                b1 = int(np.searchsorted(cdf, k1, 'right'))
+                ranks.append((pii, pos, k0, k1, b0, b1))
+
+            def getSelected(chunk):
+                valid = getValid(chunk)
+                bins = getBins(valid)
+                return [valid[(bins >= rii[4]) & (bins <= rii[5])]
+                        for rii in ranks]
+
+            selected = list(pool.map(getSelected, chunks))
+            for jj, (pii, pos, k0, k1, b0, b1) in enumerate(ranks):
+                sjj = np.sort(np.concatenate([sii[jj] for sii in selected]))
+                offset = cdf[b0 - 1] if b0 > 0 else 0
+                v0 = sjj[k0 - offset]
+                v1 = sjj[k1 - offset]
+                values[pii] = v0 + (pos - k0) * (v1 - v0)
+                if verbose:
+                    print('# <getParallelRange>: %0.3f left quantile: %f.'
+                          % (pii, values[pii]))
+
+    return getRangeFromStats(
+        data_min, data_max, min_level, max_level,
+        None if ql is None else values.get(ql, np.nan),
+        None if qr is None else values.get(1-qr, np.nan))
+
+
+def getRangeFromStats(data_min, data_max, min_level=None, max_level=None,
+                      left_quantile=None, right_quantile=None):
+    '''Get min/max value from data statistics
+
+    Args:
+        data_min (float): lowest level among variables.
+        data_max (float): highest level among variables.
+    Keyword Args:
+        min_level (None or float): given minimum level.
+        max_level (None or float): given maximum level.
+        left_quantile (None or float): value at the given left quantile.
+        right_quantile (None or float): value at the given right quantile.
+    Returns:
+        vmin (float): lowest level to take from variables.
+        vmax (float): highest level to take from variables.
+        data_min (float): lowest level among variables.
+        data_max (float): highest level among variables.
+    '''
 
     # ----------------Set lower boundary----------------
-    if min_level is not None and ql is None:
+    if min_level is not None and left_quantile is None:
         vmin = max(data_min, min_level)
-    elif min_level is None and ql is not None:
+    elif min_level is None and left_quantile is not None:
         vmin = left_quantile
-    elif min_level is not None and ql is not None:
+    elif min_level is not None and left_quantile is not None:
         vmin = max(data_min, min_level, left_quantile)
     else:
         vmin = data_min
 
     # ----------------Set upper boundary----------------
-    if max_level is not None and qr is None:
+    if max_level is not None and right_quantile is None:
         vmax = min(data_max, max_level)
-    elif max_level is None and qr is not None:
+    elif max_level is None and right_quantile is not None:
         vmax = right_quantile
-    elif max_level is not None and qr is not None:
+    elif max_level is not None and right_quantile is not None:
         vmax = min(data_max, max_level, right_quantile)
     else:
         vmax = data_max
@@ -758,6 +1260,495 @@ def getRange(vars, min_level=None, max_level=None, ql=None, qr=None,
 
     return vmin, vmax, data_min, data_max
 
+
+def getSlabRange(vars, min_level=None, max_level=None, ql=None, qr=None,
+                 nbins=2048):
+    '''Get min/max value, streaming over the slabs of the variables
+
+    Args:
+        vars (list): a list of ndarrays, or lazily read netcdf variables.
+    Keyword Args:
+        min_level (None or float): given minimum level.
+        max_level (None or float): given maximum level.
+        ql (None or float): given left quantile.
+        qr (None or float): given right quantile.
+        nbins (int): number of histogram bins to approximate the quantiles.
+    Returns:
+        vmin, vmax, data_min, data_max (floats): see getRange().
+
+    Each variable is read 1 slab of the last 2 dimensions at a time, e.g. 1
+    time step and level of a (time, level, lat, lon) variable, so the memory
+    usage is bounded by a single slab. Min/max are exact, quantiles are
+    approximated with a HistogramSketch.
+    '''
+
+    need_quantiles = ql is not None or qr is not None
+    hist = HistogramSketch(nbins)
+    data_min = np.inf
+    data_max = -np.inf
+
+    for vii in vars:
+        if np.ndim(vii) <= 2:
+            slabs = [vii[:], ]
+        else:
+            slabs = (sii for _, sii in iterSlabs(vii))
+
+        for sii in slabs:
+            if need_quantiles:
+                hist.update(sii)
+                continue
+            sii = np.ma.filled(np.ma.ravel(sii).astype('float'), np.nan)
+            if np.all(np.isnan(sii)):
+                continue
+            data_min = min(data_min, np.nanmin(sii))
+            data_max = max(data_max, np.nanmax(sii))
+
+    if need_quantiles:
+        data_min, data_max = hist.data_min, hist.data_max
+    if data_min > data_max:
+        # no valid data
+        data_min = data_max = np.nan
+
+    return getRangeFromStats(
+        data_min, data_max, min_level, max_level,
+        None if ql is None else hist.quantile(ql),
+        None if qr is None else hist.quantile(1-qr))
+
+
+class DataStats(object):
+    '''Summary statistics of data, used in place of the data to get levels'''
+    def __init__(self, data_min, data_max, quantiles=None):
+        '''Summary statistics of data, used in place of the data to get levels
+
+        Args:
+            data_min (float): minimum of the data.
+            data_max (float): maximum of the data.
+        Keyword Args:
+            quantiles (dict or None): quantile table, a dict with probabilities
+                in [0, 1] as keys and the data values at these quantiles
+                as values, e.g. {0.01: -10.5, 0.99: 12.3}. Quantiles not in
+                the table are linearly interpolated between table entries,
+                see getQuantile().
+        '''
+
+        if data_min > data_max:
+            raise Exception("<data_min> needs to be <= <data_max>.")
+
+        self.data_min = float(data_min)
+        self.data_max = float(data_max)
+
+        quantiles = quantiles or {}
+        probs = np.array(sorted([float(kk) for kk in quantiles]))
+        if np.any((probs < 0) | (probs > 1)):
+            raise Exception("Quantiles need to be in [0, 1].")
+        values = np.array([quantiles[kk] for kk in sorted(
+            quantiles, key=float)], dtype='float')
+        self.quantiles = dict(zip(probs, values))
+
+    @classmethod
+    def fromFile(cls, abpath_in, level=None):
+        '''Read statistics from a sidecar json file
+
+        Args:
+            abpath_in (str): path to the json file, containing at least the
+                'data_min' and 'data_max' fields, and optionally a 'quantiles'
+                field mapping quantile probabilities to values.
+        Keyword Args:
+            level (int or None): if not None, read the statistics of this
+                level index from the 'levels' list in the file, e.g. those
+                created by netcdf4_utils.writeStats().
+        Returns:
+            stats (DataStats): statistics read from file.
+        '''
+
+        with open(abpath_in, 'r') as fin:
+            record = json.load(fin)
+
+        if level is not None:
+            levels = record.get('levels', None)
+            if not levels:
+                raise Exception("No level statistics in %s." % abpath_in)
+            record = levels[level]
+
+        try:
+            stats = cls(record['data_min'], record['data_max'],
+                        record.get('quantiles', None))
+        except KeyError:
+            raise Exception("No 'data_min' or 'data_max' in %s." % abpath_in)
+
+        return stats
+
+    def save(self, abpath_out):
+        '''Save statistics to a sidecar json file
+
+        Args:
+            abpath_out (str): path to the output json file.
+        '''
+
+        record = {
+            'data_min': self.data_min,
+            'data_max': self.data_max,
+            'quantiles': dict((repr(float(kk)), float(vv)) for kk, vv in
+                              self.quantiles.items())
+        }
+        with open(abpath_out, 'w') as fout:
+            json.dump(record, fout, indent=1)
+
+        return
+
+    def getQuantile(self, q):
+        '''Get the value at a quantile
+
+        Args:
+            q (float): quantile probability in [0, 1].
+        Returns:
+            result (float): value at quantile <q>, from the quantile table
+                if found, otherwise linearly interpolated between the 2
+                table entries around <q>. The 0 and 1 quantiles are
+                <data_min> and <data_max>.
+
+        Raises an exception if <q> is not covered by the quantile table, as
+        min/max alone don't tell where the other quantiles are.
+        '''
+
+        if q <= 0:
+            return self.data_min
+        if q >= 1:
+            return self.data_max
+
+        probs = sorted(self.quantiles)
+        for pii in probs:
+            # allow rounding errors, e.g. in 1-qr
+            if abs(pii - q) < 1e-9:
+                return self.quantiles[pii]
+
+        if len(probs) == 0 or q < probs[0] or q > probs[-1]:
+            raise Exception(
+                "Quantile %s not covered by the quantile table: %s." %
+                (q, [float(pii) for pii in probs]))
+
+        values = [self.quantiles[pii] for pii in probs]
+
+        return float(np.interp(q, probs, values))
+
+    def getRange(self, min_level=None, max_level=None, ql=None, qr=None):
+        '''Get min/max value
+
+        Keyword Args:
+            min_level (None or float): given minimum level.
+            max_level (None or float): given maximum level.
+            ql (None or float): given left quantile.
+            qr (None or float): given right quantile.
+        Returns:
+            vmin, vmax, data_min, data_max (floats): see getRange().
+        '''
+
+        left_quantile = None if ql is None else self.getQuantile(ql)
+        right_quantile = None if qr is None else self.getQuantile(1-qr)
+
+        return getRangeFromStats(self.data_min, self.data_max, min_level,
+                                 max_level, left_quantile, right_quantile)
+
+
+class HistogramSketch(object):
+    '''Streaming histogram of data values, for approximated quantiles'''
+    def __init__(self, nbins=2048):
+        '''Streaming histogram of data values, for approximated quantiles
+
+        Keyword Args:
+            nbins (int): number of histogram bins. Quantiles are accurate to
+                about (data_max - data_min) / <nbins>.
+
+        Bins are equally spaced. When new data fall outside of the current
+        bins, the bins are widened, with some headroom on the extended side,
+        and existing counts are re-distributed into the new bins, so the
+        memory usage is fixed regardless of the amount of data.
+        '''
+
+        if nbins < 2:
+            raise Exception("<nbins> needs to be >= 2.")
+
+        self.nbins = int(nbins)
+        self.counts = np.zeros(self.nbins)
+        self.lo = None
+        self.width = None
+        self.data_min = np.inf
+        self.data_max = -np.inf
+        self.count = 0
+        self.nan_count = 0
+
+    def rebin(self, counts, lo, width):
+        '''Re-distribute histogram counts into the current bins
+
+        Args:
+            counts (1darray): counts of a histogram.
+            lo (float): lower edge of the 1st bin of <counts>.
+            width (float): bin width of <counts>.
+        Returns:
+            result (1darray): counts in the current bins, assuming values are
+                uniformly distributed within each bin of <counts>.
+        '''
+
+        edges = lo + np.arange(len(counts) + 1) * width
+        cdf = np.r_[0, np.cumsum(counts)]
+        new_edges = self.lo + np.arange(self.nbins + 1) * self.width
+        new_cdf = np.interp(new_edges, edges, cdf)
+        # counts outside of the new bins go to the end bins
+        new_cdf[0] = 0
+        new_cdf[-1] = cdf[-1]
+
+        return np.diff(new_cdf)
+
+    def extend(self, vmin, vmax):
+        '''Extend the bins to cover [vmin, vmax]'''
+
+        if self.lo is None:
+            width = float(vmax - vmin) / self.nbins
+            if width <= 0:
+                width = max(abs(vmin) * 1e-6, 1e-12)
+            self.lo = float(vmin)
+            self.width = width
+            return
+
+        hi = self.lo + self.width * self.nbins
+        if vmin >= self.lo and vmax <= hi:
+            return
+
+        # add headroom on the extended side(s) to avoid frequent re-binning
+        new_lo = min(self.lo, vmin)
+        new_hi = max(hi, vmax)
+        headroom = 0.125 * (new_hi - new_lo)
+        if vmin < self.lo:
+            new_lo -= headroom
+        if vmax > hi:
+            new_hi += headroom
+
+        old_counts, old_lo, old_width = self.counts, self.lo, self.width
+        self.lo = float(new_lo)
+        self.width = float(new_hi - new_lo) / self.nbins
+        self.counts = self.rebin(old_counts, old_lo, old_width)
+
+        return
+
+    def update(self, data):
+        '''Add data into the histogram
+
+        Args:
+            data (ndarray): input data of any shape. nan, inf and masked
+                values are counted as missing.
+        '''
+
+        data = np.ma.filled(np.ma.ravel(data).astype('float'), np.nan)
+        valid = data[np.isfinite(data)]
+        self.nan_count += data.size - valid.size
+        if valid.size == 0:
+            return
+
+        vmin = np.min(valid)
+        vmax = np.max(valid)
+        self.extend(vmin, vmax)
+
+        idx = np.clip(((valid - self.lo) / self.width).astype('int'), 0,
+                      self.nbins - 1)
+        self.counts += np.bincount(idx, minlength=self.nbins)
+        self.data_min = min(self.data_min, vmin)
+        self.data_max = max(self.data_max, vmax)
+        self.count += valid.size
+
+        return
+
+    def merge(self, other):
+        '''Merge another HistogramSketch into this one
+
+        Args:
+            other (HistogramSketch): histogram to merge. Not modified.
+        '''
+
+        self.nan_count += other.nan_count
+        if other.count == 0:
+            return
+
+        self.extend(other.data_min, other.data_max)
+        self.counts += self.rebin(other.counts, other.lo, other.width)
+        self.data_min = min(self.data_min, other.data_min)
+        self.data_max = max(self.data_max, other.data_max)
+        self.count += other.count
+
+        return
+
+    def quantile(self, q):
+        '''Get approximated quantile
+
+        Args:
+            q (float): quantile probability in [0, 1].
+        Returns:
+            result (float): value at quantile <q>, linearly interpolated
+                within the histogram bin. nan if no valid data.
+        '''
+
+        if self.count == 0:
+            return np.nan
+        if q <= 0:
+            return float(self.data_min)
+        if q >= 1:
+            return float(self.data_max)
+
+        cdf = np.cumsum(self.counts)
+        target = q * self.count
+        ii = int(np.searchsorted(cdf, target))
+        ii = min(ii, self.nbins - 1)
+        below = cdf[ii - 1] if ii > 0 else 0
+        frac = (target - below) / self.counts[ii] if self.counts[ii] > 0 else 0.
+        result = self.lo + (ii + frac) * self.width
+
+        return float(np.clip(result, self.data_min, self.data_max))
+
+    def toStats(self, quantiles=None):
+        '''Get a DataStats from the histogram
+
+        Keyword Args:
+            quantiles (list or None): quantile probabilities to put in the
+                quantile table. If None, use the left and right quantiles
+                of 0.001, 0.005, 0.01, 0.025, 0.05 and 0.1.
+        Returns:
+            stats (DataStats): statistics of the data.
+        '''
+
+        if self.count == 0:
+            raise Exception("No valid data.")
+        if quantiles is None:
+            quantiles = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1]
+            quantiles = quantiles + [1-qii for qii in quantiles]
+
+        return DataStats(self.data_min, self.data_max,
+                         dict((qii, self.quantile(qii)) for qii in quantiles))
+
+
+class MagnitudeSketch(object):
+    '''Bounded-size random sample of vector magnitudes'''
+    def __init__(self, max_samples=10000, seed=0):
+        '''Bounded-size random sample of vector magnitudes
+
+        Keyword Args:
+            max_samples (int): maximum number of magnitudes to keep. At most
+                this many values are read from each input, and a reservoir
+                of this size is kept across multiple inputs, e.g. the time
+                steps of a time series.
+            seed (int): seed of the random generator used to update the
+                reservoir.
+        '''
+
+        self.max_samples = int(max_samples)
+        self.samples = np.zeros(0)
+        self.nseen = 0
+        self._rng = np.random.RandomState(seed)
+
+    def update(self, u, v):
+        '''Add magnitudes of a pair of x- and y- components
+
+        Args:
+            u,v (ndarray): x- and y- components of vectors, with the same
+                shape. Masked, nan, inf and zero magnitudes are ignored.
+        '''
+
+        # random subsample to avoid temporaries of the full array. A
+        # regular stride would alias with the row length, picking the
+        # same few columns of every row.
+        size = np.size(u)
+        if size > self.max_samples:
+            idx = np.sort(self._rng.randint(0, size, self.max_samples))
+        else:
+            idx = slice(None)
+        uu = np.ma.filled(np.ma.ravel(u)[idx].astype('float'), np.nan)
+        vv = np.ma.filled(np.ma.ravel(v)[idx].astype('float'), np.nan)
+        mag = np.hypot(uu, vv)
+        mag = mag[np.isfinite(mag) & (mag > 0)]
+
+        # fill reservoir, then replace existing samples with decreasing
+        # probability
+        nfill = min(len(mag), self.max_samples - len(self.samples))
+        if nfill > 0:
+            self.samples = np.r_[self.samples, mag[:nfill]]
+        rest = mag[nfill:]
+        if len(rest) > 0:
+            counts = self.nseen + nfill + np.arange(len(rest)) + 1
+            idx = (self._rng.random_sample(len(rest)) * counts).astype('int')
+            keep = idx < self.max_samples
+            self.samples[idx[keep]] = rest[keep]
+        self.nseen += len(mag)
+
+        return
+
+    def quantile(self, percentile=80):
+        '''Get approximated percentile of the magnitudes
+
+        Keyword Args:
+            percentile (float): percentile in [0, 100].
+        Returns:
+            result (float): the percentile of the sampled magnitudes, nan if
+                no valid magnitude has been sampled.
+        '''
+
+        if len(self.samples) == 0:
+            return np.nan
+        return np.percentile(self.samples, percentile)
+
+    def keyLength(self, percentile=80):
+        '''Get a rounded quiver key length from the magnitude percentile
+
+        Keyword Args:
+            percentile (float): percentile in [0, 100].
+        Returns:
+            keylength (float): the <percentile>th percentile of sampled
+                magnitudes, rounded to a nice number.
+        '''
+
+        keylength = self.quantile(percentile)
+        if not np.isfinite(keylength):
+            return keylength
+
+        # scale to 10-100
+        lg = -np.log10(keylength)+2.
+        il = np.floor(lg)
+        keylength = keylength*10.**il
+        # round to a nice integer
+        keylength = np.around((keylength/10.), 0)*10/(10.**il)
+
+        return keylength
+
+
+def getKeyLength(u, v, percentile=80, max_samples=10000):
+    '''Get a quiver key length for the entire u, v data
+
+    Args:
+        u,v (ndarray): x- and y- components of vectors, with dimensions >= 2.
+            Could also be lazily read netcdf variables.
+    Keyword Args:
+        percentile (float): percentile in [0, 100] of the vector magnitudes
+            to use as the key length.
+        max_samples (int): maximum number of magnitudes to sample.
+    Returns:
+        keylength (float): the <percentile>th percentile of vector
+            magnitudes, rounded to a nice number.
+
+    Data with rank>2 are read 1 slab (the last 2 dimensions) at a time, so
+    one can compute a key length once for a time series, and pass it to
+    Quiver(keylength=keylength) to get the same reference vector across
+    all frames.
+    '''
+
+    if np.shape(u) != np.shape(v):
+        raise Exception("<u> and <v> have different shapes.")
+    if np.ndim(u) < 2:
+        raise Exception('Dimension in <u> is smaller than 2.')
+
+    sketch = MagnitudeSketch(max_samples)
+    for idx in np.ndindex(*np.shape(u)[:-2]):
+        sketch.update(u[idx], v[idx])
+
+    return sketch.keyLength(percentile)
+
+
 def alternateTicks(cbar, ticks=None, fontsize=9):
     '''Create alternating ticks and ticklabels for colorbar
 
@@ -785,13 +1776,17 @@ def alternateTicks(cbar, ticks=None, fontsize=9):
     lbot = ticks[1:][::2]  # labels at bottom
     ltop = ticks[::2]  # labels on top
 
-    # tick all to get label text strings first
+    # format all ticks together to get consistent label text strings,
+    # then reuse them for both the bottom and top labels. The colorbar
+    # needs to be ticked at all of them first, its formatter only labels
+    # the current ticks.
     cbar.set_ticks(ticks)
     formatter = cbar.ax.xaxis.get_major_formatter()
     ticklabels = formatter.format_ticks(ticks)
 
     # tick bottom
     cbar.set_ticks(lbot)
+    cbar.set_ticklabels(ticklabels[1:][::2])
 
     # --------------Print top tick labels--------------
     vmin = cbar.norm.vmin
@@ -813,18 +1808,18 @@ def alternateTicks(cbar, ticks=None, fontsize=9):
         shift_l = 0.
         scaling = 1.
 
-    for ii in range(len(ticklabels[::2])):
-        tii = ltop[ii]
-        tlii = ticklabels[::2][ii]
-        xii = shift_l+scaling*(tii-vmin)/(vmax-vmin)
-        # plot ticks
-        cbar.ax.plot([xii, xii],
-                     [1.0, 1.55],
-                     'k-', linewidth=0.5,
-                     clip_on=False,
-                     transform=cbar.ax.transAxes)
-
-        # plot tick labels
+    xs = shift_l+scaling*(np.asarray(ltop, dtype='float')-vmin)/(vmax-vmin)
+
+    # plot ticks, all in 1 collection
+    from matplotlib.collections import LineCollection
+    segments = [[(xii, 1.0), (xii, 1.55)] for xii in xs]
+    tick_lines = LineCollection(
+        segments, colors='k', linewidths=0.5, clip_on=False,
+        transform=cbar.ax.transAxes)
+    cbar.ax.add_collection(tick_lines, autolim=False)
+
+    # plot tick labels
+    for xii, tlii in zip(xs, ticklabels[::2]):
         cbar.ax.text(xii,
                      1.30, tlii,
                      transform=cbar.ax.transAxes, va='bottom',
@@ -909,13 +1904,25 @@ class TwoSlopeNorm(Normalize):
 
 class PlotMethod(object):
     '''Base plotting method class'''
+
+    # attributes that determine the data range. Changing any of these
+    # triggers a re-scan of the data when the range is needed again.
+    _range_attrs = ('vars', 'min_level', 'max_level', 'ql', 'qr',
+                    'range_stats', 'stream')
+    # attributes that determine the levels and colormap
+    _level_attrs = ('split', 'vcenter', 'cmap', 'levels', 'num', 'zero')
+
     def __init__(self, vars, split=2, min_level=None, max_level=None,
-                 ql=None, qr=None, vcenter=0, cmap=None, verbose=True):
+                 ql=None, qr=None, vcenter=0, cmap=None, range_stats=None,
+                 stream=False, workers=None, lean=None, verbose=True):
         '''Base plotting method class
 
         Args:
-            vars (ndarray or list): if ndarray, input data to create 2d plot
-                from. If list, a list of ndarrays.
+            vars (ndarray, list, DataStats or str): if ndarray, input data to
+                create 2d plot from. If list, a list of ndarrays. If DataStats,
+                precomputed statistics of the data, which are used instead of
+                scanning the data. If str, path to a sidecar json file
+                of the statistics, see DataStats.fromFile().
         Keyword Args:
             split (int): whether to split the colormap at a given value (<vcenter>) into
                 2 parts or not. Can be 1 of these 3 values:
@@ -944,7 +1951,21 @@ class PlotMethod(object):
                 None, use maximum value from <vars>. If both given, take the smaller.
             vcenter (float): value at which to split the colormap. Default to 0.
             cmap (matplotlib colormap or None): colormap to use. If None, use
-                the default in rcParams['default_cmap'].
+                the current 'default_cmap' parameter.
+            range_stats (tuple or None): precomputed (vmin, vmax, data_min,
+                data_max) of <vars>, as returned by getRange(). If given, skip
+                scanning <vars> for the range. See SharedLevels.
+            stream (bool): if True, read <vars> 1 slab of the last 2
+                dimensions at a time to get the range, so that large or
+                lazily read netcdf variables, e.g. a whole time series,
+                are not loaded into memory at once. Quantiles are then
+                approximated. See getSlabRange().
+            workers (int or None): if not None, get the range of <vars> in a
+                pool of this many threads. See getParallelRange().
+            lean (bool or None): if True, get the range of <vars> at creation
+                and keep only a summary of the data, see release(), so a
+                method kept for reuse doesn't keep the data in memory. If
+                None, use the current 'lean' parameter.
             verbose (bool): whether to print some info or not.
         '''
 
@@ -955,6 +1976,10 @@ class PlotMethod(object):
         self.qr = qr
         self.vcenter = vcenter
         self.cmap = cmap
+        self.range_stats = range_stats
+        self.stream = stream
+        self.workers = workers
+        self.lean = getParams()['lean'] if lean is None else lean
         self.method = 'base'
 
         if split not in [0, 1, 2]:
@@ -966,24 +1991,187 @@ class PlotMethod(object):
         if ql is not None and qr is not None and ql < qr:
             raise Exception("<ql> should be < <qr>.")
 
-        if not isinstance(vars, (list, tuple)):
+        if isinstance(vars, str):
+            vars = DataStats.fromFile(vars)
+        if not isinstance(vars, (list, tuple, DataStats)):
             vars = [vars, ]
         self.vars = vars
 
+        if self.lean:
+            self.release(quantiles=True)
+
+    def __setattr__(self, name, value):
+        # drop memoized results that depend on the changed attribute
+        if name in self._range_attrs:
+            self.__dict__.pop('_range', None)
+        if name in self._range_attrs or name in self._level_attrs:
+            self.__dict__.pop('_resolved', None)
+        super(PlotMethod, self).__setattr__(name, value)
+
     def computeRange(self):
-        '''Get the range of data and the range to plot'''
+        '''Get the range of data and the range to plot
+
+        Returns:
+            result (tuple): (vmin, vmax, data_min, data_max).
+
+        Computed on first call and reused until <vars> or any of the range
+        parameters are changed.
+        '''
 
         # -------------------Get max/min-------------------
-        self.vmin, self.vmax, self.data_min, self.data_max = getRange(
-            self.vars, self.min_level, self.max_level, self.ql, self.qr)
+        if '_range' not in self.__dict__:
+            if self.range_stats is not None:
+                self._range = tuple(self.range_stats)
+            elif isinstance(self.vars, DataStats):
+                self._range = self.vars.getRange(
+                    self.min_level, self.max_level, self.ql, self.qr)
+            elif self.stream:
+                self._range = getSlabRange(
+                    self.vars, self.min_level, self.max_level, self.ql,
+                    self.qr)
+            else:
+                self._range = getRange(
+                    self.vars, self.min_level, self.max_level, self.ql,
+                    self.qr, workers=self.workers)
+
+        return self._range
 
     def computeExt(self, vmin, vmax):
-        '''Determine overflow on both ends'''
+        '''Determine overflow on both ends
+
+        Args:
+            vmin,vmax (float): min and max value to plot.
+        Returns:
+            ext_1,ext_2 (bool): whether data overflow <vmin> or <vmax>.
+        '''
 
-        self.ext_1 = True if self.data_min < vmin else False
-        self.ext_2 = True if self.data_max > vmax else False
+        ext_1 = True if self.data_min < vmin else False
+        ext_2 = True if self.data_max > vmax else False
 
-        return
+        return ext_1, ext_2
+
+    def computeLevels(self):
+        '''Compute overflows and colormap from the data range
+
+        Returns:
+            resolved (dict): with keys 'ext_1', 'ext_2', 'cmap', 'norm'.
+        '''
+
+        ext_1, ext_2 = self.computeExt(self.vmin, self.vmax)
+        cmap, norm = self.adjustColormap(vmin=self.vmin, vmax=self.vmax)
+
+        return {'ext_1': ext_1, 'ext_2': ext_2, 'cmap': cmap, 'norm': norm}
+
+    def resolve(self):
+        '''Get the resolved range, levels and colormap
+
+        Returns:
+            resolved (dict): data range from computeRange() with keys 'vmin',
+                'vmax', 'data_min', 'data_max', and results of
+                computeLevels().
+
+        Computed on first use, e.g. when the plotting method is used to
+        plot, and reused until any of the inputs are changed.
+        '''
+
+        if '_resolved' not in self.__dict__:
+            resolved = dict(zip(['vmin', 'vmax', 'data_min', 'data_max'],
+                                self.computeRange()))
+            resolved.update(self.computeLevels())
+            self._resolved = resolved
+
+        return self._resolved
+
+    def release(self, quantiles=None):
+        '''Release the input data once the range is computed
+
+        Keyword Args:
+            quantiles (bool or None): whether to keep a table of approximated
+                quantiles of the data in the summary, see
+                HistogramSketch.toStats(). This takes another pass over
+                <vars>. If None, keep it if <ql> or <qr> is used.
+        Returns:
+            self (PlotMethod): the method itself.
+
+        The data range is computed first, then <vars> is replaced by a
+        DataStats of the data range, so the input arrays can be freed while
+        the method is kept for reuse. Levels and colormap only depend on the
+        range and are resolved from it when needed. If the range parameters
+        are changed afterwards, the range is recomputed from the DataStats,
+        see DataStats.getRange(). The quantile table covers <ql>, <qr> and
+        the 0.001 to 0.1 quantiles on both ends, other quantiles are
+        interpolated within it. Without the table, setting <ql> or <qr>
+        makes the range computation raise an exception.
+        '''
+
+        if isinstance(self.vars, DataStats):
+            return self
+
+        if quantiles is None:
+            quantiles = self.ql is not None or self.qr is not None
+
+        self.computeRange()
+        stats = None
+        if quantiles:
+            hist = HistogramSketch()
+            for vii in self.vars:
+                if np.ndim(vii) <= 2:
+                    hist.update(vii[:])
+                    continue
+                for _, sii in iterSlabs(vii):
+                    hist.update(sii)
+            if hist.count > 0:
+                probs = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1]
+                probs = probs + [1-qii for qii in probs]
+                if self.ql is not None:
+                    probs.append(self.ql)
+                if self.qr is not None:
+                    probs.append(1-self.qr)
+                stats = hist.toStats(probs)
+
+        if stats is None:
+            stats = DataStats(self.data_min, self.data_max)
+        # bypass __setattr__ to keep the memoized results
+        self.__dict__['vars'] = stats
+
+        return self
+
+    # ---------------Lazily resolved attributes---------------
+    @property
+    def vmin(self):
+        return self.computeRange()[0]
+
+    @property
+    def vmax(self):
+        return self.computeRange()[1]
+
+    @property
+    def data_min(self):
+        return self.computeRange()[2]
+
+    @property
+    def data_max(self):
+        return self.computeRange()[3]
+
+    @property
+    def ext_1(self):
+        return self.resolve()['ext_1']
+
+    @property
+    def ext_2(self):
+        return self.resolve()['ext_2']
+
+    @property
+    def norm(self):
+        return self.resolve()['norm']
+
+    @property
+    def cmap(self):
+        return self.resolve()['cmap']
+
+    @cmap.setter
+    def cmap(self, value):
+        self._cmap = value
 
     def adjustColormap(self, vmin, vmax):
         '''Adjust colormap for split and get normalization for colormap
@@ -1002,7 +2190,7 @@ class PlotMethod(object):
                 a TwoSlopeNorm. Otherwise return None.
         '''
 
-        cmap = self.cmap
+        cmap = getColormap(self._cmap)
         norm = None
 
         if self.split == 0:
@@ -1016,11 +2204,11 @@ class PlotMethod(object):
 
         if self.split == 2:
             if vmin < self.vcenter and vmax <= self.vcenter:
-                cmap = remappedColorMap2(self.cmap, vmin, vmax, self.vcenter)
+                cmap = remappedColorMap2(cmap, vmin, vmax, self.vcenter)
                 norm = None
 
             if vmin >= self.vcenter and vmax > self.vcenter:
-                cmap = remappedColorMap2(self.cmap, vmin, vmax, self.vcenter)
+                cmap = remappedColorMap2(cmap, vmin, vmax, self.vcenter)
                 norm = None
 
             if (vmin-self.vcenter)*(vmax-self.vcenter) < 0:
@@ -1036,12 +2224,16 @@ class Isofill(PlotMethod):
                  vcenter=0, cmap=None,
                  stroke=False, stroke_color='0.3', stroke_lw=0.2,
                  stroke_linestyle='-',
-                 verbose=True):
+                 range_stats=None, stream=False,
+                 workers=None, lean=None, verbose=True):
         '''Plotting method for isofill/contourf plots
 
         Args:
-            vars (ndarray or list): if ndarray, input data to create 2d plot
-                from. If list, a list of ndarrays.
+            vars (ndarray, list, DataStats or str): if ndarray, input data to
+                create 2d plot from. If list, a list of ndarrays. If DataStats,
+                precomputed statistics of the data, which are used instead of
+                scanning the data. If str, path to a sidecar json file
+                of the statistics, see DataStats.fromFile().
         Keyword Args:
             num (int): the desired number of contour levels. NOTE that the
                 resultant number may be slightly different.
@@ -1077,7 +2269,7 @@ class Isofill(PlotMethod):
                 None, use maximum value from <vars>. If both given, take the smaller.
             vcenter (float): value at which to split the colormap. Default to 0.
             cmap (matplotlib colormap or None): colormap to use. If None, use
-                the default in rcParams['default_cmap'].
+                the current 'default_cmap' parameter.
             stroke (bool): whether to overlay a layer of thin contour lines on
                 top of contourf.
             stroke_color (str or color tuple): color to plot the overlying
@@ -1086,13 +2278,28 @@ class Isofill(PlotMethod):
                 lines.
             stroke_linestyle (str): line style to plot the overlying thin
                 contour lines.
+            range_stats (tuple or None): precomputed (vmin, vmax, data_min,
+                data_max) of <vars>, as returned by getRange(). If given, skip
+                scanning <vars> for the range. See SharedLevels.
+            stream (bool): if True, read <vars> 1 slab of the last 2
+                dimensions at a time to get the range, so that large or
+                lazily read netcdf variables, e.g. a whole time series,
+                are not loaded into memory at once. Quantiles are then
+                approximated. See getSlabRange().
+            workers (int or None): if not None, get the range of <vars> in a
+                pool of this many threads. See getParallelRange().
+            lean (bool or None): if True, get the range of <vars> at creation
+                and keep only a summary of the data, see release(), so a
+                method kept for reuse doesn't keep the data in memory. If
+                None, use the current 'lean' parameter.
             verbose (bool): whether to print some info or not.
         '''
 
         super(
             Isofill, self).__init__(
             vars, split=split, min_level=min_level, max_level=max_level, ql=ql,
-            qr=qr, vcenter=vcenter, cmap=cmap, verbose=verbose)
+            qr=qr, vcenter=vcenter, cmap=cmap, range_stats=range_stats,
+            stream=stream, workers=workers, lean=lean, verbose=verbose)
 
         self.num = num
         self.zero = zero
@@ -1103,23 +2310,37 @@ class Isofill(PlotMethod):
         self.stroke_linestyle = stroke_linestyle
         self.method = 'isofill'
 
-        # --------------------Get levels--------------------
-        self.computeRange()
+        return
+
+    def computeLevels(self):
+        '''Compute contour levels, overflows and colormap from the data range
 
-        if self.levels is None:
-            self.levels = mkscale(self.vmin, self.vmax, self.num, self.zero)
+        Returns:
+            resolved (dict): with keys 'levels', 'ext_1', 'ext_2', 'cmap',
+                'norm'.
+        '''
+
+        # --------------------Get levels--------------------
+        levels = self._levels
+        if levels is None:
+            levels = mkscale(self.vmin, self.vmax, self.num, self.zero)
 
-        self.computeExt(np.min(self.levels), np.max(self.levels))
+        ext_1, ext_2 = self.computeExt(np.min(levels), np.max(levels))
 
         # -------------------Get colormap-------------------
-        self.cmap = getColormap(self.cmap)
-        self.cmap, self.norm = self.adjustColormap(vmin=np.min(self.levels),
-                                                   vmax=np.max(self.levels))
-        # self.cmap = LinearSegmentedColormap('new_cmp2',
-        # self.cmap._segmentdata,
-        # N=len(self.levels)-1)
+        cmap, norm = self.adjustColormap(vmin=np.min(levels),
+                                         vmax=np.max(levels))
 
-        return
+        return {'levels': levels, 'ext_1': ext_1, 'ext_2': ext_2,
+                'cmap': cmap, 'norm': norm}
+
+    @property
+    def levels(self):
+        return self.resolve()['levels']
+
+    @levels.setter
+    def levels(self, value):
+        self._levels = value
 
 
 class Isoline(Isofill):
@@ -1130,12 +2351,16 @@ class Isoline(Isofill):
                  black=False, color=None, linewidth=1.0, alpha=1.0,
                  dash_negative=True, bold_lines=None,
                  label=False, label_fmt=None, label_box=False, label_box_color='w',
-                 verbose=True):
+                 range_stats=None, stream=False,
+                 workers=None, lean=None, verbose=True):
         '''Plotting method for isoline/contour plots
 
         Args:
-            vars (ndarray or list): if ndarray, input data to create 2d plot
-                from. If list, a list of ndarrays.
+            vars (ndarray, list, DataStats or str): if ndarray, input data to
+                create 2d plot from. If list, a list of ndarrays. If DataStats,
+                precomputed statistics of the data, which are used instead of
+                scanning the data. If str, path to a sidecar json file
+                of the statistics, see DataStats.fromFile().
         Keyword Args:
             num (int): the desired number of contour levels. NOTE that the
                 resultant number may be slightly different.
@@ -1171,7 +2396,7 @@ class Isoline(Isofill):
                 None, use maximum value from <vars>. If both given, take the smaller.
             vcenter (float): value at which to split the colormap. Default to 0.
             cmap (matplotlib colormap or None): colormap to use. If None, use
-                the default in rcParams['default_cmap'].
+                the current 'default_cmap' parameter.
             black (bool): use black lines instead of colored lines.
             color (str or color tuple): color to plot the contour lines.
             linewidth (float): line width to plot the contour lines.
@@ -1188,6 +2413,20 @@ class Isoline(Isofill):
                 with background color or not.
             label_box_color (str or color tuple): if <label_box> is True, the
                 background color for the bounding boxes for the labels.
+            range_stats (tuple or None): precomputed (vmin, vmax, data_min,
+                data_max) of <vars>, as returned by getRange(). If given, skip
+                scanning <vars> for the range. See SharedLevels.
+            stream (bool): if True, read <vars> 1 slab of the last 2
+                dimensions at a time to get the range, so that large or
+                lazily read netcdf variables, e.g. a whole time series,
+                are not loaded into memory at once. Quantiles are then
+                approximated. See getSlabRange().
+            workers (int or None): if not None, get the range of <vars> in a
+                pool of this many threads. See getParallelRange().
+            lean (bool or None): if True, get the range of <vars> at creation
+                and keep only a summary of the data, see release(), so a
+                method kept for reuse doesn't keep the data in memory. If
+                None, use the current 'lean' parameter.
             verbose (bool): whether to print some info or not.
         '''
 
@@ -1195,7 +2434,8 @@ class Isoline(Isofill):
             Isoline, self).__init__(
             vars, num=num, zero=zero, split=split, levels=levels,
             min_level=min_level, max_level=max_level, ql=ql, qr=qr,
-            vcenter=vcenter, cmap=cmap, verbose=verbose)
+            vcenter=vcenter, cmap=cmap, range_stats=range_stats,
+            stream=stream, workers=workers, lean=lean, verbose=verbose)
 
         self.black = black
         self.color = color
@@ -1215,12 +2455,16 @@ class Isoline(Isofill):
 class Boxfill(PlotMethod):
     '''Plotting method for boxfill/imshow plots'''
     def __init__(self, vars, split=2, min_level=None, max_level=None,
-                 ql=None, qr=None, vcenter=0, cmap=None, verbose=True):
+                 ql=None, qr=None, vcenter=0, cmap=None, range_stats=None,
+                 stream=False, workers=None, lean=None, verbose=True):
         '''Plotting method for boxfill/imshow plots
 
         Args:
-            vars (ndarray or list): if ndarray, input data to create 2d plot
-                from. If list, a list of ndarrays.
+            vars (ndarray, list, DataStats or str): if ndarray, input data to
+                create 2d plot from. If list, a list of ndarrays. If DataStats,
+                precomputed statistics of the data, which are used instead of
+                scanning the data. If str, path to a sidecar json file
+                of the statistics, see DataStats.fromFile().
         Keyword Args:
             split (int): whether to split the colormap at a given value (<vcenter>) into
                 2 parts or not. Can be 1 of these 3 values:
@@ -1252,32 +2496,46 @@ class Boxfill(PlotMethod):
                 None, use maximum value from <vars>. If both given, take the smaller.
             vcenter (float): value at which to split the colormap. Default to 0.
             cmap (matplotlib colormap or None): colormap to use. If None, use
-                the default in rcParams['default_cmap'].
+                the current 'default_cmap' parameter.
+            range_stats (tuple or None): precomputed (vmin, vmax, data_min,
+                data_max) of <vars>, as returned by getRange(). If given, skip
+                scanning <vars> for the range. See SharedLevels.
+            stream (bool): if True, read <vars> 1 slab of the last 2
+                dimensions at a time to get the range, so that large or
+                lazily read netcdf variables, e.g. a whole time series,
+                are not loaded into memory at once. Quantiles are then
+                approximated. See getSlabRange().
+            workers (int or None): if not None, get the range of <vars> in a
+                pool of this many threads. See getParallelRange().
+            lean (bool or None): if True, get the range of <vars> at creation
+                and keep only a summary of the data, see release(), so a
+                method kept for reuse doesn't keep the data in memory. If
+                None, use the current 'lean' parameter.
             verbose (bool): whether to print some info or not.
         '''
 
         super(
             Boxfill, self).__init__(
             vars, split=split, min_level=min_level, max_level=max_level, ql=ql,
-            qr=qr, vcenter=vcenter, cmap=cmap, verbose=verbose)
+            qr=qr, vcenter=vcenter, cmap=cmap, range_stats=range_stats,
+            stream=stream, workers=workers, lean=lean, verbose=verbose)
 
         self.method = 'boxfill'
 
-        self.computeRange()
-        self.computeExt(self.vmin, self.vmax)
-        self.cmap = getColormap(self.cmap)
-        self.cmap, self.norm = self.adjustColormap(vmin=self.vmin, vmax=self.vmax)
-
 
 class Pcolor(Boxfill):
     '''Plotting method for pcolormesh plots'''
     def __init__(self, vars, split=2, min_level=None, max_level=None,
-                 ql=None, qr=None, vcenter=0, cmap=None, verbose=True):
+                 ql=None, qr=None, vcenter=0, cmap=None, range_stats=None,
+                 stream=False, workers=None, lean=None, verbose=True):
         '''Plotting method for pcolormesh plots
 
         Args:
-            vars (ndarray or list): if ndarray, input data to create 2d plot
-                from. If list, a list of ndarrays.
+            vars (ndarray, list, DataStats or str): if ndarray, input data to
+                create 2d plot from. If list, a list of ndarrays. If DataStats,
+                precomputed statistics of the data, which are used instead of
+                scanning the data. If str, path to a sidecar json file
+                of the statistics, see DataStats.fromFile().
         Keyword Args:
             split (int): whether to split the colormap at a given value (<vcenter>) into
                 2 parts or not. Can be 1 of these 3 values:
@@ -1309,18 +2567,130 @@ class Pcolor(Boxfill):
                 None, use maximum value from <vars>. If both given, take the smaller.
             vcenter (float): value at which to split the colormap. Default to 0.
             cmap (matplotlib colormap or None): colormap to use. If None, use
-                the default in rcParams['default_cmap'].
+                the current 'default_cmap' parameter.
+            range_stats (tuple or None): precomputed (vmin, vmax, data_min,
+                data_max) of <vars>, as returned by getRange(). If given, skip
+                scanning <vars> for the range. See SharedLevels.
+            stream (bool): if True, read <vars> 1 slab of the last 2
+                dimensions at a time to get the range, so that large or
+                lazily read netcdf variables, e.g. a whole time series,
+                are not loaded into memory at once. Quantiles are then
+                approximated. See getSlabRange().
+            workers (int or None): if not None, get the range of <vars> in a
+                pool of this many threads. See getParallelRange().
+            lean (bool or None): if True, get the range of <vars> at creation
+                and keep only a summary of the data, see release(), so a
+                method kept for reuse doesn't keep the data in memory. If
+                None, use the current 'lean' parameter.
             verbose (bool): whether to print some info or not.
         '''
 
         super(
             Pcolor, self).__init__(
             vars, split=split, min_level=min_level, max_level=max_level, ql=ql,
-            qr=qr, vcenter=vcenter, cmap=cmap, verbose=verbose)
+            qr=qr, vcenter=vcenter, cmap=cmap, range_stats=range_stats,
+            stream=stream, workers=workers, lean=lean, verbose=verbose)
 
         self.method = 'pcolor'
 
 
+class SharedLevels(object):
+    '''Figure-level coordinator of levels shared by multiple subplots'''
+    def __init__(self, method_class, vars=None, **kwargs):
+        '''Figure-level coordinator of levels shared by multiple subplots
+
+        Args:
+            method_class (PlotMethod class): plotting method class to create,
+                Isofill, Isoline, Boxfill or Pcolor.
+        Keyword Args:
+            vars (ndarray or list or None): data of the subplots to register.
+                More can be added later using add().
+            **kwargs: keyword arguments passed to <method_class>, e.g. num,
+                zero, split, min_level, max_level, ql, qr.
+
+        Data of all subplots are registered first, then getMethod() computes
+        a single range in 1 pass over all of them and creates 1 plotting
+        method, which is shared by all subplots, e.g.
+
+            shared = SharedLevels(Isofill, num=10, ql=0.01, qr=0.01)
+            shared.add(var1)
+            shared.add(var2)
+            plot2(var1, shared, ax1, legend='global')
+            plot2(var2, shared, ax2, legend='global')
+        '''
+
+        if not (isinstance(method_class, type) and
+                issubclass(method_class, PlotMethod)):
+            raise Exception("<method_class> needs to be a PlotMethod class.")
+
+        self.method_class = method_class
+        self.kwargs = kwargs
+        self.vars = []
+        self._method = None
+
+        if vars is not None:
+            self.add(vars)
+
+    def add(self, vars):
+        '''Register data of subplot(s)
+
+        Args:
+            vars (ndarray or list): data of a subplot, or a list of data of
+                subplots. Only references are kept, data are not copied.
+        Returns:
+            self (SharedLevels): the coordinator itself.
+        '''
+
+        if not isinstance(vars, (list, tuple)):
+            vars = [vars, ]
+        self.vars.extend(vars)
+        # range needs updating
+        self._method = None
+
+        return self
+
+    def computeRange(self):
+        '''Get the range of all registered data
+
+        Returns:
+            result (tuple): (vmin, vmax, data_min, data_max), see
+                PlotMethod.computeRange().
+        '''
+
+        return self.getMethod().computeRange()
+
+    def getMethod(self):
+        '''Get the plotting method shared by all subplots
+
+        Returns:
+            method (PlotMethod): plotting method created from all registered
+                data. Created once and reused until more data are added.
+
+        The range is computed by the method itself in 1 pass over all the
+        registered data, so all of <method_class>'s range inputs, e.g.
+        <stream>, <workers> and <range_stats>, are honored.
+        '''
+
+        if self._method is None:
+            if len(self.vars) == 0:
+                raise Exception("No data registered.")
+            self._method = self.method_class(list(self.vars), **self.kwargs)
+
+        return self._method
+
+    def release(self):
+        '''Release the registered data once the shared method is created
+
+        Returns:
+            self (SharedLevels): the coordinator itself.
+        '''
+
+        self.getMethod().release()
+        self.vars = []
+
+        return self
+
+
 class Hatch(object):
     '''Plotting method for hatching plots'''
     def __init__(self, hatch='.', color='k', alpha=1.0):
@@ -1387,23 +2757,36 @@ class GIS(object):
 class Quiver(object):
     '''Plotting method for quiver plots'''
     def __init__(self, step=1, reso=None, scale=None, keylength=None,
-                 linewidth=0.0015, color='k', alpha=1.0):
+                 linewidth=0.0015, color='k', alpha=1.0, arrows_per_inch=3.):
         '''Plotting method for quiver plots
 
         Keyword Args:
-            step (int): sub-sample steps in both x- and  y- axes. U and V
-                data are sub-sampled using `U[::step,::step]`.
+            step (int or 'auto'): sub-sample steps in both x- and  y- axes. U and V
+                data are sub-sampled using `U[::step,::step]`. If 'auto',
+                choose a step at plotting time such that the (projected)
+                arrows are spaced by about 1/<arrows_per_inch> inch in
+                the axes.
             reso (int or None): if not None, regrid input U and V data to a
                 lower resolution, measured in grids.
                 If both < reso > and <step> are given, use <reso>.
                 Requires scipy for this functionality.
             scale (float or None): see same arg as matplotlib.pyplot.quiver().
             keylength (float or None): see same arg as matplotlib.pylot.quiver().
+                If None, use the 80th percentile of sampled vector magnitudes.
+                To use the same key length for a time series, compute it
+                once using getKeyLength().
             linewidth (float): line width.
             color (str or color tuple): color to plot quiver arrows.
             alpha (float): transparent level in [0, 1].
+            arrows_per_inch (float): if <step> is 'auto', the desired number
+                of arrows per inch.
         '''
 
+        if step != 'auto' and (not isinstance(step, (int, np.integer)) or step < 1):
+            raise Exception("<step> needs to be a positive integer or 'auto'.")
+        if arrows_per_inch <= 0:
+            raise Exception("<arrows_per_inch> needs to be positive.")
+
         self.method = 'quiver'
         self.step = step
         self.reso = reso
@@ -1412,6 +2795,276 @@ class Quiver(object):
         self.linewidth = linewidth
         self.color = color
         self.alpha = alpha
+        self.arrows_per_inch = arrows_per_inch
+
+
+# -----------------------------------------------------------------------
+# -                        Phase instrumentation                        -
+# -----------------------------------------------------------------------
+
+
+# PlotTracer of the current thread/asyncio task, None if not tracing
+_tracer_scope = contextvars.ContextVar('gplot_tracer', default=None)
+
+
+def countArtists(figure):
+    '''Count the artists and vertices in a figure
+
+    Args:
+        figure (matplotlib Figure): figure to count.
+    Returns:
+        n_artists (int): number of artists, including the figure itself.
+        n_vertices (int): number of path vertices in collections, lines,
+            patches and mesh grids.
+    '''
+
+    from matplotlib.collections import Collection, QuadMesh
+    from matplotlib.lines import Line2D
+    from matplotlib.patches import Patch
+
+    n_artists = 0
+    n_vertices = 0
+    for aii in figure.findobj():
+        n_artists += 1
+        if isinstance(aii, QuadMesh):
+            coords = getattr(aii, '_coordinates', None)
+            if coords is not None:
+                n_vertices += coords.shape[0] * coords.shape[1]
+        elif isinstance(aii, Collection):
+            n_vertices += sum([len(pii.vertices) for pii in aii.get_paths()])
+        elif isinstance(aii, Line2D):
+            n_vertices += len(aii.get_xydata())
+        elif isinstance(aii, Patch):
+            n_vertices += len(aii.get_path().vertices)
+
+    return n_artists, n_vertices
+
+
+class PlotTracer(object):
+    '''Record the time, memory and artists of plotting phases'''
+    def __init__(self, memory=False, artists=True, callbacks=None):
+        '''Record the time, memory and artists of plotting phases
+
+        Keyword Args:
+            memory (bool): whether to record the bytes allocated in each
+                phase, using tracemalloc. This slows down plotting.
+            artists (bool): whether to record the changes in the numbers of
+                artists and vertices of the figure in each phase. Can be
+                negative if a phase removes artists, e.g. default axis ticks.
+            callbacks (list or None): functions called with each phase
+                record (dict) when the phase finishes.
+
+        Use as a context manager, plotting phases (e.g. _plot, plotAxes,
+        plotColorbar, plotTitle, createBmap, plotOthers) of plots created
+        in the same thread inside the block are recorded. E.g.
+
+            with PlotTracer(memory=True) as tracer:
+                plotobj = plot2(var, Isofill(var), ax)
+            print(plotobj.trace)
+            tracer.saveChromeTrace('trace.json')
+
+        Each plot obj gets a `trace` attribute with its own phases, see
+        getTrace(). The records of all plots can be exported as Chrome
+        trace-event json (viewed in chrome://tracing or Perfetto).
+        '''
+
+        self.memory = memory
+        self.artists = artists
+        self.callbacks = list(callbacks or [])
+        self.records = []
+        # records of the plots being traced, by token, see newToken()
+        self._plot_records = {}
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self._depth = threading.local()
+        self._token = None
+        self._started_tracemalloc = False
+        self._t0 = time.perf_counter()
+
+    def __enter__(self):
+        if self.memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+        self._t0 = time.perf_counter()
+        self._token = _tracer_scope.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _tracer_scope.reset(self._token)
+        self._token = None
+        if self._started_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def newToken(self):
+        '''Get a new token to identify the phases of a plot
+
+        Returns:
+            token (int): unique in this tracer, unlike id() of plot objs,
+                which can be reused after they are garbage collected.
+        '''
+
+        with self._lock:
+            return next(self._tokens)
+
+    @contextlib.contextmanager
+    def phase(self, name, plotobj=None, token=None):
+        '''Record a phase
+
+        Args:
+            name (str): name of the phase.
+        Keyword Args:
+            plotobj (Plot2D or None): plot obj the phase belongs to.
+            token (int or None): token of the plot, see newToken(). If given,
+                the record is also kept for getTrace().
+        '''
+
+        depth = getattr(self._depth, 'value', 0)
+        self._depth.value = depth + 1
+
+        figure = None
+        if self.artists and plotobj is not None and\
+                getattr(plotobj, 'ax', None) is not None:
+            figure = plotobj.ax.get_figure()
+        if figure is not None:
+            artists0, vertices0 = countArtists(figure)
+        if self.memory:
+            import tracemalloc
+            mem0 = tracemalloc.get_traced_memory()[0]
+
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter()
+            self._depth.value = depth
+
+            record = {
+                'name': name,
+                'class': type(plotobj).__name__ if plotobj is not None else None,
+                'method': getattr(getattr(plotobj, 'method', None), 'method',
+                                  None),
+                'start': t0 - self._t0,
+                'duration': t1 - t0,
+                'depth': depth,
+                'thread': threading.get_ident(),
+                'plot_id': token
+            }
+            if self.memory:
+                record['alloc_bytes'] = tracemalloc.get_traced_memory()[0] - mem0
+            if figure is not None:
+                artists1, vertices1 = countArtists(figure)
+                record['artists'] = artists1 - artists0
+                record['vertices'] = vertices1 - vertices0
+
+            with self._lock:
+                self.records.append(record)
+                if token is not None:
+                    self._plot_records.setdefault(token, []).append(record)
+            for fii in self.callbacks:
+                fii(record)
+
+    def getTrace(self, token):
+        '''Get the records of a plot as a plain dict
+
+        Args:
+            token (int): token of the plot, see newToken(). The records are
+                handed over and not kept for the token afterwards.
+        Returns:
+            result (dict): with keys 'phases': list of the phase records,
+                in the order they finished, and 'summary': dict of phase
+                name to the summed 'duration' (and 'alloc_bytes', 'artists',
+                'vertices' if recorded) and 'count'.
+        '''
+
+        with self._lock:
+            phases = [dict(rii) for rii in self._plot_records.pop(token, [])]
+
+        summary = {}
+        for rii in phases:
+            sii = summary.setdefault(rii['name'], {'count': 0})
+            sii['count'] += 1
+            for kk in ['duration', 'alloc_bytes', 'artists', 'vertices']:
+                if kk in rii:
+                    sii[kk] = sii.get(kk, 0) + rii[kk]
+
+        return {'phases': phases, 'summary': summary}
+
+    def toChromeTrace(self):
+        '''Export all records in the Chrome trace-event format
+
+        Returns:
+            result (dict): {'traceEvents': [...]}, json serializable, with
+                a complete ('X') event per phase. Times are in microseconds.
+        '''
+
+        pid = os.getpid()
+        events = []
+        with self._lock:
+            records = list(self.records)
+        for rii in records:
+            args = dict((kk, vv) for kk, vv in rii.items() if kk not in
+                        ['name', 'start', 'duration', 'thread'])
+            events.append({
+                'name': rii['name'],
+                'cat': 'gplot',
+                'ph': 'X',
+                'ts': rii['start'] * 1e6,
+                'dur': rii['duration'] * 1e6,
+                'pid': pid,
+                'tid': rii['thread'],
+                'args': args})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def saveChromeTrace(self, abpath_out):
+        '''Save all records as Chrome trace-event json
+
+        Args:
+            abpath_out (str): path to the output json file.
+        '''
+
+        with open(abpath_out, 'w') as fout:
+            json.dump(self.toChromeTrace(), fout)
+
+        return
+
+
+def tracePhase(func):
+    '''Decorator to record a method of a plot obj as a phase
+
+    The method is called as is if no PlotTracer is active. When the
+    outermost phase of a plot obj finishes, its records are put into
+    the `trace` attribute of the plot obj.
+    '''
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        tracer = _tracer_scope.get()
+        if tracer is None:
+            return func(self, *args, **kwargs)
+
+        # token of the outermost phase, shared by the nested ones
+        token = getattr(self, '_tracing', None)
+        outermost = token is None
+        if outermost:
+            token = self._tracing = tracer.newToken()
+        try:
+            with tracer.phase(func.__name__, self, token):
+                result = func(self, *args, **kwargs)
+        finally:
+            if outermost:
+                self._tracing = None
+                trace = tracer.getTrace(token)
+        if outermost:
+            self.trace = trace
+
+        return result
+
+    return wrapper
 
 
 # -----------------------------------------------------------------------
@@ -1426,6 +3079,13 @@ class Plot2D(object):
     which handles equivalent plotting with geographical map projections.
     '''
 
+    # records of the plotting phases if plotted in a PlotTracer
+    trace = None
+
+    # attributes holding data arrays and artists, dropped by release()
+    _data_attrs = ('var', 'lons', 'lats')
+    _artist_attrs = ('ax', 'cs', 'cbar', 'bmap', '_transform')
+
     def __init__(self, var, method, ax=None, xarray=None, yarray=None,
                  title=None, label_axes=True, axes_grid=False, legend='global',
                  legend_ori='horizontal', clean=False, fontsize=None,
@@ -1482,18 +3142,22 @@ class Plot2D(object):
         '''
 
         # get kwargs
-        fill_color = fill_color or rcParams['fill_color']
-        #title = title or rcParams['title']
-        label_axes = label_axes or rcParams['label_axes']
-        axes_grid = axes_grid or rcParams['axes_grid']
-        fontsize = fontsize or rcParams['fontsize']
-        clean = clean or rcParams['clean']
-        #legend = legend or rcParams['legend']
-        legend_ori = legend_ori or rcParams['legend_ori']
+        params = getParams()
+        fill_color = fill_color or params['fill_color']
+        #title = title or params['title']
+        label_axes = label_axes or params['label_axes']
+        axes_grid = axes_grid or params['axes_grid']
+        fontsize = fontsize or params['fontsize']
+        clean = clean or params['clean']
+        #legend = legend or params['legend']
+        legend_ori = legend_ori or params['legend_ori']
 
         self.var = var
         self.method = method
-        self.ax = ax or plt.subplot(111)
+        if ax is None:
+            import matplotlib.pyplot as plt
+            ax = plt.subplot(111)
+        self.ax = ax
         self.xarray = xarray
         self.yarray = yarray
 
@@ -1522,6 +3186,33 @@ class Plot2D(object):
         if not hasattr(self.ax, '_gplot_geo'):
             self.ax._gplot_geo = self.geo + (self.subidx,)
 
+    def release(self, method=True, artists=False):
+        '''Release the data arrays after plotting
+
+        Keyword Args:
+            method (bool): whether to also release the inputs of the plotting
+                method, see PlotMethod.release().
+            artists (bool): whether to also drop the references to the axis,
+                the mappable, colorbar and map objs. A kept plot obj
+                otherwise keeps its whole figure alive, even after the figure
+                is closed.
+
+        Drops the references to the data slab and the 2D coordinate meshes,
+        so a plot obj kept after plotting doesn't keep the data in memory.
+        The plot obj can't be re-plotted afterwards.
+        '''
+
+        for kk in self._data_attrs:
+            setattr(self, kk, None)
+        if artists:
+            for kk in self._artist_attrs:
+                if kk in self.__dict__:
+                    setattr(self, kk, None)
+        if method and hasattr(self.method, 'release'):
+            self.method.release()
+
+        return
+
     # ---------------------Get grid---------------------
 
     def getGrid(self):
@@ -1596,6 +3287,7 @@ class Plot2D(object):
 
         return extend
 
+    @tracePhase
     def plot(self):
         '''Main plotting interface
 
@@ -1615,6 +3307,7 @@ class Plot2D(object):
 
         return self.cs
 
+    @tracePhase
     def _plot(self):
         '''Core plotting function
 
@@ -1654,6 +3347,7 @@ class Plot2D(object):
 
         return cs
 
+    @tracePhase
     def _plotIsofill(self):
         '''Core plotting function, isofill/contourf'''
 
@@ -1677,6 +3371,7 @@ class Plot2D(object):
 
         return cs
 
+    @tracePhase
     def _plotIsoline(self):
         '''Core plotting function, isoline/contour'''
 
@@ -1736,6 +3431,7 @@ class Plot2D(object):
             # save the old xaxis formatter
             old_formatter = self.ax.xaxis.get_major_formatter()
             # get a new scalar formatter
+            from matplotlib import ticker
             formatter = ticker.ScalarFormatter()
             # for some reason one needs to set as major and call format_ticks()
             # before this thing can do formatter(value)
@@ -1754,6 +3450,7 @@ class Plot2D(object):
         return
 
 
+    @tracePhase
     def _plotBoxfill(self):
         '''Core plotting function, boxfill/imshow'''
 
@@ -1770,6 +3467,7 @@ class Plot2D(object):
 
         return cs
 
+    @tracePhase
     def _plotPcolor(self):
         '''Core plotting function, pcolormesh'''
 
@@ -1781,6 +3479,7 @@ class Plot2D(object):
 
         return cs
 
+    @tracePhase
     def _plotHatch(self):
         '''Core plotting function, pattern hatching'''
 
@@ -1792,6 +3491,7 @@ class Plot2D(object):
         cs = self.ax.contourf(
             self.lons[0, :],
             self.lats[:, 0],
+            self.var, nlevel, colors='none',
             hatches=[None, self.method.hatch],
             alpha=self.method.alpha)
 
@@ -1806,6 +3506,7 @@ class Plot2D(object):
 
         return cs
 
+    @tracePhase
     def _plotShading(self):
         '''Core plotting function, color shading'''
 
@@ -1889,6 +3590,7 @@ class Plot2D(object):
 
         return parallels, meridians
 
+    @tracePhase
     def plotAxes(self):
         '''Plot axes ticks and ticklabels'''
 
@@ -1909,6 +3611,7 @@ class Plot2D(object):
         parallels, meridians = self.getLabelBool()
 
         # get tick labels
+        from matplotlib.ticker import MaxNLocator
         loclatlon = MaxNLocator(nbins='auto', steps=[
             #1, 2, 2.5, 3, 4, 5, 6, 7, 8, 8.5, 9, 10])
                                 1, 2, 4, 5, 8, 10])
@@ -2000,13 +3703,14 @@ class Plot2D(object):
         #cb.set_ticklabels(xtl[::2])
         '''
 
-        # tick all to get label text strings first
-        cbar.set_ticks(ticks)
+        # format all ticks together to get consistent label text strings,
+        # then reuse them for both the bottom and top labels
         formatter = cbar.ax.xaxis.get_major_formatter()
         ticklabels = formatter.format_ticks(ticks)
 
         # tick bottom
         cbar.set_ticks(lbot)
+        cbar.set_ticklabels(ticklabels[1:][::2])
 
         # --------------Print top tick labels--------------
         vmin = cbar.norm.vmin
@@ -2029,18 +3733,18 @@ class Plot2D(object):
             scaling = 1.
 
         if self.legend_ori == 'horizontal':
-            for ii in range(len(ticklabels[::2])):
-                tii = ltop[ii]
-                tlii = ticklabels[::2][ii]
-                xii = shift_l+scaling*(tii-vmin)/(vmax-vmin)
-                # plot ticks
-                cbar.ax.plot([xii, xii],
-                             [1.0, 1.35],
-                             'k-', linewidth=0.5,
-                             clip_on=False,
-                             transform=cbar.ax.transAxes)
-
-                # plot tick labels
+            xs = shift_l+scaling*(np.asarray(ltop, dtype='float')-vmin)/(vmax-vmin)
+
+            # plot ticks, all in 1 collection
+            from matplotlib.collections import LineCollection
+            segments = [[(xii, 1.0), (xii, 1.35)] for xii in xs]
+            tick_lines = LineCollection(
+                segments, colors='k', linewidths=0.5, clip_on=False,
+                transform=cbar.ax.transAxes)
+            cbar.ax.add_collection(tick_lines, autolim=False)
+
+            # plot tick labels
+            for xii, tlii in zip(xs, ticklabels[::2]):
                 cbar.ax.text(xii,
                              1.25, tlii,
                              transform=cbar.ax.transAxes, va='bottom',
@@ -2048,6 +3752,7 @@ class Plot2D(object):
 
         return cbar
 
+    @tracePhase
     def plotColorbar(self):
         '''Plot colorbar
 
@@ -2057,6 +3762,8 @@ class Plot2D(object):
         Only creates a colorbar for isofill/contourf or isoline/contour plots.
         '''
 
+        import matplotlib.colorbar as mcbar
+
         if self.method.method in ['hatch', 'shading']:
             return
 
@@ -2100,7 +3807,7 @@ class Plot2D(object):
             elif self.method.method in ['isofill', 'isoline']:
                 if self.legend_ori == 'horizontal':
                     # compute extra padding needed for the top side tick labels
-                    dummybox = createDummyTextBox(self.ax, self._fontsize)
+                    dummybox = getTextBox(self.ax, self._fontsize)
                     pad = getColorbarPad(
                         self.ax, self.legend_ori, base_pad=dummybox.height*1.5)
                 else:
@@ -2124,13 +3831,13 @@ class Plot2D(object):
                             subplots, orientation=self.legend_ori, shrink=0.85,
                             pad=0.01, fraction=0.07, aspect=35)
                     else:
-                        dummybox = createDummyTextBox(self.ax, self._fontsize)
+                        dummybox = getTextBox(self.ax, self._fontsize)
                         pad = dummybox.height*1.2
                         cax, kw = mcbar.make_axes(
                             subplots, orientation=self.legend_ori, shrink=0.85,
                             pad=pad, fraction=0.07, aspect=35)
                 else:
-                    dummybox = createDummyTextBox(self.ax, self._fontsize)
+                    dummybox = getTextBox(self.ax, self._fontsize)
                     pad = dummybox.height*0.85
                     height = 0.02
                     fig.subplots_adjust(bottom=0.18)
@@ -2148,7 +3855,7 @@ class Plot2D(object):
                         [0.95, 0.20, 0.02, 0.6])
 
         # ------------------Plot colorbar------------------
-        cbar = plt.colorbar(
+        cbar = self.ax.get_figure().colorbar(
             self.cs, cax=cax, orientation=self.legend_ori,
             ticks=ticks,
             drawedges=isdrawedges, extend=extend)
@@ -2183,6 +3890,7 @@ class Plot2D(object):
 
         return cbar
 
+    @tracePhase
     def plotTitle(self):
         '''Plot title
 
@@ -2234,6 +3942,9 @@ class Plot2Quiver(Plot2D):
     which handles equivalent plotting with geographical map projections.
     '''
 
+    _data_attrs = Plot2D._data_attrs + ('v', )
+    _artist_attrs = Plot2D._artist_attrs + ('quiver', 'qkey')
+
     def __init__(
             self, u, v, method, ax=None, xarray=None, yarray=None,
             title=None, label_axes=True, axes_grid=False,
@@ -2285,12 +3996,13 @@ class Plot2Quiver(Plot2D):
             curve (bool): whether to plot quivers as curved vectors. Experimental.
         '''
 
-        fill_color = fill_color or rcParams['fill_color']
-        title = title or rcParams['title']
-        label_axes = label_axes or rcParams['label_axes']
-        axes_grid = axes_grid or rcParams['axes_grid']
-        fontsize = fontsize or rcParams['fontsize']
-        clean = clean or rcParams['clean']
+        params = getParams()
+        fill_color = fill_color or params['fill_color']
+        title = title or params['title']
+        label_axes = label_axes or params['label_axes']
+        axes_grid = axes_grid or params['axes_grid']
+        fontsize = fontsize or params['fontsize']
+        clean = clean or params['clean']
 
         Plot2D.__init__(self, u, method, ax=ax,
                         xarray=xarray, yarray=yarray,
@@ -2315,16 +4027,24 @@ class Plot2Quiver(Plot2D):
             self.v = regridToReso(
                 self.v, yy, xx, self.method.reso, self.method.reso, lat_idx=-2,
                 lon_idx=-1, method='linear', return_coords=False)
-        else:
+        elif self.step != 'auto':
             # ---------------------Spacing---------------------
             self.var = self.var[::self.step, ::self.step]
             self.v = self.v[::self.step, ::self.step]
             self.xarray = self.xarray[::self.step]
             self.yarray = self.yarray[::self.step]
+        # if self.step == 'auto', sub-sample at plotting time when the
+        # axes size and map projection are known. See subSample().
 
         # ---------------------Get grid---------------------
         self.xarray, self.yarray, self.lons, self.lats = self.getGrid()
 
+        # --------Sample vector magnitudes for quiver key--------
+        if self.method.keylength is None:
+            self.magnitude_sketch = MagnitudeSketch()
+            self.magnitude_sketch.update(self.var, self.v)
+
+    @tracePhase
     def plot(self):
         '''Main plotting interface
 
@@ -2345,6 +4065,79 @@ class Plot2Quiver(Plot2D):
 
         return self.quiver
 
+    def projectGrid(self, lons, lats):
+        '''Project x- and y- coordinates into the plotting coordinates
+
+        Args:
+            lons,lats (ndarray): 2d array of the x- and y- coordinates.
+        Returns:
+            xs,ys (ndarray): 2d array of the x- and y- coordinates in the
+                plotting coordinates. Same as inputs for non-geographical
+                plots, overwritten by the geographical plotting classes.
+        '''
+
+        return lons, lats
+
+    def getAutoStep(self):
+        '''Get a sub-sampling step from the axes size and arrow density
+
+        Returns:
+            step (int): sub-sample step such that the median spacing between
+                projected neighbouring arrows is about
+                1/<self.method.arrows_per_inch> inch.
+        '''
+
+        xs, ys = self.projectGrid(self.lons, self.lats)
+        # mask out points failed to project, e.g. basemap gives 1e30
+        invalid = ~np.isfinite(xs) | ~np.isfinite(ys) |\
+            (np.abs(xs) > 1e20) | (np.abs(ys) > 1e20)
+        xs = np.ma.masked_where(invalid, xs)
+        ys = np.ma.masked_where(invalid, ys)
+
+        # axes size in inches
+        fig = self.ax.get_figure()
+        bbox = self.ax.get_position()
+        width = bbox.width * fig.get_figwidth()
+        height = bbox.height * fig.get_figheight()
+
+        # inches per unit of plotting coordinates
+        xrange = xs.max() - xs.min()
+        yrange = ys.max() - ys.min()
+        if not xrange > 0 or not yrange > 0:
+            return 1
+        scalex = width / xrange
+        scaley = height / yrange
+        if self.ax.get_aspect() in ['equal', 1.0]:
+            scalex = scaley = min(scalex, scaley)
+
+        # spacing of neighbours along the x- and y- dimensions, in inches
+        dx = np.ma.hypot(np.diff(xs, axis=1)*scalex, np.diff(ys, axis=1)*scaley)
+        dy = np.ma.hypot(np.diff(xs, axis=0)*scalex, np.diff(ys, axis=0)*scaley)
+        spacing = min(np.ma.median(dx), np.ma.median(dy))
+        if not spacing > 0:
+            return 1
+
+        step = int(np.ceil(1. / self.method.arrows_per_inch / spacing))
+
+        return max(1, step)
+
+    def subSample(self, step):
+        '''Sub-sample vectors and coordinates using a given step
+
+        Args:
+            step (int): sub-sample steps in both x- and  y- axes.
+        '''
+
+        self.step = step
+        self.var = self.var[::step, ::step]
+        self.v = self.v[::step, ::step]
+        self.xarray = self.xarray[::step]
+        self.yarray = self.yarray[::step]
+        self.lons, self.lats = np.meshgrid(self.xarray, self.yarray)
+
+        return
+
+    @tracePhase
     def _plot(self):
         '''Core quiver plotting function
 
@@ -2352,12 +4145,16 @@ class Plot2Quiver(Plot2D):
             self.quiver (mappable): the quiver obj, i.e. return value quiver().
         '''
 
+        if self.step == 'auto':
+            self.subSample(self.getAutoStep())
+
         self.ax.patch.set_color(self.fill_color)
 
         if self.curve:
             warnings.warn(
                 '#<gplot warning>: The curved quiver functionality is experimental.')
             grains = int((len(self.xarray)+len(self.yarray)))
+            from gplot.lib import modplot
             quiver = modplot.velovect(self.ax, self.lons, self.lats, self.var,
                                       self.v, scale=15,
                                       grains=grains, color=self.method.color)
@@ -2370,6 +4167,7 @@ class Plot2Quiver(Plot2D):
 
         return quiver
 
+    @tracePhase
     def plotkey(self):
         '''Plot the reference quiver key
 
@@ -2378,21 +4176,9 @@ class Plot2Quiver(Plot2D):
         '''
 
         if self.method.keylength is None:
-            # compute a keylength based on vector magnitudes
-            # 1. use median.
-            # keylength=np.median(np.sqrt(self.var.data**2+self.v.data**2))
-            # 2. use 80th percentile
-            slab = np.sqrt(np.array(self.var)**2 +
-                           np.array(self.v)**2).flatten()
-            slab = np.where(slab == np.inf, np.nan, slab)
-            keylength = np.nanpercentile(slab[slab>0], 80)
-
-            # scale to 10-100
-            lg = -np.log10(keylength)+2.
-            il = np.floor(lg)
-            keylength = keylength*10.**il
-            # round to a nice integer
-            keylength = np.around((keylength/10.), 0)*10/(10.**il)
+            # compute a keylength based on vector magnitudes:
+            # use 80th percentile from the sampled magnitudes
+            keylength = self.magnitude_sketch.keyLength(80)
         else:
             keylength = self.method.keylength
 
@@ -2417,8 +4203,9 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
         var (ndarray): input data to plot. Determines what to plot.
             Mush have dimensions >= 2.
             For data with rank>2, take the slab from the last 2 dimensions.
-        method (PlotMethod): plotting method. Determines how to plot.
-            Could be Isofill, Isoline, Boxfill, Quiver, Shading, Hatch, GIS.
+        method (PlotMethod or SharedLevels): plotting method. Determines how
+            to plot. Could be Isofill, Isoline, Boxfill, Quiver, Shading,
+            Hatch, GIS. If SharedLevels, use its shared plotting method.
     Keyword Args:
         ax (matplotlib axis or None): axis obj. Determines where to plot.
             If None, create a new.
@@ -2472,13 +4259,27 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
         fill_color (str or color tuple): color to use as background color.
             If data have missings, they will be shown as this color.
             It is better to use a grey than while to better distinguish missings.
+        lean (bool): if True, release the data arrays of the plot obj after
+            plotting, see Plot2D.release(). Plotting methods created with
+            this parameter on also keep only a summary of their data.
     Returns:
         plotobj (Plot2D obj).
     '''
 
     # get kwargs
-    newkwargs = copy.deepcopy(rcParams)
-    newkwargs.update(kwargs)
+    newkwargs = getParams().override(**kwargs)
+
+    with useParams(newkwargs):
+        return _plot2(var, method, ax, xarray, yarray, var_v, newkwargs)
+
+
+def _plot2(var, method, ax, xarray, yarray, var_v, newkwargs):
+    '''Create and plot a Plot2D obj using parameters in <newkwargs>
+
+    See plot2() for the arguments. <newkwargs> is a Params with all the keys
+    in rcParams, global rcParams are not read.
+    '''
+
     nc_interface = newkwargs['nc_interface']
     geo_interface = newkwargs['geo_interface']
     fill_color = newkwargs['fill_color']
@@ -2508,6 +4309,9 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
     if np.ndim(var) == 1:
         raise Exception("<var> is 1D")
 
+    if isinstance(method, SharedLevels):
+        method = method.getMethod()
+
     if nc_interface == 'cdat':
         from gplot.lib.cdat_utils import checkGeomap
     elif nc_interface == 'netcdf4':
@@ -2521,11 +4325,6 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
 
     # -------------------Quiver plot-------------------
     if var_v is not None and isinstance(method, Quiver):
-        if geo_interface == 'basemap':
-            from gplot.lib.basemap_utils import Plot2QuiverBasemap as Plot2Geo
-        elif geo_interface == 'cartopy':
-            from gplot.lib.cartopy_utils import Plot2QuiverCartopy as Plot2Geo
-
         isgeo2_v, var_v, _, _ = checkGeomap(var_v, xarray, yarray)
 
         if fill_color == '0.8':
@@ -2533,6 +4332,11 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
             fill_color = 'w'
 
         if isgeomap and isgeo2 and isgeo2_v:
+            if geo_interface == 'basemap':
+                from gplot.lib.basemap_utils import Plot2QuiverBasemap as Plot2Geo
+            elif geo_interface == 'cartopy':
+                from gplot.lib.cartopy_utils import Plot2QuiverCartopy as Plot2Geo
+
             plotobj = Plot2Geo(
                 var2, var_v, method, ax=ax, xarray=xx, yarray=yy,
                 title=title, label_axes=label_axes, axes_grid=axes_grid,
@@ -2547,13 +4351,9 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
 
     # ---------------Other types of plots---------------
     else:
-        if geo_interface == 'basemap':
-            from gplot.lib.basemap_utils import Plot2Basemap as Plot2Geo
-        elif geo_interface == 'cartopy':
-            from gplot.lib.cartopy_utils import Plot2Cartopy as Plot2Geo
-
         if isgeomap and isgeo2:
             if geo_interface == 'basemap':
+                from gplot.lib.basemap_utils import Plot2Basemap as Plot2Geo
                 plotobj = Plot2Geo(
                     var2, method, ax=ax, legend=legend, xarray=xx, yarray=yy,
                     title=title, label_axes=label_axes, axes_grid=axes_grid,
@@ -2561,6 +4361,7 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
                     bmap=bmap, fontsize=fontsize,
                     legend_ori=legend_ori, clean=clean, fix_aspect=fix_aspect)
             elif geo_interface == 'cartopy':
+                from gplot.lib.cartopy_utils import Plot2Cartopy as Plot2Geo
                 plotobj = Plot2Geo(
                     var2, method, ax=ax, legend=legend, xarray=xx, yarray=yy,
                     title=title, label_axes=label_axes, axes_grid=axes_grid,
@@ -2575,4 +4376,258 @@ def plot2(var, method, ax=None, xarray=None, yarray=None, var_v=None, **kwargs):
                 fill_color=fill_color)
     plotobj.plot()
 
+    if newkwargs['lean']:
+        # the method follows its own <lean> flag
+        plotobj.release(method=False)
+
     return plotobj
+
+
+class RenderContext(object):
+    '''Rendering context independent from pyplot'''
+    def __init__(self, figsize=(12, 10), dpi=100, constrained_layout=False,
+                 **kwargs):
+        '''Rendering context independent from pyplot
+
+        Keyword Args:
+            figsize (tuple): figure size in inches.
+            dpi (int): figure resolution.
+            constrained_layout (bool): whether to use constrained layout in
+                the figure.
+            **kwargs: parameters of this context, overriding the current
+                ones (see getParams()), e.g. legend, nc_interface, projection.
+
+        The figure is attached to an Agg canvas directly, and is not
+        managed by pyplot. The current parameters are taken at creation, so
+        later changes to the global rcParams don't affect this context.
+        Different contexts can render concurrently in different threads,
+        while a single context should be used by 1 thread only. E.g.
+
+            with RenderContext(figsize=(8, 6), nc_interface='netcdf4') as ctx:
+                ctx.plot2(var, Isofill(var))
+                ctx.savefig('out.png')
+        '''
+
+        unknown = set(kwargs).difference(rcParams)
+        if len(unknown) > 0:
+            raise Exception("Unknown parameters: %s" % ', '.join(sorted(unknown)))
+
+        self.params = getParams().override(**kwargs)
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.figure = Figure(figsize=figsize, dpi=dpi,
+                             constrained_layout=constrained_layout)
+        self.canvas = FigureCanvasAgg(self.figure)
+        # plot objs created in this context, released in close()
+        self.plots = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def addSubplot(self, *args, **kwargs):
+        '''Add a subplot axis to the figure
+
+        Args and kwargs are passed to `Figure.add_subplot()`.
+        Returns:
+            ax (matplotlib axis): new axis.
+        '''
+
+        return self.figure.add_subplot(*args, **kwargs)
+
+    def plot2(self, var, method, ax=None, xarray=None, yarray=None,
+              var_v=None, **kwargs):
+        '''2D plotting in this context
+
+        Args:
+            var (ndarray): input data to plot.
+            method (PlotMethod or SharedLevels): plotting method.
+        Keyword Args:
+            ax (matplotlib axis or None): axis obj in this context's figure.
+                If None, create a single subplot in the figure.
+            xarray (1darray or None): array to use as the x-coordinates.
+            yarray (1darray or None): array to use as the y-coordinates.
+            var_v (ndarray or None): if a quiver plot, the y-component of
+                the velocity data.
+            **kwargs: parameters overriding those of this context.
+        Returns:
+            plotobj (Plot2D obj).
+
+        See plot2() for more details.
+        '''
+
+        if ax is None:
+            if len(self.figure.axes) > 0:
+                raise Exception("<ax> needs to be given if the figure has axes.")
+            ax = self.addSubplot(111)
+        elif ax.get_figure() is not self.figure:
+            raise Exception("<ax> not in the figure of this context.")
+
+        params = self.params.override(**kwargs)
+
+        with useParams(params):
+            plotobj = _plot2(var, method, ax, xarray, yarray, var_v, params)
+        self.plots.append(plotobj)
+
+        return plotobj
+
+    def savefig(self, fname, **kwargs):
+        '''Save figure to file
+
+        Args:
+            fname (str or file-like): output file name or file obj.
+        Keyword Args:
+            **kwargs: passed to `Figure.savefig()`.
+        '''
+
+        self.figure.savefig(fname, **kwargs)
+
+    def getBytes(self, fmt='png', compress_level=6, quality=80,
+                 lossless=False):
+        '''Render the figure into bytes in memory
+
+        Keyword Args:
+            fmt (str): output format, 'png', 'webp' or 'svg'.
+            compress_level (int): zlib compression level of png, in [0, 9].
+                Lower is faster but gives larger outputs.
+            quality (int): quality of lossy webp, in [0, 100].
+            lossless (bool): whether to use lossless webp.
+        Returns:
+            result (bytes): encoded image.
+            timing (dict): time in seconds to 'draw' and to 'encode' the
+                figure. For svg, drawing and encoding are done together and
+                are all counted in 'encode'.
+
+        png and webp are rasterized by the Agg canvas and encoded by Pillow.
+        '''
+
+        fmt = fmt.lower()
+        if fmt not in ['png', 'webp', 'svg']:
+            raise Exception("Output format not supported: %s" % fmt)
+        if compress_level < 0 or compress_level > 9:
+            raise Exception("<compress_level> needs to be an int in [0, 9].")
+
+        buf = io.BytesIO()
+        timing = {'draw': 0.}
+
+        if fmt == 'svg':
+            t0 = time.perf_counter()
+            self.figure.savefig(buf, format='svg', dpi=self.figure.dpi)
+            timing['encode'] = time.perf_counter() - t0
+            return buf.getvalue(), timing
+
+        try:
+            from PIL import Image
+        except ImportError:
+            raise Exception("Pillow is required to encode %s." % fmt)
+
+        t0 = time.perf_counter()
+        self.canvas.draw()
+        width, height = self.canvas.get_width_height()
+        img = Image.frombuffer('RGBA', (width, height),
+                               self.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+        t1 = time.perf_counter()
+
+        if fmt == 'png':
+            img.save(buf, format='png', compress_level=compress_level,
+                     dpi=(self.figure.dpi, self.figure.dpi))
+        else:
+            img.save(buf, format='webp', quality=quality, lossless=lossless)
+        t2 = time.perf_counter()
+
+        timing['draw'] = t1 - t0
+        timing['encode'] = t2 - t1
+
+        return buf.getvalue(), timing
+
+    def close(self):
+        '''Clear the figure, release all artists and the data of the plots
+
+        The plotting methods are not released, as they may be reused by
+        the caller.
+        '''
+
+        for pii in self.plots:
+            pii.release(method=False, artists=True)
+        self.plots = []
+        self.figure.clear()
+
+
+def plot2Bytes(var, method, xarray=None, yarray=None, var_v=None, fmt='png',
+               figsize=(12, 10), dpi=100, compress_level=6, quality=80,
+               lossless=False, cache=None, **kwargs):
+    '''2D plotting into in-memory image bytes
+
+    Args:
+        var (ndarray): input data to plot.
+        method (PlotMethod or SharedLevels): plotting method.
+    Keyword Args:
+        xarray (1darray or None): array to use as the x-coordinates.
+        yarray (1darray or None): array to use as the y-coordinates.
+        var_v (ndarray or None): if a quiver plot, the y-component of
+            the velocity data.
+        fmt (str): output format, 'png', 'webp' or 'svg'.
+        figsize (tuple): figure size in inches.
+        dpi (int): figure resolution.
+        compress_level (int): zlib compression level of png, in [0, 9].
+        quality (int): quality of lossy webp, in [0, 100].
+        lossless (bool): whether to use lossless webp.
+        cache (RenderCache or None): if given, return the cached image if
+            the same plot has been rendered before, otherwise render and
+            save into the cache. See gplot.lib.cache_utils.RenderCache.
+        **kwargs: other parameters, see plot2().
+    Returns:
+        result (bytes): encoded image.
+        meta (dict): info of the rendering, with keys:
+            'format', 'dpi', 'width', 'height' (in pixels), 'nbytes', and
+            time in seconds to 'plot', 'draw', 'encode', and the 'total'.
+            If <cache> is given, also 'cache_hit' (bool).
+
+    The figure is rendered in a RenderContext, without going through pyplot
+    or writing to disk.
+    '''
+
+    t0 = time.perf_counter()
+    if isinstance(method, SharedLevels):
+        method = method.getMethod()
+
+    if cache is not None:
+        params = dict(getParams().override(**kwargs))
+        key = cache.makeKey(
+            var, method, xarray=xarray, yarray=yarray, var_v=var_v, fmt=fmt,
+            figsize=figsize, dpi=dpi, compress_level=compress_level,
+            quality=quality, lossless=lossless, params=params)
+        result, meta = cache.get(key)
+        if result is not None:
+            meta.update({'cache_hit': True, 'plot': 0., 'draw': 0.,
+                         'encode': 0., 'total': time.perf_counter() - t0})
+            return result, meta
+
+    with RenderContext(figsize=figsize, dpi=dpi, **kwargs) as ctx:
+        ctx.plot2(var, method, xarray=xarray, yarray=yarray, var_v=var_v)
+        t1 = time.perf_counter()
+        result, timing = ctx.getBytes(
+            fmt, compress_level=compress_level, quality=quality,
+            lossless=lossless)
+        width, height = ctx.canvas.get_width_height()
+
+    meta = {
+        'format': fmt.lower(),
+        'dpi': dpi,
+        'width': width,
+        'height': height,
+        'nbytes': len(result),
+        'plot': t1 - t0,
+        'draw': timing['draw'],
+        'encode': timing['encode'],
+        'total': time.perf_counter() - t0
+    }
+
+    if cache is not None:
+        cache.put(key, result, meta)
+        meta['cache_hit'] = False
+
+    return result, meta
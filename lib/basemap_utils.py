@@ -12,7 +12,28 @@ import matplotlib.pyplot as plt
 from matplotlib.pyplot import MaxNLocator
 from mpl_toolkits.basemap import Basemap
 from mpl_toolkits.basemap import addcyclic
-from gplot.lib.base_utils import Plot2D, Plot2Quiver, rcParams
+from gplot.lib.base_utils import Plot2D, Plot2Quiver, getParams, tracePhase
+from gplot.lib import modplot
+
+
+def getBmapKwargs(projection, xarray, yarray, fix_aspect):
+    '''Get the arguments to create a Basemap obj of a data domain
+
+    Args:
+        projection (str): map projection, 'cyl', 'merc' or 'cea'.
+        xarray (1darray): x-coordinates of the data.
+        yarray (1darray): y-coordinates of the data.
+        fix_aspect (bool): passed to the constructor of basemap.
+    Returns:
+        kwargs (dict): keyword arguments of the Basemap constructor, other
+            than <ax>. Basemap objs created with equal arguments are
+            interchangeable.
+    '''
+
+    return {'projection': projection,
+            'llcrnrlat': yarray[0], 'llcrnrlon': xarray[0],
+            'urcrnrlat': yarray[-1], 'urcrnrlon': xarray[-1],
+            'fix_aspect': fix_aspect}
 
 
 class Plot2Basemap(Plot2D):
@@ -83,14 +104,15 @@ class Plot2Basemap(Plot2D):
             bmap (basemap obj or None): reuse an existing basemap obj if not None.
         '''
 
-        fill_color = fill_color or rcParams['fill_color']
-        #title = title or rcParams['title']
-        label_axes = label_axes or rcParams['label_axes']
-        axes_grid = axes_grid or rcParams['axes_grid']
-        fontsize = fontsize or rcParams['fontsize']
-        clean = clean or rcParams['clean']
-        #legend = legend or rcParams['legend']
-        legend_ori = legend_ori or rcParams['legend_ori']
+        params = getParams()
+        fill_color = fill_color or params['fill_color']
+        #title = title or params['title']
+        label_axes = label_axes or params['label_axes']
+        axes_grid = axes_grid or params['axes_grid']
+        fontsize = fontsize or params['fontsize']
+        clean = clean or params['clean']
+        #legend = legend or params['legend']
+        legend_ori = legend_ori or params['legend_ori']
 
         Plot2D.__init__(
             self, var, method, ax=ax, xarray=xarray, yarray=yarray,
@@ -107,6 +129,7 @@ class Plot2Basemap(Plot2D):
         self.isdrawrivers = isdrawrivers
         self.bmap = bmap
 
+    @tracePhase
     def createBmap(self):
         '''Create basemap based on data domain
         '''
@@ -116,12 +139,8 @@ class Plot2Basemap(Plot2D):
             self.projection = 'cyl'
 
         if self.projection in ['cyl', 'merc', 'cea']:
-            bmap = Basemap(
-                projection=self.projection, llcrnrlat=self.yarray[0],
-                llcrnrlon=self.xarray[0],
-                urcrnrlat=self.yarray[-1],
-                urcrnrlon=self.xarray[-1],
-                ax=self.ax, fix_aspect=self.fix_aspect)
+            bmap = Basemap(ax=self.ax, **getBmapKwargs(
+                self.projection, self.xarray, self.yarray, self.fix_aspect))
 
         elif self.projection in ['npaeqd', 'nplaea', 'npstere']:
 
@@ -146,6 +165,7 @@ class Plot2Basemap(Plot2D):
 
         self.bmap = bmap
 
+    @tracePhase
     def _plot(self):
         '''Core plotting function
 
@@ -191,6 +211,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def _plotIsofill(self):
         '''Core plotting function, isofill/contourf'''
 
@@ -213,6 +234,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def _plotIsoline(self):
         '''Core plotting function, isoline/contour'''
 
@@ -266,6 +288,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def _plotBoxfill(self):
         '''Core plotting function, boxfill/imshow'''
 
@@ -275,6 +298,7 @@ class Plot2Basemap(Plot2D):
             vmax=self.method.vmax, interpolation='nearest')
         return cs
 
+    @tracePhase
     def _plotPcolor(self):
         '''Core plotting function, pcolormesh'''
 
@@ -286,6 +310,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def _plotHatch(self):
         '''Core plotting function, pattern hatching'''
 
@@ -309,6 +334,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def _plotShading(self):
         '''Core plotting function, color shading'''
 
@@ -322,6 +348,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def _plotGIS(self):
         '''Core plotting function, ARC GIS image'''
 
@@ -331,6 +358,7 @@ class Plot2Basemap(Plot2D):
 
         return cs
 
+    @tracePhase
     def plotOthers(self):
         '''Plot other map information
 
@@ -359,6 +387,7 @@ class Plot2Basemap(Plot2D):
 
     # ---------------Draw lat, lon grids---------------
 
+    @tracePhase
     def plotAxes(self):
         '''Plot longitude/latitude ticks and ticklabels
 
@@ -588,12 +617,13 @@ class Plot2QuiverBasemap(Plot2Basemap, Plot2Quiver):
             bmap (basemap obj or None): reuse an existing basemap obj if not None.
         '''
 
-        fill_color = fill_color or rcParams['fill_color']
-        title = title or rcParams['title']
-        label_axes = label_axes or rcParams['label_axes']
-        axes_grid = axes_grid or rcParams['axes_grid']
-        fontsize = fontsize or rcParams['fontsize']
-        clean = clean or rcParams['clean']
+        params = getParams()
+        fill_color = fill_color or params['fill_color']
+        title = title or params['title']
+        label_axes = label_axes or params['label_axes']
+        axes_grid = axes_grid or params['axes_grid']
+        fontsize = fontsize or params['fontsize']
+        clean = clean or params['clean']
 
         # basemap obj. When overlaying quiver onto another plot, sometimes
         # the regrid operation will make the data to a slightly different domain,
@@ -619,6 +649,7 @@ class Plot2QuiverBasemap(Plot2Basemap, Plot2Quiver):
             isdrawcontinents=isdrawcontinents, isdrawrivers=isdrawrivers,
             isfillcontinents=isfillcontinents)
 
+    @tracePhase
     def plot(self):
         '''Main plotting interface
 
@@ -637,6 +668,18 @@ class Plot2QuiverBasemap(Plot2Basemap, Plot2Quiver):
 
         return self.quiver
 
+    def projectGrid(self, lons, lats):
+        '''Project longitude/latitude coordinates using the basemap
+
+        Args:
+            lons,lats (ndarray): 2d array of the longitude/latitude coordinates.
+        Returns:
+            xs,ys (ndarray): 2d array of the projected coordinates.
+        '''
+
+        return self.bmap(lons, lats)
+
+    @tracePhase
     def _plot(self):
         '''Core quiver plotting function
 
@@ -648,28 +691,28 @@ class Plot2QuiverBasemap(Plot2Basemap, Plot2Quiver):
         if self.bmap is None:
             self.createBmap()
 
+        if self.step == 'auto':
+            self.subSample(self.getAutoStep())
+
         self.ax.patch.set_color(self.fill_color)
 
         if self.curve:
             # modded from: https://stackoverflow.com/a/65607512/2005415
             warnings.warn(
                 '#<gplot warning>: The curved quiver functionality is experimental.')
-            norm = np.sqrt(self.var**2 + self.v**2)
-            norm_flat = norm.flatten()
-
+            # Integrate backward from every grid point in lon/lat, all
+            # trajectories are projected in one go and drawn as a single
+            # line collection. The longest trajectory spans ~2 grid cells,
+            # others are scaled by the normalized vector magnitudes.
             start_points = np.array(
                 [self.lons.flatten(),
                  self.lats.flatten()]).T
-            scale = .2/np.max(norm)
-
-            for i in range(start_points.shape[0]):
-                self.bmap.streamplot(
-                    self.lons, self.lats, self.var, self.v,
-                    color=self.method.color, start_points=np.array(
-                        [start_points[i, :]]),
-                    minlength=.25 * norm_flat[i] * scale, maxlength=1.0 *
-                    norm_flat[i] * scale, integration_direction='backward',
-                    density=10, arrowsize=0.0)
+            scale = 2. / max(len(self.xarray), len(self.yarray))
+
+            self.streams = modplot.velovect(
+                self.ax, self.xarray, self.yarray, -self.var, -self.v,
+                color=self.method.color, start_points=start_points,
+                scale=scale, grains=1, arrowsize=0, proj=self.bmap)
 
         # -------------------Plot vectors-------------------
         quiver = self.bmap.quiver(
@@ -0,0 +1,251 @@
+'''On-disk cache of rendered images
+
+Images are stored under a key computed from the plotted data, the plotting
+method and the plotting parameters, so identical requests are served from
+disk without re-rendering, e.g.
+
+    cache = RenderCache('/tmp/gplot_cache', max_bytes=256*1024**2)
+    result, meta = plot2Bytes(var, Isofill(var), cache=cache)
+'''
+
+from __future__ import print_function
+import os
+import json
+import hashlib
+import tempfile
+import contextlib
+import numpy as np
+import matplotlib
+from matplotlib.colors import Colormap
+
+try:
+    import fcntl
+except ImportError:
+    # not on posix, locking is skipped
+    fcntl = None
+
+
+def updateFingerprint(h, obj):
+    '''Feed an object into a hash obj
+
+    Args:
+        h (hashlib hash obj): hash to update.
+        obj (any): object to hash. ndarrays are hashed from their memory
+            buffer without copying if C-contiguous. Masked arrays also
+            hash their masks. Colormaps are hashed from their colors.
+            dicts, lists and tuples are hashed recursively, objects with
+            a __dict__ hash their class name and public attributes.
+            Other objects are hashed from their repr().
+    '''
+
+    if isinstance(obj, np.ndarray):
+        h.update(b'ndarray')
+        h.update(str((obj.dtype.str, obj.shape)).encode())
+        if isinstance(obj, np.ma.MaskedArray):
+            mask = np.ma.getmask(obj)
+            if mask is not np.ma.nomask:
+                updateFingerprint(h, mask)
+            obj = np.ma.getdata(obj)
+        if obj.dtype.hasobject:
+            h.update(repr(obj.tolist()).encode())
+        else:
+            obj = np.ascontiguousarray(obj)
+            h.update(memoryview(obj).cast('B'))
+    elif isinstance(obj, dict):
+        h.update(b'dict')
+        for kk in sorted(obj, key=str):
+            updateFingerprint(h, kk)
+            updateFingerprint(h, obj[kk])
+    elif isinstance(obj, (list, tuple)):
+        h.update(type(obj).__name__.encode())
+        for vv in obj:
+            updateFingerprint(h, vv)
+    elif isinstance(obj, Colormap):
+        h.update(b'cmap')
+        updateFingerprint(h, obj(np.linspace(0, 1, obj.N)))
+        updateFingerprint(h, [obj(-np.inf), obj(np.inf), obj(np.nan)])
+    elif isinstance(obj, (str, bytes, bool, int, float, type(None),
+                          np.generic)):
+        h.update(repr(obj).encode())
+    elif hasattr(obj, '__dict__'):
+        h.update(type(obj).__name__.encode())
+        updateFingerprint(h, dict((kk, vv) for kk, vv in vars(obj).items()
+                                  if not kk.startswith('_')))
+    else:
+        h.update(repr(obj).encode())
+
+    return
+
+
+class RenderCache(object):
+    '''Content-addressed on-disk cache of rendered images'''
+    def __init__(self, cache_dir, max_bytes=512*1024**2):
+        '''Content-addressed on-disk cache of rendered images
+
+        Args:
+            cache_dir (str): folder to save cached images. Created if not
+                exist. Can be shared by multiple processes on the same host.
+        Keyword Args:
+            max_bytes (int): maximum total size of cached images, in bytes.
+                When exceeded, the least recently used images are removed.
+
+        Each entry is a single file, written to a temporary file and renamed
+        into place, so readers never see partial entries. Eviction is
+        serialized across processes with a lock file (on posix systems).
+        '''
+
+        if max_bytes <= 0:
+            raise Exception("<max_bytes> needs to be positive.")
+
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.lock_file = os.path.join(self.cache_dir, '.lock')
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def makeKey(self, var, method, **kwargs):
+        '''Compute the cache key of a rendering
+
+        Args:
+            var (ndarray): input data to plot.
+            method (PlotMethod): plotting method.
+        Keyword Args:
+            **kwargs: all other inputs that affect the output, e.g. xarray,
+                yarray, var_v, output format, dpi and plotting parameters.
+        Returns:
+            key (str): hex digest.
+
+        The data in method.vars are not hashed, the resolved range, levels,
+        colormap etc. of <method> are hashed instead.
+        '''
+
+        h = hashlib.blake2b(digest_size=20)
+        h.update(matplotlib.__version__.encode())
+        updateFingerprint(h, var)
+        method_attrs = dict((kk, vv) for kk, vv in vars(method).items()
+                            if kk != 'vars' and not kk.startswith('_'))
+        if hasattr(method, 'resolve'):
+            method_attrs.update(method.resolve())
+        updateFingerprint(h, (type(method).__name__, method_attrs))
+        updateFingerprint(h, kwargs)
+
+        return h.hexdigest()
+
+    def getPath(self, key):
+        '''Get the file path of an entry'''
+
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        '''Read an entry
+
+        Args:
+            key (str): cache key.
+        Returns:
+            result (bytes or None): cached image, None if not found.
+            meta (dict or None): meta info stored with the image.
+        '''
+
+        path = self.getPath(key)
+        try:
+            with open(path, 'rb') as fin:
+                meta = json.loads(fin.readline().decode())
+                result = fin.read()
+            # mark as recently used
+            os.utime(path)
+        except (IOError, OSError, ValueError):
+            # missing, or evicted by another process
+            return None, None
+
+        return result, meta
+
+    def put(self, key, result, meta):
+        '''Write an entry
+
+        Args:
+            key (str): cache key.
+            result (bytes): image to cache.
+            meta (dict): json serializable meta info of the image.
+        '''
+
+        path = self.getPath(key)
+        folder = os.path.dirname(path)
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(json.dumps(meta).encode() + b'\n')
+                fout.write(result)
+            os.replace(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        self.evict()
+
+        return
+
+    @contextlib.contextmanager
+    def lock(self):
+        '''Exclusive lock of the cache folder across processes'''
+
+        with open(self.lock_file, 'a') as fout:
+            if fcntl is not None:
+                fcntl.flock(fout, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fout, fcntl.LOCK_UN)
+
+    def listEntries(self):
+        '''List entries as (last used time, size, path), oldest first'''
+
+        entries = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for eii in os.scandir(sub.path):
+                if eii.name.startswith('.'):
+                    continue
+                try:
+                    stat = eii.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, eii.path))
+        entries.sort()
+
+        return entries
+
+    def evict(self):
+        '''Remove least recently used entries to fit in <max_bytes>'''
+
+        with self.lock():
+            entries = self.listEntries()
+            total = sum([eii[1] for eii in entries])
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+        return
+
+    def clear(self):
+        '''Remove all entries'''
+
+        with self.lock():
+            for _, _, path in self.listEntries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        return
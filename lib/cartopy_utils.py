@@ -8,7 +8,7 @@ from __future__ import print_function
 import numpy as np
 import cartopy.crs as ccrs
 from cartopy.util import add_cyclic_point
-from gplot.lib.base_utils import Plot2D, Plot2Quiver
+from gplot.lib.base_utils import Plot2D, Plot2Quiver, tracePhase
 
 
 class Plot2Cartopy(Plot2D):
@@ -59,6 +59,7 @@ class Plot2Cartopy(Plot2D):
 
         return result
 
+    @tracePhase
     def plotOthers(self):
 
         if self.clean:
@@ -71,6 +72,7 @@ class Plot2Cartopy(Plot2D):
         return
 
     # ---------------Draw lat, lon grids---------------
+    @tracePhase
     def plotAxes(self):
 
         self.plotOthers()
@@ -165,6 +167,7 @@ class Plot2QuiverCartopy(Plot2Cartopy, Plot2Quiver):
             isfillcontinents=isfillcontinents)
 
 
+    @tracePhase
     def plot(self):
         self.quiver = self._plot()
         self.plotAxes()
@@ -173,6 +176,19 @@ class Plot2QuiverCartopy(Plot2Cartopy, Plot2Quiver):
 
         return self.quiver
 
+    def projectGrid(self, lons, lats):
+        '''Project longitude/latitude coordinates using the map projection
+
+        Args:
+            lons,lats (ndarray): 2d array of the longitude/latitude coordinates.
+        Returns:
+            xs,ys (ndarray): 2d array of the projected coordinates.
+        '''
+
+        xyz = self._projection.transform_points(self._transform, lons, lats)
+
+        return xyz[..., 0], xyz[..., 1]
+
     '''
     def _plot(self):
 
@@ -0,0 +1,411 @@
+'''Command line interface of gplot
+
+Render variables in netcdf files to images:
+
+    gplot render data.nc -v msl -v sst --time all -o figs --workers 4 \
+            --method Isofill -m num=10 -p projection=cyl --log progress.jsonl
+
+Quiver plots take the x- and y-components from 2 variables:
+
+    gplot render data.nc -v u --varid-v v --method Quiver -m reso=5 -o figs
+
+Start a local render server (see gplot.lib.server_utils):
+
+    gplot serve --port 8765
+
+Existing outputs are skipped unless --overwrite is given, so an interrupted
+batch can be resumed by re-running the same command. With --log, a json
+line is appended for each job, with its status and timing.
+'''
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+METHODS = ['Isofill', 'Isoline', 'Boxfill', 'Pcolor', 'Hatch', 'Shading',
+           'Quiver']
+
+DEFAULT_NAME = '{stem}_{varid}{suffix}.{fmt}'
+
+# netcdf files opened in the current process, see readJobData()
+_datasets = {}
+
+
+def parseValue(value):
+    '''Parse a command line value as json, or as str if not valid json'''
+
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parseKeyValues(items):
+    '''Parse a list of "key=value" strings into a dict'''
+
+    result = {}
+    for ii in items or []:
+        if '=' not in ii:
+            raise Exception("Argument needs to be in the form key=value: %s" % ii)
+        kk, vv = ii.split('=', 1)
+        result[kk.strip()] = parseValue(vv)
+
+    return result
+
+
+def parseIndexSpec(spec, size):
+    '''Parse an index selector of a dimension
+
+    Args:
+        spec (str): 'all' or ':' for all indices, a slice 'start:stop[:step]',
+            or a comma separated list of ints. Negative indices count from
+            the end.
+        size (int): length of the dimension.
+    Returns:
+        result (list): indices in [0, size).
+    '''
+
+    spec = str(spec).strip()
+    if spec in ['all', ':']:
+        return list(range(size))
+
+    if ':' in spec:
+        parts = [int(pii) if pii.strip() else None for pii in spec.split(':')]
+        if len(parts) > 3:
+            raise Exception("Invalid index selector: %s" % spec)
+        return list(range(size))[slice(*parts)]
+
+    result = []
+    for pii in spec.split(','):
+        idx = int(pii)
+        if idx < -size or idx >= size:
+            raise Exception("Index %d out of range of size %d." % (idx, size))
+        result.append(idx % size)
+
+    return result
+
+
+def expandJobs(args):
+    '''Expand the command line arguments into a list of render jobs
+
+    Returns:
+        jobs (list): list of dicts with keys 'file', 'varid', 'varid_v',
+            'selector' and 'output'.
+    '''
+
+    from netCDF4 import Dataset
+
+    selects = dict((kk, str(vv)) for kk, vv in
+                   parseKeyValues(args.select).items())
+    if args.time is not None:
+        selects[args.time_dim] = args.time
+    if args.level is not None:
+        selects[args.level_dim] = args.level
+
+    jobs = []
+    for fii in args.files:
+        stem = os.path.splitext(os.path.basename(fii))[0]
+        with Dataset(fii, 'r') as fin:
+            for vii in args.varid:
+                if vii not in fin.variables:
+                    raise Exception("Variable %s not found in %s." % (vii, fii))
+                ncvar = fin.variables[vii]
+                if ncvar.ndim < 2:
+                    raise Exception("<%s> needs to have rank >= 2." % vii)
+
+                dims = ncvar.dimensions[:-2]
+                indices = []
+                for dii, nii in zip(dims, ncvar.shape[:-2]):
+                    indices.append(parseIndexSpec(selects.get(dii, '0'), nii))
+
+                for idx in itertools.product(*indices):
+                    selector = dict(zip(dims, idx))
+                    suffix = ''.join(['_%s%d' % (dii, sii) for dii, sii in
+                                      zip(dims, idx)])
+                    name = args.name.format(
+                        stem=stem, varid=vii, suffix=suffix, fmt=args.fmt,
+                        **selector)
+                    jobs.append({'file': os.path.abspath(fii),
+                                 'varid': vii,
+                                 'varid_v': args.varid_v,
+                                 'selector': selector,
+                                 'output': os.path.join(args.outputdir, name)})
+
+    return jobs
+
+
+def readJobData(job):
+    '''Read the slabs of a job, keeping the netcdf file open for later jobs'''
+
+    from netCDF4 import Dataset
+    from gplot.lib.netcdf4_utils import readSlab
+
+    path = job['file']
+    mtime = os.path.getmtime(path)
+    if path not in _datasets or _datasets[path][1] != mtime:
+        if path in _datasets:
+            _datasets[path][0].close()
+        _datasets[path] = (Dataset(path, 'r'), mtime)
+    fin = _datasets[path][0]
+
+    var, xarray, yarray = readSlab(fin, job['varid'], job['selector'])
+    if job['varid_v'] is not None:
+        var_v, _, _ = readSlab(fin, job['varid_v'], job['selector'])
+    else:
+        var_v = None
+
+    return var, var_v, xarray, yarray
+
+
+def renderJob(job, options):
+    '''Render a single job into its output file
+
+    Args:
+        job (dict): render job, see expandJobs().
+        options (dict): rendering options, with keys 'method', 'method_kwargs',
+            'params', 'stats', 'fmt', 'dpi', 'figsize' and 'overwrite'.
+    Returns:
+        record (dict): <job> updated with 'status' ('done', 'skipped' or
+            'failed'), 'error' if failed, and timing in seconds of 'read',
+            'plot', 'draw', 'encode' and 'total'.
+    '''
+
+    from gplot.lib import base_utils
+    from gplot.lib.netcdf4_utils import getStatsPath
+
+    record = dict(job)
+    if not options['overwrite'] and os.path.exists(job['output']):
+        record['status'] = 'skipped'
+        return record
+
+    t0 = time.perf_counter()
+    try:
+        var, var_v, xarray, yarray = readJobData(job)
+        t1 = time.perf_counter()
+
+        method_class = getattr(base_utils, options['method'])
+        method_kwargs = options['method_kwargs']
+        if issubclass(method_class, base_utils.PlotMethod):
+            data = var
+            if options['stats']:
+                # share levels across images using the statistics sidecar
+                stats_path = getStatsPath(job['file'], job['varid'])
+                if os.path.exists(stats_path):
+                    data = stats_path
+            method = method_class(data, **method_kwargs)
+        else:
+            method = method_class(**method_kwargs)
+
+        params = dict(options['params'])
+        params['nc_interface'] = 'netcdf4'
+        result, meta = base_utils.plot2Bytes(
+            var, method, xarray=xarray, yarray=yarray, var_v=var_v,
+            fmt=options['fmt'], figsize=options['figsize'],
+            dpi=options['dpi'], **params)
+
+        folder = os.path.dirname(job['output'])
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        tmp = '%s.tmp%d' % (job['output'], os.getpid())
+        with open(tmp, 'wb') as fout:
+            fout.write(result)
+        os.replace(tmp, job['output'])
+
+    except Exception as e:
+        record.update({'status': 'failed', 'error': str(e),
+                       'total': time.perf_counter() - t0})
+        return record
+
+    record.update({'status': 'done', 'read': t1 - t0, 'plot': meta['plot'],
+                   'draw': meta['draw'], 'encode': meta['encode'],
+                   'total': time.perf_counter() - t0})
+
+    return record
+
+
+def runJobs(jobs, options, workers=1, log_file=None, verbose=True):
+    '''Render jobs, optionally in parallel processes
+
+    Args:
+        jobs (list): render jobs, see expandJobs().
+        options (dict): rendering options, see renderJob().
+    Keyword Args:
+        workers (int): number of worker processes. If 1, render in the
+            current process.
+        log_file (str or None): if not None, append a json line per job to
+            this file as jobs finish.
+        verbose (bool): whether to print progress or not.
+    Returns:
+        counts (dict): number of jobs 'done', 'skipped' and 'failed'.
+    '''
+
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    flog = None
+    if log_file is not None:
+        # the log may go into the output folder, not created yet
+        folder = os.path.dirname(log_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        flog = open(log_file, 'a')
+
+    def report(record):
+        record['time'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        counts[record['status']] += 1
+        if flog is not None:
+            flog.write(json.dumps(record) + '\n')
+            flog.flush()
+        if verbose:
+            msg = '%s: %s' % (record['status'], record['output'])
+            if record['status'] == 'failed':
+                msg += ' (%s)' % record['error']
+            elif record['status'] == 'done':
+                msg += ' (%.2f s)' % record['total']
+            print('# <runJobs>: [%d/%d] %s' % (sum(counts.values()),
+                                                len(jobs), msg))
+
+    try:
+        if workers <= 1:
+            for jii in jobs:
+                report(renderJob(jii, options))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(renderJob, jii, options) for jii in jobs]
+                for fii in as_completed(futures):
+                    report(fii.result())
+    finally:
+        if flog is not None:
+            flog.close()
+
+    return counts
+
+
+def getParser():
+    '''Get the argument parser of the gplot command'''
+
+    parser = argparse.ArgumentParser(
+        prog='gplot', description='Render netcdf variables with gplot.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    # ---------------------render---------------------
+    prender = subparsers.add_parser(
+        'render', help='render variables in netcdf files to images.')
+    prender.add_argument('files', nargs='+', help='netcdf files.')
+    prender.add_argument('-v', '--varid', action='append', required=True,
+                         help='id of variable to plot, can be repeated.')
+    prender.add_argument('--varid-v', default=None,
+                         help='id of the y-component variable of quiver plots.')
+    prender.add_argument('--time', default=None,
+                         help="indices of the time dimension: 'all', a slice "
+                         "'start:stop[:step]', or a comma separated list. "
+                         "Default 0.")
+    prender.add_argument('--level', default=None,
+                         help='indices of the level dimension, as --time.')
+    prender.add_argument('--time-dim', default='time',
+                         help='name of the time dimension.')
+    prender.add_argument('--level-dim', default='level',
+                         help='name of the level dimension.')
+    prender.add_argument('-s', '--select', action='append', metavar='DIM=SPEC',
+                         help='indices of other leading dimensions, as --time.')
+    prender.add_argument('--method', default='Isofill', choices=METHODS,
+                         help='plotting method.')
+    prender.add_argument('-m', '--method-arg', action='append',
+                         metavar='KEY=VALUE',
+                         help='argument to the plotting method, e.g. num=10.')
+    prender.add_argument('-p', '--param', action='append', metavar='KEY=VALUE',
+                         help='plotting parameter, e.g. projection=cyl.')
+    prender.add_argument('--stats', action='store_true',
+                         help='get levels from the statistics sidecar files '
+                         'if exist, so all images share the same levels.')
+    prender.add_argument('-o', '--outputdir', default='.',
+                         help='output folder.')
+    prender.add_argument('--name', default=DEFAULT_NAME,
+                         help='output file name template, with fields {stem}, '
+                         '{varid}, {suffix}, {fmt} and dimension names. '
+                         'Default %s' % DEFAULT_NAME)
+    prender.add_argument('--fmt', default='png', choices=['png', 'webp', 'svg'],
+                         help='output format.')
+    prender.add_argument('--dpi', type=int, default=100, help='resolution.')
+    prender.add_argument('--figsize', type=float, nargs=2, default=[12, 10],
+                         metavar=('WIDTH', 'HEIGHT'),
+                         help='figure size in inches.')
+    prender.add_argument('-j', '--workers', type=int, default=1,
+                         help='number of worker processes.')
+    prender.add_argument('--overwrite', action='store_true',
+                         help='re-render existing outputs, which are '
+                         'skipped by default.')
+    prender.add_argument('--log', default=None,
+                         help='json lines file to append the job records to.')
+    prender.add_argument('-q', '--quiet', action='store_true',
+                         help="don't print progress.")
+
+    # ---------------------serve---------------------
+    pserve = subparsers.add_parser(
+        'serve', help='start a local render server.')
+    pserve.add_argument('--host', default='127.0.0.1', help='host to bind to.')
+    pserve.add_argument('--port', type=int, default=8765, help='port.')
+    pserve.add_argument('--max-datasets', type=int, default=16,
+                        help='maximum number of netcdf files kept open.')
+    pserve.add_argument('-p', '--param', action='append', metavar='KEY=VALUE',
+                        help='default plotting parameter of the server.')
+    pserve.add_argument('-q', '--quiet', action='store_true',
+                        help="don't print a line per request.")
+
+    return parser
+
+
+def main(argv=None):
+    '''Entry point of the gplot command
+
+    Keyword Args:
+        argv (list or None): command line arguments. If None, use sys.argv.
+    Returns:
+        code (int): exit code, 1 if any job failed, 0 otherwise.
+    '''
+
+    parser = getParser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'render':
+        options = {
+            'method': args.method,
+            'method_kwargs': parseKeyValues(args.method_arg),
+            'params': parseKeyValues(args.param),
+            'stats': args.stats,
+            'fmt': args.fmt,
+            'dpi': args.dpi,
+            'figsize': tuple(args.figsize),
+            'overwrite': args.overwrite
+        }
+        jobs = expandJobs(args)
+        counts = runJobs(jobs, options, workers=args.workers,
+                         log_file=args.log, verbose=not args.quiet)
+        if not args.quiet:
+            print('# <main>: %d done, %d skipped, %d failed.' %
+                  (counts['done'], counts['skipped'], counts['failed']))
+        return 1 if counts['failed'] > 0 else 0
+
+    elif args.command == 'serve':
+        from gplot.lib.server_utils import RenderServer
+        server = RenderServer(host=args.host, port=args.port,
+                              max_datasets=args.max_datasets,
+                              verbose=not args.quiet,
+                              **parseKeyValues(args.param))
+        try:
+            server.serveForever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    parser.print_help()
+
+    return 1
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -14,28 +14,37 @@ import matplotlib.cm as cm
 import matplotlib.colors as mcolors
 import matplotlib.collections as mcollections
 import matplotlib.lines as mlines
-import matplotlib.patches as patches
+import matplotlib.transforms as mtransforms
 
 
-class TerminateTrajectory(object):
+class TerminateTrajectory(Exception):
+    pass
+
+
+class InvalidIndexError(Exception):
     pass
 
 
 def velovect(axes, x, y, u, v, linewidth=None, color=None,
                cmap=None, norm=None, arrowsize=1, arrowstyle='-|>',
                transform=None, zorder=None, start_points=None,
-               scale=1.0, grains=15):
+               scale=1.0, grains=15, density=None, proj=None):
     """Draws streamlines of a vector flow.
 
     *x*, *y* : 1d arrays
-        an *evenly spaced* grid.
+        an *evenly spaced* grid. Descending coordinates, e.g. latitudes
+        from north to south, are flipped to ascending order together with
+        the data.
     *u*, *v* : 2d arrays
         x and y-velocities. Number of rows should match length of y, and
         the number of columns should match x.
-    *density* : float or 2-tuple
-        Controls the closeness of streamlines. When `density = 1`, the domain
-        is divided into a 30x30 grid---*density* linearly scales this grid.
-        Each cell in the grid can have, at most, one traversing streamline.
+    *density* : None, float or 2-tuple
+        Controls the closeness of streamlines. If None (default), streamlines
+        are allowed to overlap. Otherwise, the domain is divided into a
+        30x30 occupancy grid when `density = 1`---*density* linearly scales
+        this grid. Each cell in the grid can have, at most, one traversing
+        streamline: a streamline stops when it enters an already claimed
+        cell, and seed points in claimed cells are skipped.
         For different densities in each direction, use [density_x, density_y].
     *linewidth* : numeric or 2d array
         vary linewidth when given a 2d array with the same shape as velocities.
@@ -49,10 +58,10 @@ def velovect(axes, x, y, u, v, linewidth=None, color=None,
         Normalize object used to scale luminance data to 0, 1. If None, stretch
         (min, max) to (0, 1). Only necessary when *color* is an array.
     *arrowsize* : float
-        Factor scale arrow size.
+        Factor scale arrow size. If 0, don't draw arrows.
     *arrowstyle* : str
-        Arrow style specification.
-        See :class:`~matplotlib.patches.FancyArrowPatch`.
+        Not in use. Arrow heads are always drawn as filled triangles,
+        similar to the '-|>' style of :class:`~matplotlib.patches.FancyArrowPatch`.
     *minlength* : float
         Minimum length of streamline in axes coordinates.
     *start_points*: Nx2 array
@@ -62,6 +71,11 @@ def velovect(axes, x, y, u, v, linewidth=None, color=None,
         any number
     *scale* : float
         Maximum length of streamline in axes coordinates.
+    *proj* : callable or None
+        If not None, a function mapping data coordinates to the plotting
+        coordinates, e.g. a basemap object: ``xp, yp = proj(x, y)``.
+        Streamlines are integrated in data coordinates, then all trajectory
+        points are projected in a single call.
 
     Returns:
 
@@ -70,18 +84,23 @@ def velovect(axes, x, y, u, v, linewidth=None, color=None,
 
                 - lines: `matplotlib.collections.LineCollection` of streamlines
 
-                - arrows: collection of `matplotlib.patches.FancyArrowPatch`
-                  objects representing arrows half-way along stream
-                  lines.
+                - arrows: `matplotlib.collections.PolyCollection` of
+                  arrow heads at the end of the stream lines.
 
             This container will probably change in the future to allow changes
             to the colormap, alpha, etc. for both lines and arrows, but these
             changes should be backward compatible.
 
     """
+    x, y, (u, v, color, linewidth) = _to_ascending(
+        x, y, u, v, color, linewidth)
     grid = Grid(x, y)
-    mask = StreamMask(10)
-    dmap = DomainMap(grid, mask)
+    if density is None:
+        mask = StreamMask(10)
+        dmap = DomainMap(grid, mask)
+    else:
+        mask = StreamMask(density)
+        dmap = DomainMap(grid, mask, occupancy=True)
 
     if zorder is None:
         zorder = mlines.Line2D.zorder
@@ -97,30 +116,24 @@ def velovect(axes, x, y, u, v, linewidth=None, color=None,
         linewidth = matplotlib.rcParams['lines.linewidth']
 
     line_kw = {}
-    arrow_kw = dict(arrowstyle=arrowstyle, mutation_scale=10 * arrowsize)
 
     use_multicolor_lines = isinstance(color, np.ndarray)
     if use_multicolor_lines:
         if color.shape != grid.shape:
             raise ValueError(
                 "If 'color' is given, must have the shape of 'Grid(x,y)'")
-        line_colors = []
         color = np.ma.masked_invalid(color)
     else:
         line_kw['color'] = color
-        arrow_kw['color'] = color
 
     if isinstance(linewidth, np.ndarray):
         if linewidth.shape != grid.shape:
             raise ValueError(
                 "If 'linewidth' is given, must have the shape of 'Grid(x,y)'")
-        line_kw['linewidth'] = []
     else:
         line_kw['linewidth'] = linewidth
-        arrow_kw['linewidth'] = linewidth
 
     line_kw['zorder'] = zorder
-    arrow_kw['zorder'] = zorder
 
     ## Sanity checks.
     if u.shape != grid.shape or v.shape != grid.shape:
@@ -156,8 +169,21 @@ def velovect(axes, x, y, u, v, linewidth=None, color=None,
     sp2[:, 0] -= grid.x_origin
     sp2[:, 1] -= grid.y_origin
 
-    for xs, ys in sp2:
-        xg, yg = dmap.data2grid(xs, ys)
+    xg_all, yg_all = dmap.data2grid(sp2[:, 0], sp2[:, 1])
+
+    if dmap.occupancy:
+        # Only keep the 1st seed in each mask cell, later ones would
+        # terminate immediately.
+        xm_all, ym_all = dmap.grid2mask(xg_all, yg_all)
+        _, keep = np.unique(ym_all * mask.nx + xm_all, return_index=True)
+        keep = np.sort(keep)
+        xg_all, yg_all = xg_all[keep], yg_all[keep]
+        xm_all, ym_all = xm_all[keep], ym_all[keep]
+
+    for ii, (xg, yg) in enumerate(zip(xg_all, yg_all)):
+        # skip seeds in cells claimed by previous trajectories
+        if dmap.occupancy and mask[ym_all[ii], xm_all[ii]] != 0:
+            continue
         t = integrate(xg, yg)
         if t is not None:
             trajectories.append(t[0])
@@ -171,69 +197,150 @@ def velovect(axes, x, y, u, v, linewidth=None, color=None,
         else:
             cmap = cm.get_cmap(cmap)
 
-    streamlines = []
-    arrows = []
-    for t, edge in zip(trajectories,edges):
-        tgx = np.array(t[0])
-        tgy = np.array(t[1])
+    # ----------Concatenate all trajectories once----------
+    if len(trajectories) > 0:
+        npoints = np.array([len(t[0]) for t in trajectories])
+        tgx = np.concatenate([t[0] for t in trajectories])
+        tgy = np.concatenate([t[1] for t in trajectories])
+    else:
+        npoints = np.zeros(0, dtype=int)
+        tgx = tgy = np.zeros(0)
+
+    # Rescale from grid-coordinates to data-coordinates.
+    tx, ty = dmap.grid2data(tgx, tgy)
+    tx = tx + grid.x_origin
+    ty = ty + grid.y_origin
+    if proj is not None:
+        tx, ty = proj(tx, ty)
+    points = np.column_stack([tx, ty])
+
+    # index of the last point in each trajectory. Segments starting from
+    # these points would bridge 2 trajectories and are dropped.
+    ends = np.cumsum(npoints) - 1
+    valid = np.ones(max(len(points) - 1, 0), dtype=bool)
+    valid[ends[:-1]] = False
+    streamlines = np.stack([points[:-1], points[1:]], axis=1)[valid]
 
+    if isinstance(linewidth, np.ndarray):
+        line_widths = interpgrid(linewidth, tgx, tgy)
+        line_kw['linewidth'] = line_widths[:-1][valid]
 
-        # Rescale from grid-coordinates to data-coordinates.
-        tx, ty = dmap.grid2data(*np.array(t))
-        tx += grid.x_origin
-        ty += grid.y_origin
+    if use_multicolor_lines:
+        color_values = interpgrid(color, tgx, tgy)
+        line_colors = color_values[:-1][valid]
 
+    lc = mcollections.LineCollection(
+        streamlines, transform=transform, **line_kw)
+    if proj is None:
+        lc.sticky_edges.x[:] = [grid.x_origin, grid.x_origin + grid.width]
+        lc.sticky_edges.y[:] = [grid.y_origin, grid.y_origin + grid.height]
+    if use_multicolor_lines:
+        lc.set_array(line_colors)
+        lc.set_cmap(cmap)
+        lc.set_norm(norm)
+    axes.add_collection(lc)
+    axes.autoscale_view()
 
-        points = np.transpose([tx, ty]).reshape(-1, 1, 2)
-        streamlines.extend(np.hstack([points[:-1], points[1:]]))
+    if arrowsize == 0:
+        return StreamplotSet(lc, None)
 
-        # Add arrows half way along each trajectory.
-        #s = np.cumsum(np.sqrt(np.diff(tx) ** 2 + np.diff(ty) ** 2))
-        #n = np.searchsorted(s, s[-1])
-        n=len(tx)-1
-        arrow_tail = (tx[-2], ty[-2])
-        arrow_head = (tx[-1], ty[-1])
+    # ---------Add arrows at the end of each trajectory---------
+    # skip trajectories hitting the domain edge and vanishingly short arrows
+    is_arrow = ~np.array(edges, dtype=bool)
+    tails = points[ends - 1]
+    heads = points[ends]
+    ds = np.hypot(*(heads - tails).T)
+    is_arrow = is_arrow & (ds >= 1e-15)
+    tails = tails[is_arrow]
+    heads = heads[is_arrow]
 
-        if isinstance(linewidth, np.ndarray):
-            line_widths = interpgrid(linewidth, tgx, tgy)[:-1]
-            line_kw['linewidth'].extend(line_widths)
-            arrow_kw['linewidth'] = line_widths[n]
+    # heads are filled triangles, sized in points as the '-|>' style of
+    # FancyArrowPatch, oriented in display space at draw time.
+    mutation_scale = 10 * arrowsize
 
-        if use_multicolor_lines:
-            color_values = interpgrid(color, tgx, tgy)[:-1]
-            line_colors.append(color_values)
-            arrow_kw['color'] = cmap(norm(color_values[n]))
+    arrow_kw = {'zorder': zorder}
+    if use_multicolor_lines:
+        arrow_kw['facecolors'] = cmap(norm(color_values[ends - 1][is_arrow]))
+    else:
+        arrow_kw['facecolors'] = color
+    arrow_kw['edgecolors'] = arrow_kw['facecolors']
+    if isinstance(linewidth, np.ndarray):
+        arrow_kw['linewidths'] = line_widths[ends - 1][is_arrow]
+    else:
+        arrow_kw['linewidths'] = linewidth
 
-        if not edge:
-            p = patches.FancyArrowPatch(
-                arrow_tail, arrow_head, transform=transform, **arrow_kw)
-        else:
-            continue
+    ac = ArrowHeadCollection(
+        heads, tails, 0.4 * mutation_scale, 0.2 * mutation_scale,
+        transOffset=transform, **arrow_kw)
+    # vertices are in points, offsets in data coordinates
+    ac.set_transform(mtransforms.Affine2D().scale(1. / 72) +
+                     axes.figure.dpi_scale_trans)
+    axes.add_collection(ac, autolim=False)
 
-        ds = np.sqrt((arrow_tail[0]-arrow_head[0])**2+(arrow_tail[1]-arrow_head[1])**2)
+    stream_container = StreamplotSet(lc, ac)
+    return stream_container
 
-        if ds<1e-15: continue #remove vanishingly short arrows that cause Patch to fail
 
-        axes.add_patch(p)
-        arrows.append(p)
 
+def _to_ascending(x, y, *fields):
+    """Flip a grid with descending coordinates to ascending order.
 
+    *fields* that are 2d arrays on the grid are flipped along, other
+    values are returned as they are.
+    """
+    x = np.asanyarray(x)
+    y = np.asanyarray(y)
+    fields = list(fields)
 
-    lc = mcollections.LineCollection(
-        streamlines, transform=transform, **line_kw)
-    lc.sticky_edges.x[:] = [grid.x_origin, grid.x_origin + grid.width]
-    lc.sticky_edges.y[:] = [grid.y_origin, grid.y_origin + grid.height]
-    if use_multicolor_lines:
-        lc.set_array(np.ma.hstack(line_colors))
-        lc.set_cmap(cmap)
-        lc.set_norm(norm)
-    axes.add_collection(lc)
-    axes.autoscale_view()
+    xx = x[0, :] if x.ndim == 2 else x
+    if len(xx) > 1 and xx[-1] < xx[0]:
+        x = x[..., ::-1]
+        fields = [fii[:, ::-1] if isinstance(fii, np.ndarray) and fii.ndim == 2
+                  else fii for fii in fields]
 
-    ac = matplotlib.collections.PatchCollection(arrows)
-    stream_container = StreamplotSet(lc, ac)
-    return stream_container
+    yy = y[:, 0] if y.ndim == 2 else y
+    if len(yy) > 1 and yy[-1] < yy[0]:
+        y = y[::-1]
+        fields = [fii[::-1, :] if isinstance(fii, np.ndarray) and fii.ndim == 2
+                  else fii for fii in fields]
+
+    return x, y, fields
+
+
+class ArrowHeadCollection(mcollections.PolyCollection):
+    """Filled triangle arrow heads at the ends of streamlines.
+
+    The triangles are sized in points, so their directions in display
+    space depend on the axis limits, aspect and size, which may change
+    after the streamlines are plotted, e.g. when a colorbar is added.
+    They are oriented from the *tails* to the *heads*, given in data
+    coordinates, each time the collection is drawn.
+    """
 
+    def __init__(self, heads, tails, head_length, head_width, transOffset,
+                 **kwargs):
+        self._heads = heads
+        self._tails = tails
+        self._head_length = head_length
+        self._head_width = head_width
+        self._data_transform = transOffset
+        super(ArrowHeadCollection, self).__init__(
+            self._get_verts(), offsets=heads, transOffset=transOffset,
+            **kwargs)
+
+    def _get_verts(self):
+        dxy = (self._data_transform.transform(self._heads) -
+               self._data_transform.transform(self._tails))
+        angles = np.arctan2(dxy[:, 1], dxy[:, 0])
+        cos = np.cos(angles)[:, None]
+        sin = np.sin(angles)[:, None]
+        hx = np.array([0., -self._head_length, -self._head_length])[None, :]
+        hy = np.array([0., self._head_width, -self._head_width])[None, :]
+        return np.stack([hx * cos - hy * sin, hx * sin + hy * cos], axis=-1)
+
+    def draw(self, renderer):
+        self.set_verts(self._get_verts())
+        super(ArrowHeadCollection, self).draw(renderer)
 
 
 class StreamplotSet(object):
@@ -264,9 +371,12 @@ class DomainMap(object):
     (e.g., if the trajectory is very short) just call `undo_trajectory`.
     """
 
-    def __init__(self, grid, mask):
+    def __init__(self, grid, mask, occupancy=False):
         self.grid = grid
         self.mask = mask
+        # If True, fill the mask as trajectories advance and stop them
+        # when entering already occupied cells
+        self.occupancy = occupancy
         # Constants for conversion between grid- and mask-coordinates
         #self.x_grid2mask = (mask.nx - 1) / grid.nx
         #self.y_grid2mask = (mask.ny - 1) / grid.ny
@@ -283,6 +393,9 @@ class DomainMap(object):
         """Return nearest space in mask-coords from given grid-coords."""
         #return (int((xi * self.x_grid2mask) + 0.5),
                 #int((yi * self.y_grid2mask) + 0.5))
+        if isinstance(xi, np.ndarray):
+            return ((xi * self.x_grid2mask + 0.5).astype(int),
+                    (yi * self.y_grid2mask + 0.5).astype(int))
         return (int(xi * self.x_grid2mask + 0.5),
                 int(yi * self.y_grid2mask + 0.5))
 
@@ -296,19 +409,27 @@ class DomainMap(object):
         return xg / self.x_data2grid, yg / self.y_data2grid
 
     def start_trajectory(self, xg, yg):
+        if not self.occupancy:
+            return
         xm, ym = self.grid2mask(xg, yg)
         self.mask._start_trajectory(xm, ym)
 
     def reset_start_point(self, xg, yg):
+        if not self.occupancy:
+            return
         xm, ym = self.grid2mask(xg, yg)
         self.mask._current_xy = (xm, ym)
 
     def update_trajectory(self, xg, yg):
 
+        if not self.occupancy:
+            return
         xm, ym = self.grid2mask(xg, yg)
-        #self.mask._update_trajectory(xm, ym)
+        self.mask._update_trajectory(xm, ym)
 
     def undo_trajectory(self):
+        if not self.occupancy:
+            return
         self.mask._undo_trajectory()
 
 
@@ -390,6 +511,7 @@ class StreamMask(object):
     def _start_trajectory(self, xm, ym):
         """Start recording streamline trajectory"""
         self._traj = []
+        self._current_xy = None
         self._update_trajectory(xm, ym)
 
     def _undo_trajectory(self):
@@ -402,13 +524,13 @@ class StreamMask(object):
 
         If the new position has already been filled, raise `InvalidIndexError`.
         """
-        #if self._current_xy != (xm, ym):
-        #    if self[ym, xm] == 0:
-        self._traj.append((ym, xm))
-        self._mask[ym, xm] = 1
-        self._current_xy = (xm, ym)
-        #    else:
-        #        raise InvalidIndexError
+        if self._current_xy != (xm, ym):
+            if self[ym, xm] == 0:
+                self._traj.append((ym, xm))
+                self._mask[ym, xm] = 1
+                self._current_xy = (xm, ym)
+            else:
+                raise InvalidIndexError
 
 
 
@@ -449,8 +571,10 @@ def get_integrator(u, v, dmap, minlength, resolution, magnitude):
 
         stotal, x_traj, y_traj = 0., [], []
 
-
-        dmap.start_trajectory(x0, y0)
+        try:
+            dmap.start_trajectory(x0, y0)
+        except InvalidIndexError:
+            return None
 
         dmap.reset_start_point(x0, y0)
         stotal, x_traj, y_traj, m_total, hit_edge = _integrate_rk12(x0, y0, dmap, forward_time, resolution, magnitude)
@@ -508,13 +632,15 @@ def _integrate_rk12(x0, y0, dmap, f, resolution, magnitude):
     xf_traj = []
     yf_traj = []
     m_total = []
+    m_sum = 0.
     hit_edge = False
 
     while dmap.grid.within_grid(xi, yi):
         xf_traj.append(xi)
         yf_traj.append(yi)
-        m_total.append(interpgrid(magnitude, xi, yi))
         try:
+            m_total.append(interpgrid(magnitude, xi, yi))
+            m_sum += m_total[-1]
             k1x, k1y = f(xi, yi)
             k2x, k2y = f(xi + ds * k1x,
                          yi + ds * k1y)
@@ -542,12 +668,15 @@ def _integrate_rk12(x0, y0, dmap, f, resolution, magnitude):
             xi += dx2
             yi += dy2
 
-            dmap.update_trajectory(xi, yi)
-
             if not dmap.grid.within_grid(xi, yi):
                 hit_edge=True
+            else:
+                try:
+                    dmap.update_trajectory(xi, yi)
+                except InvalidIndexError:
+                    break
 
-            if (stotal + ds) > resolution*np.mean(m_total):
+            if (stotal + ds) > resolution*m_sum/len(m_total):
                 break
             stotal += ds
 
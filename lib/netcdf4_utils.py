@@ -6,6 +6,7 @@ Update time: 2021-01-24 17:30:56.
 
 from __future__ import print_function
 import os
+import json
 import numpy as np
 from netCDF4 import Dataset
 
@@ -55,3 +56,218 @@ def checkGeomap(var, xarray, yarray):
 
     return isgeo, var, xarray, yarray
 
+
+def readSlab(fin, varid, selector=None):
+    '''Read a 2D slab of a variable from an open netcdf file
+
+    Args:
+        fin (netCDF4 Dataset): opened netcdf file.
+        varid (str): id of variable to read, with rank >= 2.
+    Keyword Args:
+        selector (dict or None): indices of the leading dimensions, keyed by
+            dimension names, e.g. {'time': 0, 'level': 3}. Negative indices
+            count from the end. Leading dimensions not in <selector> use
+            index 0.
+    Returns:
+        slab (ndarray): 2D masked array of the last 2 dimensions.
+        xarray (1darray or None): coordinates of the last dimension, None if
+            the file has no coordinate variable for it.
+        yarray (1darray or None): coordinates of the 2nd last dimension.
+    '''
+
+    from gplot.lib.base_utils import getSlab
+
+    if varid not in fin.variables:
+        raise Exception("Variable not found: %s" % varid)
+
+    ncvar = fin.variables[varid]
+    if ncvar.ndim < 2:
+        raise Exception("<%s> needs to have rank >= 2." % varid)
+
+    selector = selector or {}
+    unknown = set(selector).difference(ncvar.dimensions[:-2])
+    if len(unknown) > 0:
+        raise Exception("Not leading dimensions of %s: %s" %
+                        (varid, ', '.join(sorted(unknown))))
+
+    # [...] reads a 2D variable, which getSlab() returns as is
+    slab = np.ma.asarray(getSlab(ncvar, indices=selector)[...])
+
+    coords = []
+    for dii in ncvar.dimensions[-2:]:
+        if dii in fin.variables and fin.variables[dii].ndim == 1:
+            coords.append(np.asarray(fin.variables[dii][:]))
+        else:
+            coords.append(None)
+
+    return slab, coords[1], coords[0]
+
+
+# -----------------------------------------------------------------------
+# -                     Statistics sidecar files                        -
+# -----------------------------------------------------------------------
+
+def computeVarStats(ncvar, level_axis=None, quantiles=None, nbins=2048,
+                    verbose=True):
+    '''Compute statistics of a netcdf variable, one chunk at a time
+
+    Args:
+        ncvar (netCDF4 Variable or ndarray): variable with rank >= 2. Data are
+            read 1 index of the 1st dimension at a time (1 time step for a
+            (time, level, lat, lon) variable), so lazily read variables
+            are never loaded as a whole.
+    Keyword Args:
+        level_axis (int or None): axis of the vertical levels, for which
+            statistics are also computed level by level. If None, use axis
+            1 for variables with rank >= 4, and no levels otherwise.
+        quantiles (list or None): quantile probabilities for the quantile
+            tables, see HistogramSketch.toStats().
+        nbins (int): number of histogram bins used to approximate the
+            quantiles.
+        verbose (bool): whether to print some info or not.
+    Returns:
+        record (dict): statistics of the variable, with keys 'shape',
+            'count', 'nan_count', 'data_min', 'data_max', 'quantiles', and
+            if <level_axis> is not None, 'level_axis' and 'levels', the last
+            being a list of dicts with the same statistics for each level.
+            Can be read back with DataStats.fromFile() once saved.
+    '''
+
+    from gplot.lib.base_utils import HistogramSketch
+
+    shape = tuple(ncvar.shape)
+    ndim = len(shape)
+    if ndim < 2:
+        raise Exception("<ncvar> needs to have rank >= 2.")
+    if level_axis is None and ndim >= 4:
+        level_axis = 1
+    if level_axis is not None and (level_axis < 1 or level_axis >= ndim - 2):
+        raise Exception("<level_axis> needs to be a non-spatial axis other than 0.")
+
+    total = HistogramSketch(nbins)
+    if level_axis is not None:
+        levels = [HistogramSketch(nbins) for _ in range(shape[level_axis])]
+
+    nchunks = shape[0] if ndim > 2 else 1
+    for ii in range(nchunks):
+        chunk = ncvar[ii] if ndim > 2 else ncvar[:]
+        total.update(chunk)
+        if level_axis is not None:
+            # axis in <chunk> is shifted by the 1st dimension
+            for jj, hjj in enumerate(levels):
+                hjj.update(np.take(chunk, jj, axis=level_axis-1))
+
+        if verbose and (ii+1) % 100 == 0:
+            print('# <computeVarStats>: %d/%d chunks done.' % (ii+1, nchunks))
+
+    def summarize(hist):
+        record = {'count': int(hist.count), 'nan_count': int(hist.nan_count)}
+        if hist.count > 0:
+            stats = hist.toStats(quantiles)
+            record.update({
+                'data_min': stats.data_min,
+                'data_max': stats.data_max,
+                'quantiles': dict((repr(float(kk)), float(vv)) for kk, vv in
+                                  stats.quantiles.items())})
+        return record
+
+    record = {'shape': list(shape)}
+    record.update(summarize(total))
+    if level_axis is not None:
+        record['level_axis'] = level_axis
+        record['levels'] = [summarize(hjj) for hjj in levels]
+
+    return record
+
+
+def getStatsPath(abpath_in, varid, outputdir=None):
+    '''Get the path of the statistics sidecar file of a variable
+
+    Args:
+        abpath_in (str): path to the netcdf file.
+        varid (str): id of variable.
+    Keyword Args:
+        outputdir (str or None): folder of the sidecar file. If None, use
+            the same folder as <abpath_in>.
+    Returns:
+        result (str): path to the sidecar file, named as
+            <file name>.<varid>.stats.json.
+    '''
+
+    folder, filename = os.path.split(abpath_in)
+    if outputdir is not None:
+        folder = outputdir
+
+    return os.path.join(folder, '%s.%s.stats.json' % (filename, varid))
+
+
+def writeStats(abpath_in, varids=None, outputdir=None, level_axis=None,
+               quantiles=None, nbins=2048, overwrite=False, verbose=True):
+    '''Write statistics sidecar files for variables in netcdf files
+
+    Args:
+        abpath_in (str): path to a netcdf file, or a folder, in which all
+            files with a .nc or .nc4 extension are processed recursively.
+    Keyword Args:
+        varids (list or None): ids of variables to process. If None, process
+            all variables with rank >= 2 that are not coordinate variables.
+        outputdir (str or None): folder to save the sidecar files. If None,
+            save next to the netcdf files.
+        level_axis (int or None): see computeVarStats().
+        quantiles (list or None): see computeVarStats().
+        nbins (int): see computeVarStats().
+        overwrite (bool): if False, skip variables whose sidecar file is
+            newer than the netcdf file.
+        verbose (bool): whether to print some info or not.
+    Returns:
+        results (list): paths of the sidecar files written.
+
+    The sidecar file of each variable is a compact json file, see
+    getStatsPath() for the naming. Use it to get plotting levels without
+    reading the data, e.g. `Isofill(getStatsPath(file, 'msl'), num=10)`.
+    '''
+
+    if os.path.isdir(abpath_in):
+        filelist = []
+        for root, _, files in os.walk(abpath_in):
+            for fii in sorted(files):
+                if os.path.splitext(fii)[1] in ['.nc', '.nc4']:
+                    filelist.append(os.path.join(root, fii))
+    else:
+        filelist = [abpath_in, ]
+
+    if outputdir is not None and not os.path.exists(outputdir):
+        os.makedirs(outputdir)
+
+    results = []
+    for fii in filelist:
+        with Dataset(fii, 'r') as fin:
+            if varids is None:
+                vlist = [kk for kk, vv in fin.variables.items() if
+                         vv.ndim >= 2 and kk not in fin.dimensions and
+                         np.issubdtype(vv.dtype, np.number)]
+            else:
+                vlist = [kk for kk in varids if kk in fin.variables]
+
+            for vii in vlist:
+                abpath_out = getStatsPath(fii, vii, outputdir)
+                if not overwrite and os.path.exists(abpath_out) and\
+                        os.path.getmtime(abpath_out) >= os.path.getmtime(fii):
+                    if verbose:
+                        print('# <writeStats>: Skip existing %s.' % abpath_out)
+                    continue
+
+                if verbose:
+                    print('# <writeStats>: Processing %s in %s.' % (vii, fii))
+
+                record = computeVarStats(
+                    fin.variables[vii], level_axis=level_axis,
+                    quantiles=quantiles, nbins=nbins, verbose=verbose)
+                record['file'] = os.path.basename(fii)
+                record['varid'] = vii
+
+                with open(abpath_out, 'w') as fout:
+                    json.dump(record, fout, separators=(',', ':'))
+                results.append(abpath_out)
+
+    return results
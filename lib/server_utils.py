@@ -0,0 +1,428 @@
+'''Long-running local render server
+
+Keeps the plotting modules imported, the netcdf files open and the Basemap
+objects constructed across renders, so a client pays neither the Python
+startup nor the map construction per image, e.g.
+
+    server = RenderServer(port=8765)
+    server.serveForever()
+
+and from a client:
+
+    result, meta = requestRender('http://127.0.0.1:8765', {
+        'file': '/data/erai.nc', 'varid': 'msl',
+        'selector': {'time': 0}, 'method': 'Isofill',
+        'method_kwargs': {'num': 10}, 'params': {'projection': 'cyl'}})
+
+A request is a json object with the keys:
+
+    file (str): path to the netcdf file.
+    varid (str): id of the variable to plot.
+    selector (dict, optional): indices of the leading dimensions, see
+        gplot.lib.netcdf4_utils.readSlab().
+    varid_v (str, optional): id of the y-component variable for quiver
+        plots, <varid> being the x-component.
+    method (str, optional): name of the plotting method class, default
+        'Isofill'.
+    method_kwargs (dict, optional): kwargs to the plotting method class. The
+        data are passed as the 1st argument to Isofill, Isoline, Boxfill and
+        Pcolor.
+    params (dict, optional): plotting parameters passed to plot2(), e.g.
+        title, projection, legend.
+    fmt, figsize, dpi, compress_level, quality, lossless (optional): output
+        options, see gplot.plot2Bytes().
+'''
+
+from __future__ import print_function
+import os
+import json
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from gplot.lib import base_utils
+
+# plotting method classes that can be requested by name
+METHODS = ['Isofill', 'Isoline', 'Boxfill', 'Pcolor', 'Hatch', 'Shading',
+           'GIS', 'Quiver']
+
+# basemap projections whose Basemap obj only depends on the data domain,
+# polar projections also modify the data when creating the Basemap obj
+REUSABLE_PROJECTIONS = ['cyl', 'merc', 'cea']
+
+CONTENT_TYPES = {'png': 'image/png', 'webp': 'image/webp',
+                 'svg': 'image/svg+xml'}
+
+
+class RenderServer(object):
+    '''Local render server with warm backends'''
+    def __init__(self, host='127.0.0.1', port=8765, max_datasets=16,
+                 verbose=True, **kwargs):
+        '''Local render server with warm backends
+
+        Keyword Args:
+            host (str): host to bind to. Defaults to localhost only, the
+                server has no authentication.
+            port (int): port to listen on. If 0, use a free port, see
+                self.server_address after creation.
+            max_datasets (int): maximum number of netcdf files kept open. The
+                least recently used ones are closed when exceeded.
+            verbose (bool): whether to print a line per request or not.
+            **kwargs: default plotting parameters of the server, overridden
+                by the 'params' of requests, see gplot.useParams().
+
+        Renders are done in RenderContexts in the request handling threads.
+        Reading netcdf files is serialized as the netcdf library is not
+        thread safe. Basemap objs are pooled by their constructor arguments,
+        see basemap_utils.getBmapKwargs(), each being used by one render at
+        a time.
+        '''
+
+        if max_datasets <= 0:
+            raise Exception("<max_datasets> needs to be positive.")
+
+        kwargs.setdefault('nc_interface', 'netcdf4')
+        self.params = base_utils.getParams().override(**kwargs)
+        if self.params['nc_interface'] != 'netcdf4':
+            raise Exception("The render server only supports nc_interface='netcdf4'.")
+
+        self.max_datasets = max_datasets
+        self.verbose = verbose
+
+        self._datasets = OrderedDict()
+        self._io_lock = threading.Lock()
+        self._bmaps = {}
+        self._bmap_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'renders': 0, 'errors': 0, 'bmap_reuses': 0,
+                       'start_time': time.time()}
+
+        self.warmUp()
+
+        handler = type('_Handler', (_RenderHandler,), {'render_server': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.server_address = self.httpd.server_address
+
+    def warmUp(self):
+        '''Import the plotting backends'''
+
+        import netCDF4
+        import matplotlib.figure
+        import matplotlib.backends.backend_agg
+        import matplotlib.colorbar
+        if self.params['isgeomap']:
+            if self.params['geo_interface'] == 'basemap':
+                import gplot.lib.basemap_utils
+            elif self.params['geo_interface'] == 'cartopy':
+                import gplot.lib.cartopy_utils
+
+        return
+
+    def serveForever(self):
+        '''Handle requests until shutdown() is called'''
+
+        if self.verbose:
+            print('# <RenderServer>: Serving on http://%s:%d' %
+                  self.server_address[:2])
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+            self.closeDatasets()
+
+        return
+
+    def shutdown(self):
+        '''Stop serveForever(), from another thread'''
+
+        self.httpd.shutdown()
+
+        return
+
+    # -------------------Open datasets-------------------
+    def getDataset(self, path):
+        '''Get an open netcdf file, re-opened if modified. Call with _io_lock'''
+
+        from netCDF4 import Dataset
+
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        if path in self._datasets:
+            fin, mtime_old = self._datasets.pop(path)
+            if mtime_old == mtime:
+                self._datasets[path] = (fin, mtime)
+                return fin
+            fin.close()
+
+        fin = Dataset(path, 'r')
+        self._datasets[path] = (fin, mtime)
+        while len(self._datasets) > self.max_datasets:
+            _, (fold, _) = self._datasets.popitem(last=False)
+            fold.close()
+
+        return fin
+
+    def closeDatasets(self):
+        '''Close all open netcdf files'''
+
+        with self._io_lock:
+            for fin, _ in self._datasets.values():
+                fin.close()
+            self._datasets.clear()
+
+        return
+
+    def readRequestData(self, request):
+        '''Read the slabs of a request
+
+        Returns:
+            var (ndarray): 2D slab of <varid>.
+            var_v (ndarray or None): 2D slab of <varid_v>.
+            xarray, yarray (1darray or None): coordinates.
+        '''
+
+        from gplot.lib.netcdf4_utils import readSlab
+
+        if 'file' not in request or 'varid' not in request:
+            raise Exception("Request needs the 'file' and 'varid' keys.")
+
+        selector = request.get('selector')
+        with self._io_lock:
+            fin = self.getDataset(request['file'])
+            var, xarray, yarray = readSlab(fin, request['varid'], selector)
+            if request.get('varid_v') is not None:
+                var_v, _, _ = readSlab(fin, request['varid_v'], selector)
+            else:
+                var_v = None
+
+        return var, var_v, xarray, yarray
+
+    # -------------------Basemap pool-------------------
+    def getBmapKey(self, params, method, xarray, yarray):
+        '''Get the pool key of a Basemap obj, None if not reusable'''
+
+        if not params['isgeomap'] or params['geo_interface'] != 'basemap'\
+                or params['bmap'] is not None\
+                or xarray is None or yarray is None:
+            return None
+
+        projection = 'cyl' if method.method == 'gis' else params['projection']
+        if projection not in REUSABLE_PROJECTIONS:
+            return None
+
+        # key on all the constructor arguments
+        from gplot.lib.basemap_utils import getBmapKwargs
+        kwargs = getBmapKwargs(projection, xarray, yarray,
+                               params['fix_aspect'])
+
+        return tuple(sorted((kk, np.asarray(vv).item())
+                            for kk, vv in kwargs.items()))
+
+    def takeBmap(self, key):
+        '''Take a Basemap obj out of the pool, None if not available'''
+
+        with self._bmap_lock:
+            pool = self._bmaps.get(key)
+            if pool:
+                self.countStats('bmap_reuses')
+                return pool.pop()
+
+        return None
+
+    def returnBmap(self, key, bmap):
+        '''Put a Basemap obj back to the pool'''
+
+        # don't keep the axis of the finished render alive
+        bmap.ax = None
+        with self._bmap_lock:
+            self._bmaps.setdefault(key, []).append(bmap)
+
+        return
+
+    # ---------------------Render---------------------
+    def render(self, request):
+        '''Render a request
+
+        Args:
+            request (dict): render request, see module doc.
+        Returns:
+            result (bytes): encoded image.
+            meta (dict): info of the rendering, see gplot.plot2Bytes(). Also
+                'read' for the time in seconds to read the data, and
+                'bmap_reused' (bool).
+        '''
+
+        t0 = time.perf_counter()
+
+        method_name = request.get('method', 'Isofill')
+        if method_name not in METHODS:
+            raise Exception("Plotting method not supported: %s" % method_name)
+
+        request_params = request.get('params', {})
+        unknown = set(request_params).difference(self.params)
+        if len(unknown) > 0:
+            raise Exception("Unknown parameters: %s" % ', '.join(sorted(unknown)))
+        params = self.params.override(**request_params)
+
+        fmt = request.get('fmt', 'png')
+        dpi = request.get('dpi', 100)
+        var, var_v, xarray, yarray = self.readRequestData(request)
+        t1 = time.perf_counter()
+
+        method_class = getattr(base_utils, method_name)
+        method_kwargs = request.get('method_kwargs', {})
+        if issubclass(method_class, base_utils.PlotMethod):
+            method = method_class(var, **method_kwargs)
+        else:
+            method = method_class(**method_kwargs)
+
+        key = self.getBmapKey(params, method, xarray, yarray)
+        bmap = None if key is None else self.takeBmap(key)
+        bmap_reused = bmap is not None
+
+        with base_utils.useParams(params):
+            with base_utils.RenderContext(
+                    figsize=tuple(request.get('figsize', (12, 10))),
+                    dpi=dpi) as ctx:
+                ax = ctx.addSubplot(111)
+                if bmap is not None:
+                    bmap.ax = ax
+                plotobj = ctx.plot2(var, method, ax=ax, xarray=xarray,
+                                    yarray=yarray, var_v=var_v, bmap=bmap)
+                t2 = time.perf_counter()
+                result, timing = ctx.getBytes(
+                    fmt, compress_level=request.get('compress_level', 6),
+                    quality=request.get('quality', 80),
+                    lossless=request.get('lossless', False))
+                width, height = ctx.canvas.get_width_height()
+                if key is not None and getattr(plotobj, 'bmap', None) is not None:
+                    self.returnBmap(key, plotobj.bmap)
+
+        meta = {
+            'format': fmt.lower(),
+            'dpi': dpi,
+            'width': width,
+            'height': height,
+            'nbytes': len(result),
+            'read': t1 - t0,
+            'plot': t2 - t1,
+            'draw': timing['draw'],
+            'encode': timing['encode'],
+            'total': time.perf_counter() - t0,
+            'bmap_reused': bmap_reused
+        }
+
+        return result, meta
+
+    def countStats(self, key):
+        '''Increment a counter in the server status'''
+
+        with self._stats_lock:
+            self._stats[key] += 1
+
+        return
+
+    def status(self):
+        '''Get the status of the server as a json serializable dict'''
+
+        with self._io_lock:
+            datasets = list(self._datasets)
+        with self._bmap_lock:
+            nbmaps = sum([len(vv) for vv in self._bmaps.values()])
+
+        with self._stats_lock:
+            result = dict(self._stats)
+        result.update({'uptime': time.time() - self._stats['start_time'],
+                       'datasets': datasets, 'bmaps': nbmaps})
+
+        return result
+
+
+class _RenderHandler(BaseHTTPRequestHandler):
+    '''HTTP handler of RenderServer
+
+    GET /status returns the server status as json.
+    POST /render with a json request returns the image, with the meta info
+    as json in the X-Gplot-Meta header. Errors are returned with code 400 and
+    a json body {"error": message}.
+    '''
+
+    render_server = None
+
+    def sendJson(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/status':
+            self.sendJson(200, self.render_server.status())
+        else:
+            self.sendJson(404, {'error': 'Not found: %s' % self.path})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/render':
+            self.sendJson(404, {'error': 'Not found: %s' % self.path})
+            return
+
+        server = self.render_server
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode())
+            if not isinstance(request, dict):
+                raise Exception("Request needs to be a json object.")
+            result, meta = server.render(request)
+        except Exception as e:
+            server.countStats('errors')
+            self.sendJson(400, {'error': str(e)})
+            return
+
+        server.countStats('renders')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[meta['format']])
+        self.send_header('Content-Length', str(len(result)))
+        self.send_header('X-Gplot-Meta', json.dumps(meta))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def log_message(self, format, *args):
+        if self.render_server.verbose:
+            print('# <RenderServer>: %s' % (format % args))
+
+
+def requestRender(url, request, timeout=60):
+    '''Send a render request to a RenderServer
+
+    Args:
+        url (str): server url, e.g. 'http://127.0.0.1:8765'.
+        request (dict): render request, see module doc.
+    Keyword Args:
+        timeout (float): timeout in seconds.
+    Returns:
+        result (bytes): encoded image.
+        meta (dict): info of the rendering, see RenderServer.render().
+    '''
+
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+
+    req = Request(url.rstrip('/') + '/render',
+                  data=json.dumps(request).encode(),
+                  headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(req, timeout=timeout) as resp:
+            result = resp.read()
+            meta = json.loads(resp.headers['X-Gplot-Meta'])
+    except HTTPError as e:
+        try:
+            message = json.loads(e.read().decode())['error']
+        except Exception:
+            message = str(e)
+        raise Exception("Render failed: %s" % message)
+
+    return result, meta
@@ -2,7 +2,7 @@
 
 # Gplot
 
-from setuptools import find_packages, setup
+from setuptools import setup
 
 setup(name='gplot',
         version='0.3a',
@@ -28,7 +28,12 @@ setup(name='gplot',
             "netcdf4",
             "matplotlib<=3.2.2",
         ],
-        packages=find_packages(include=['lib', 'lib.*']),
+        # the repository root is the gplot package
+        package_dir={'gplot': '.'},
+        packages=['gplot', 'gplot.lib'],
+        entry_points={
+            'console_scripts': ['gplot=gplot.lib.cli_utils:main'],
+        },
         package_data={'tests': ['*']},
         license='GPL-3.0-or-later'
         )
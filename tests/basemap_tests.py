@@ -424,6 +424,56 @@ def test_basemap_quiver3():
     return
 
 
+def test_basemap_quiver_curve_descending():
+
+    # north-to-south latitudes, as in ERA-I data
+    lats2 = np.linspace(80, -80, 33)
+    lons2 = np.linspace(0, 360, 73)
+    xx, yy = np.meshgrid(np.radians(lons2), np.radians(lats2))
+    u2 = 10*np.cos(2*yy)
+    v2 = 5*np.sin(3*xx)
+
+    figure = plt.figure(figsize=(12, 10), dpi=100)
+    ax = figure.add_subplot(111)
+    q = gplot.Quiver(step=1)
+    pquiver = Plot2QuiverBasemap(
+        u2, v2, q, xarray=lons2, yarray=lats2, ax=ax,
+        title='curved quiver, descending lats', projection='cyl', curve=True)
+    pquiver.plot()
+
+    # same trajectories as from the south-to-north data
+    figure2 = plt.figure(figsize=(12, 10), dpi=100)
+    ax2 = figure2.add_subplot(111)
+    pquiver2 = Plot2QuiverBasemap(
+        u2[::-1], v2[::-1], gplot.Quiver(step=1), xarray=lons2,
+        yarray=lats2[::-1], ax=ax2, projection='cyl', curve=True)
+    pquiver2.plot()
+
+    segs = pquiver.streams.lines.get_segments()
+    segs2 = pquiver2.streams.lines.get_segments()
+    assert len(segs) == len(segs2)
+    plt.close(figure2)
+
+    figure.show()
+
+    return
+
+
+def test_basemap_quiver_auto_step():
+
+    figure = plt.figure(figsize=(12, 10), dpi=100)
+    ax = figure.add_subplot(111)
+    q = gplot.Quiver(step='auto', arrows_per_inch=4)
+    pquiver = Plot2QuiverBasemap(
+        u, v, q, xarray=lons, yarray=lats, ax=ax, title='quiver step=auto',
+        projection='cyl')
+    pquiver.plot()
+
+    figure.show()
+
+    return
+
+
 def test_basemap_quiver_reso():
 
     figure = plt.figure(figsize=(12, 10), dpi=100)
@@ -586,6 +636,8 @@ if __name__ == '__main__':
     test_basemap_quiver()
     test_basemap_quiver2()
     test_basemap_quiver3()
+    test_basemap_quiver_curve_descending()
+    test_basemap_quiver_auto_step()
     test_basemap_quiver_reso()
     test_basemap_quiver_scale()
     test_basemap_quiver_scale_keylength()
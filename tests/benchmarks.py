@@ -0,0 +1,369 @@
+'''Benchmarks of gplot using synthetic data
+
+Synthetic global and regional fields are generated at several resolutions,
+and the time of getRange(), mkscale(), and the phases of each plotting
+method (_plot*, plotAxes, plotColorbar etc., see gplot.PlotTracer) plus the
+canvas drawing are measured for the default, basemap and cartopy backends.
+No data files are needed.
+
+Usage:
+
+    python benchmarks.py -o results.json
+    python benchmarks.py --quick -o results.json
+    python benchmarks.py --compare old.json new.json
+
+The results json records the git commit and package versions, so results
+from different commits can be compared with --compare.
+'''
+from __future__ import print_function
+from __future__ import absolute_import
+
+#--------Import modules-------------------------
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+import matplotlib
+import gplot
+
+# (lat1, lat2, lon1, lon2) of the domains
+DOMAINS={
+        'global': (-90., 90., 0., 360.),
+        'regional': (10., 60., 70., 150.)
+        }
+
+# grid spacings in degrees
+RESOLUTIONS=[2.5, 1., 0.5, 0.25]
+QUICK_RESOLUTIONS=[2.5, 1.]
+
+METHODS=['Isofill', 'Isoline', 'Boxfill', 'Pcolor', 'Hatch', 'Shading',
+        'Quiver']
+
+BACKENDS=['default', 'basemap', 'cartopy']
+
+REPEATS=3
+
+
+
+def makeField(domain, reso, seed=0):
+    '''Create synthetic fields on a lat-lon grid
+
+    Args:
+        domain (str): key in DOMAINS.
+        reso (float): grid spacing in degrees.
+    Keyword Args:
+        seed (int): random seed.
+    Returns:
+        fields (dict): with keys 'var': masked scalar field with some
+            missings, 'u', 'v': wind components, 'mask': binary field for
+            hatching/shading, 'lats', 'lons': 1d coordinates.
+    '''
+
+    lat1, lat2, lon1, lon2=DOMAINS[domain]
+    lats=np.arange(lat1, lat2+reso/2., reso)
+    lons=np.arange(lon1, lon2+reso/2., reso)
+    yy, xx=np.meshgrid(np.radians(lats), np.radians(lons), indexing='ij')
+
+    rng=np.random.RandomState(seed)
+    var=1e5+1500*np.cos(2*yy)*np.sin(3*xx)+800*np.sin(5*xx+yy)**2\
+            +50*rng.standard_normal(xx.shape)
+    var=np.ma.masked_where((np.abs(lats[:, None]-20)<5) &
+            (np.abs(lons[None, :]-100)<10), var)
+
+    u=20*np.cos(yy)*np.sin(2*xx)+rng.standard_normal(xx.shape)
+    v=15*np.sin(2*yy)*np.cos(3*xx)+rng.standard_normal(xx.shape)
+    mask=(var.filled(0)>1e5+500).astype('float')
+
+    return {'var': var, 'u': u, 'v': v, 'mask': mask, 'lats': lats,
+            'lons': lons}
+
+
+def summarize(times):
+    '''Summarize a list of times in seconds'''
+
+    return {'times': times, 'min': float(np.min(times)),
+            'median': float(np.median(times))}
+
+
+def benchRange(fields, repeats):
+    '''Time getRange() and mkscale() on a field'''
+
+    records=[]
+    var=fields['var']
+
+    for name, kwargs in [('getRange', {}),
+            ('getRange_quantiles', {'ql': 0.01, 'qr': 0.01})]:
+        times=[]
+        for ii in range(repeats):
+            t0=time.perf_counter()
+            gplot.getRange(var, verbose=False, **kwargs)
+            times.append(time.perf_counter()-t0)
+        records.append(dict(summarize(times), phase=name))
+
+    vmin, vmax=gplot.getRange(var, verbose=False)[:2]
+    times=[]
+    for ii in range(repeats):
+        t0=time.perf_counter()
+        gplot.mkscale(vmin, vmax, nc=12, zero=1)
+        times.append(time.perf_counter()-t0)
+    records.append(dict(summarize(times), phase='mkscale'))
+
+    return records
+
+
+def getMethod(method_name, fields):
+    '''Create a plotting method and the data to plot with it'''
+
+    if method_name in ['Isofill', 'Isoline', 'Boxfill', 'Pcolor']:
+        method=getattr(gplot, method_name)(fields['var'])
+        return method, fields['var'], None
+    elif method_name=='Hatch':
+        return gplot.Hatch(), fields['mask'], None
+    elif method_name=='Shading':
+        return gplot.Shading(), fields['mask'], None
+    elif method_name=='Quiver':
+        return gplot.Quiver(), fields['u'], fields['v']
+
+    raise Exception("Unknown method: %s" %method_name)
+
+
+def benchPlot(fields, method_name, backend, repeats):
+    '''Time the phases of a plot, and the drawing of the canvas
+
+    Returns:
+        records (list): a record per phase, with the times of the repeats.
+    '''
+
+    if backend=='default':
+        params={'isgeomap': False}
+    else:
+        params={'isgeomap': True, 'geo_interface': backend,
+                'projection': 'cyl'}
+
+    times={}
+    for ii in range(repeats):
+        method, var, var_v=getMethod(method_name, fields)
+        with gplot.RenderContext(figsize=(12, 10), dpi=100,
+                nc_interface='netcdf4', **params) as ctx:
+            with gplot.PlotTracer() as tracer:
+                t0=time.perf_counter()
+                plotobj=ctx.plot2(var, method, xarray=fields['lons'],
+                        yarray=fields['lats'], var_v=var_v)
+                t1=time.perf_counter()
+            ctx.canvas.draw()
+            t2=time.perf_counter()
+
+        for kk, vv in plotobj.trace['summary'].items():
+            times.setdefault(kk, []).append(vv['duration'])
+        times.setdefault('plot2', []).append(t1-t0)
+        times.setdefault('draw', []).append(t2-t1)
+
+    return [dict(summarize(vv), phase=kk) for kk, vv in times.items()]
+
+
+def isAvailable(backend):
+    '''Check a plotting backend can be imported'''
+
+    try:
+        if backend=='basemap':
+            import mpl_toolkits.basemap
+        elif backend=='cartopy':
+            import cartopy
+    except ImportError:
+        return False
+
+    return True
+
+
+def getVersions():
+    '''Get the versions of the python packages used'''
+
+    versions={'python': platform.python_version(),
+            'numpy': np.__version__,
+            'matplotlib': matplotlib.__version__}
+    for name, module in [('basemap', 'mpl_toolkits.basemap'),
+            ('cartopy', 'cartopy'), ('netCDF4', 'netCDF4')]:
+        try:
+            versions[name]=__import__(module, fromlist=['__version__']).__version__
+        except Exception:
+            versions[name]=None
+
+    return versions
+
+
+def getCommit():
+    '''Get the git commit of the gplot source, None if not in a git repo
+
+    A '-dirty' suffix is added if the source has uncommitted changes.
+    '''
+
+    folder=os.path.dirname(os.path.abspath(gplot.__file__))
+    try:
+        commit=subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                cwd=folder, stderr=subprocess.DEVNULL).decode().strip()
+        status=subprocess.check_output(['git', 'status', '--porcelain',
+            '--untracked-files=no'], cwd=folder,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+    if status:
+        commit+='-dirty'
+
+    return commit
+
+
+def runBenchmarks(domains=None, resolutions=None, methods=None,
+        backends=None, repeats=REPEATS, verbose=True):
+    '''Run the benchmarks
+
+    Keyword Args:
+        domains (list or None): keys in DOMAINS. If None, all.
+        resolutions (list or None): grid spacings. If None, RESOLUTIONS.
+        methods (list or None): plotting method names. If None, METHODS.
+        backends (list or None): 'default', 'basemap' or 'cartopy'. If
+            None, BACKENDS. Backends not installed are skipped.
+        repeats (int): number of repeats of each measurement.
+        verbose (bool): whether to print progress or not.
+    Returns:
+        result (dict): json serializable results, with keys 'meta' and
+            'records'. Each record has 'name', 'domain', 'reso', 'shape',
+            'backend', 'method', 'phase', 'times', 'min' and 'median' (in
+            seconds), or 'error' if the benchmark failed.
+    '''
+
+    domains=domains or list(DOMAINS)
+    resolutions=resolutions or RESOLUTIONS
+    methods=methods or METHODS
+    backends=backends or BACKENDS
+
+    for bii in backends:
+        if not isAvailable(bii) and verbose:
+            print('# <runBenchmarks>: skip backend %s, not installed.' %bii)
+    backends=[bii for bii in backends if isAvailable(bii)]
+
+    meta={'commit': getCommit(), 'versions': getVersions(),
+            'machine': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'repeats': repeats,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    records=[]
+    for dii in domains:
+        for rii in resolutions:
+            fields=makeField(dii, rii)
+            base={'domain': dii, 'reso': rii,
+                    'shape': list(fields['var'].shape)}
+
+            for recii in benchRange(fields, repeats):
+                records.append(dict(base, name='range', **recii))
+
+            for bii in backends:
+                for mii in methods:
+                    label='%s %s %s %s' %(dii, rii, bii, mii)
+                    try:
+                        phases=benchPlot(fields, mii, bii, repeats)
+                    except Exception as e:
+                        records.append(dict(base, name='plot', backend=bii,
+                            method=mii, error=str(e)))
+                        if verbose:
+                            print('# <runBenchmarks>: %s failed: %s' %(label, e))
+                        continue
+                    for recii in phases:
+                        records.append(dict(base, name='plot', backend=bii,
+                            method=mii, **recii))
+                    if verbose:
+                        total=[pii['median'] for pii in phases
+                                if pii['phase']=='plot2'][0]
+                        print('# <runBenchmarks>: %s: %.3f s' %(label, total))
+
+    return {'meta': meta, 'records': records}
+
+
+def getRecordKey(record):
+    '''Get the key identifying a benchmark record'''
+
+    return (record['name'], record['domain'], record['reso'],
+            record.get('backend'), record.get('method'), record.get('phase'))
+
+
+def compareResults(old, new, threshold=0.1):
+    '''Print the ratio of median times between 2 results
+
+    Args:
+        old (dict): baseline results from runBenchmarks().
+        new (dict): new results.
+    Keyword Args:
+        threshold (float): relative change above which a record is marked.
+    Returns:
+        ratios (dict): record key to new/old ratio of median times.
+    '''
+
+    old_records=dict((getRecordKey(rii), rii) for rii in old['records']
+            if 'median' in rii)
+    ratios={}
+    print('# <compareResults>: %s -> %s' %(old['meta']['commit'],
+        new['meta']['commit']))
+    for rii in new['records']:
+        key=getRecordKey(rii)
+        if 'median' not in rii or key not in old_records:
+            continue
+        ratio=rii['median']/max(old_records[key]['median'], 1e-9)
+        ratios[key]=ratio
+        mark=''
+        if ratio>1+threshold:
+            mark='slower'
+        elif ratio<1-threshold:
+            mark='faster'
+        print('%-70s %8.4f %8.4f %6.2f %s' %(' '.join(map(str, key)),
+            old_records[key]['median'], rii['median'], ratio, mark))
+
+    return ratios
+
+
+def main(argv=None):
+
+    parser=argparse.ArgumentParser(description='Benchmarks of gplot.')
+    parser.add_argument('-o', '--output', default=None,
+            help='json file to save the results.')
+    parser.add_argument('--quick', action='store_true',
+            help='only the coarse resolutions and 1 repeat.')
+    parser.add_argument('--domains', nargs='+', choices=list(DOMAINS))
+    parser.add_argument('--resolutions', nargs='+', type=float)
+    parser.add_argument('--methods', nargs='+', choices=METHODS)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS)
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+            help='compare 2 results json files instead of running.')
+    args=parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], 'r') as fin:
+            old=json.load(fin)
+        with open(args.compare[1], 'r') as fin:
+            new=json.load(fin)
+        compareResults(old, new)
+        return 0
+
+    resolutions=args.resolutions
+    repeats=args.repeats
+    if args.quick:
+        resolutions=resolutions or QUICK_RESOLUTIONS
+        repeats=1
+
+    result=runBenchmarks(domains=args.domains, resolutions=resolutions,
+            methods=args.methods, backends=args.backends, repeats=repeats)
+
+    if args.output is not None:
+        with open(args.output, 'w') as fout:
+            json.dump(result, fout, indent=1)
+        print('# <main>: Results saved to %s' %args.output)
+
+    return 0
+
+if __name__=='__main__':
+
+    sys.exit(main())
@@ -7,11 +7,21 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 #--------Import modules-------------------------
+import io
+import os
+import gc
+import weakref
+import tempfile
+import threading
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 #from gplot.lib import gplot
 import gplot
+from netCDF4 import Dataset
 from gplot.lib import netcdf4_utils
+from gplot.lib import modplot
+from gplot.lib import cache_utils
 
 SAVE=False
 
@@ -76,6 +86,105 @@ def test_plot2d_isofill_split_comparison():
 
     return
 
+def test_plot2d_isofill_tweak():
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    iso=gplot.Isofill(var1, num=10)
+    for ii, num in enumerate([5, 10, 20]):
+        # levels are re-computed without re-scanning the data
+        iso.num=num
+        ax=figure.add_subplot(3,1,ii+1)
+        gplot.plot2(var1, iso, ax, title='Isofill num=%d' %num, legend='local')
+    figure.show()
+
+    return
+
+def test_plot2d_isofill_stats():
+
+    # statistics known before hand, e.g. read from a sidecar file
+    stats=gplot.DataStats(np.nanmin(var1), np.nanmax(var1),
+            {0.005: np.nanquantile(var1, 0.005),
+             0.999: np.nanquantile(var1, 0.999)})
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    iso=gplot.Isofill(stats, ql=0.005, qr=0.001)
+    gplot.plot2(var1[0], iso, ax, title='Isofill from statistics')
+    figure.show()
+
+    return
+
+def test_plot2d_isofill_stats_quantiles():
+
+    stats=gplot.DataStats(0., 100., {0.01: 5., 0.05: 9., 0.99: 95.})
+    # interpolated between table entries
+    assert stats.getQuantile(0.03) == 7.
+    assert gplot.Isofill(stats, ql=0.01).vmin == 5.
+
+    # quantiles not covered by the table are not made up from min/max
+    for qii in [0.005, 0.995]:
+        try:
+            stats.getQuantile(qii)
+        except Exception:
+            pass
+        else:
+            raise AssertionError('quantile %s should not be covered' %qii)
+
+    try:
+        gplot.Isofill(gplot.DataStats(0., 100.), ql=0.01).vmin
+    except Exception as e:
+        print('# <test_plot2d_isofill_stats_quantiles>:', e)
+    else:
+        raise AssertionError('empty quantile table should raise')
+
+    return
+
+def test_plot2d_isofill_stats_file():
+
+    # write statistics of the sample data into sidecar files
+    outputdir=tempfile.mkdtemp()
+    netcdf4_utils.writeStats(netcdf4_utils.DATA_FILE_NAME, varids=['msl'],
+            outputdir=outputdir)
+    stats_file=netcdf4_utils.getStatsPath(netcdf4_utils.DATA_FILE_NAME, 'msl',
+            outputdir)
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    iso=gplot.Isofill(stats_file, ql=0.005, qr=0.001)
+    gplot.plot2(var1[0], iso, ax, title='Isofill from statistics file')
+    figure.show()
+
+    return
+
+def test_plot2d_isofill_stream():
+
+    # levels for all time steps, read 1 time step at a time
+    fin=Dataset(netcdf4_utils.DATA_FILE_NAME, 'r')
+    ncvar=fin.variables['msl']
+    iso=gplot.Isofill(ncvar, ql=0.005, qr=0.001, stream=True)
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    for ii in range(2):
+        ax=figure.add_subplot(1,2,ii+1)
+        gplot.plot2(np.array(ncvar[ii]), iso, ax,
+                title='Isofill stream, t=%d' %ii)
+    figure.show()
+    fin.close()
+
+    return
+
+def test_plot2d_isofill_workers():
+
+    # range of several inputs computed in 4 threads
+    iso=gplot.Isofill([var1, var1*1.01], ql=0.005, qr=0.001, workers=4)
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    gplot.plot2(var1[0], iso, ax, title='Isofill workers=4')
+    figure.show()
+
+    return
+
 def test_plot2d_boxfill():
 
     figure=plt.figure(figsize=(12,10),dpi=100)
@@ -96,6 +205,57 @@ def test_plot2d_axes_grid():
 
     return
 
+def test_plot2d_alternate_ticks():
+
+    ticks=np.arange(-10, 12, 2)
+    xx=np.linspace(-10, 10, 50)
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    cs=ax.contourf(xx[None, :]*np.ones([5, 1]), ticks)
+    cbar=figure.colorbar(cs, ax=ax, orientation='horizontal')
+    gplot.alternateTicks(cbar, ticks)
+    figure.canvas.draw()
+
+    # odd ticks labelled at the bottom
+    bottom=[tii.get_text() for tii in cbar.ax.get_xticklabels()]
+    # even ticks labelled on top, each with a tick line
+    top=[tii.get_text() for tii in cbar.ax.texts]
+    tick_lines=[cii for cii in cbar.ax.collections
+            if isinstance(cii, LineCollection)]
+    print('# <test_plot2d_alternate_ticks>: bottom:', bottom, 'top:', top)
+
+    assert np.allclose(cbar.get_ticks(), ticks[1::2])
+    assert [float(lii.replace('\u2212', '-')) for lii in bottom] == list(ticks[1::2])
+    assert [float(lii.replace('\u2212', '-')) for lii in top] == list(ticks[::2])
+    assert len(tick_lines[-1].get_segments()) == len(ticks[::2])
+    plt.close(figure)
+
+    # vertical colorbars keep all ticks at 1 side
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    cs=ax.contourf(xx[None, :]*np.ones([5, 1]), ticks)
+    cbar=figure.colorbar(cs, ax=ax, orientation='vertical')
+    gplot.alternateTicks(cbar, ticks)
+    assert np.allclose(cbar.get_ticks(), ticks)
+    assert len(cbar.ax.texts) == 0
+    plt.close(figure)
+
+    return
+
+def test_plot2d_hatch():
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    mask=np.where(var1 > np.median(var1), 1, 0)
+    hatch=gplot.Hatch(hatch='//', color='b')
+    pobj=gplot.plot2(mask, hatch, ax, title='hatch Plot2D')
+    figure.show()
+
+    hatched=[cc for cc in pobj.cs.collections if cc.get_hatch() == '//']
+    assert len(hatched) > 0
+
+    return
+
 def test_plot2d_label_axes_True():
 
     figure=plt.figure(figsize=(12,10),dpi=100)
@@ -184,6 +344,223 @@ def test_plot2d_subplots_global_legend():
 
     return
 
+def test_plot2d_subplots_shared_levels():
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    plot_vars=[var1[ii] for ii in range(4)]
+    shared=gplot.SharedLevels(gplot.Isofill, plot_vars, ql=0.005, qr=0.001)
+    titles=['var1-%d' %ii for ii in range(4)]
+
+    for ii, vii in enumerate(plot_vars):
+        ax=figure.add_subplot(2,2,ii+1)
+        gplot.plot2(vii, shared, ax, title=titles[ii], legend='global')
+
+    figure.show()
+
+    return
+
+def test_plot2d_subplots_shared_levels_stream():
+
+    # levels shared by 2 lazily read netcdf variables, read 1 slab at a time
+    fin=Dataset(netcdf4_utils.DATA_FILE_NAME, 'r')
+    ncvars=[fin.variables['msl'], fin.variables['msl']]
+    shared=gplot.SharedLevels(gplot.Isofill, ncvars, ql=0.005, qr=0.001,
+            stream=True)
+    method=shared.getMethod()
+    print('# <test_plot2d_subplots_shared_levels_stream>: vmin, vmax:',
+            method.vmin, method.vmax)
+    assert np.nanmin(var1) <= method.vmin < method.vmax <= np.nanmax(var1)
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    for ii in range(2):
+        ax=figure.add_subplot(1,2,ii+1)
+        gplot.plot2(np.array(ncvars[ii][ii]), shared, ax,
+                title='shared levels stream, t=%d' %ii, legend='global')
+    figure.show()
+    fin.close()
+
+    return
+
+def test_plot2d_render_context():
+
+    def render(ii, results):
+        with gplot.RenderContext(figsize=(12, 10), dpi=100) as ctx:
+            iso=gplot.Isofill(var1[ii])
+            ctx.plot2(var1[ii], iso, title='RenderContext t=%d' %ii)
+            buf=io.BytesIO()
+            ctx.savefig(buf, format='png')
+            results[ii]=buf.getvalue()
+
+    # render in threads, without pyplot
+    results={}
+    threads=[threading.Thread(target=render, args=(ii, results)) for ii in range(4)]
+    for tii in threads:
+        tii.start()
+    for tii in threads:
+        tii.join()
+
+    print('# <test_plot2d_render_context>: png sizes:',
+            [len(results[ii]) for ii in range(4)])
+
+    return
+
+def test_plot2d_scoped_params():
+
+    def render(ii, cmap, results):
+        with gplot.useParams(default_cmap=cmap, legend='local'):
+            with gplot.RenderContext(figsize=(12, 10), dpi=100) as ctx:
+                iso=gplot.Isofill(var1[ii])
+                ctx.plot2(var1[ii], iso, title='useParams %s' %cmap)
+                results[ii]=(gplot.getParams()['default_cmap'],
+                        iso.cmap.name)
+
+    # concurrent renders with different parameters
+    results={}
+    cmaps=['viridis', 'jet', 'RdBu_r', 'plasma']
+    threads=[threading.Thread(target=render, args=(ii, cmaps[ii], results))
+            for ii in range(4)]
+    for tii in threads:
+        tii.start()
+    for tii in threads:
+        tii.join()
+
+    print('# <test_plot2d_scoped_params>: cmaps:', results)
+    for ii in range(4):
+        assert results[ii] == (cmaps[ii], cmaps[ii])
+    assert gplot.getParams()['legend'] == gplot.rcParams['legend']
+
+    return
+
+def test_plot2d_trace():
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    with gplot.PlotTracer(memory=True) as tracer:
+        iso=gplot.Isofill(var1, num=10)
+        plotobj=gplot.plot2(var1, iso, ax, title='PlotTracer')
+
+    for kk, vv in plotobj.trace['summary'].items():
+        print('# <test_plot2d_trace>:', kk, vv)
+    assert '_plotIsofill' in plotobj.trace['summary']
+
+    abpath_out=os.path.join(tempfile.mkdtemp(), 'trace.json')
+    tracer.saveChromeTrace(abpath_out)
+    figure.show()
+
+    return
+
+def test_plot2d_release():
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    data=np.ma.array(var1, copy=True)
+    ref=weakref.ref(data)
+    iso=gplot.Isofill(data, num=10)
+    plotobj=gplot.plot2(data, iso, ax, title='release')
+    plt.close(figure)
+
+    levels=iso.levels
+    plotobj.release(artists=True)
+    del data
+    gc.collect()
+
+    print('# <test_plot2d_release>: data alive:', ref() is not None,
+            'method vars:', iso.vars)
+    assert ref() is None
+    assert np.all(iso.levels == levels)
+
+    return
+
+def test_plot2d_release_quantiles():
+
+    # quantiles in use are kept in the summary of a released method
+    box=gplot.Boxfill(var1, ql=0.02)
+    box.release()
+    box.qr=0.05
+    ref=np.nanquantile(var1, 0.95)
+    print('# <test_plot2d_release_quantiles>: vmax:', box.vmax,
+            '95th percentile:', ref)
+    assert abs(box.vmax-ref) < 0.01*(np.nanmax(var1)-np.nanmin(var1))
+
+    # no quantile table without ql or qr, new quantiles are not made up
+    box=gplot.Boxfill(var1)
+    box.release()
+    box.qr=0.05
+    try:
+        box.vmax
+    except Exception as e:
+        print('# <test_plot2d_release_quantiles>:', e)
+    else:
+        raise AssertionError('quantile without table should raise')
+
+    return
+
+def test_plot2d_lean():
+
+    data=np.ma.array(var1, copy=True)
+    ref=weakref.ref(data)
+    levels=gplot.Isofill(data, num=10, ql=0.01, qr=0.01).levels
+    with gplot.useParams(lean=True):
+        iso=gplot.Isofill(data, num=10, ql=0.01, qr=0.01)
+        with gplot.RenderContext(figsize=(12,10), dpi=100) as ctx:
+            plotobj=ctx.plot2(data[0], iso, title='lean')
+            ctx.getBytes('png')
+    del data
+    gc.collect()
+
+    print('# <test_plot2d_lean>: data alive:', ref() is not None,
+            'method vars:', iso.vars)
+    assert ref() is None
+    assert plotobj.var is None
+    assert np.all(iso.levels == levels)
+
+    # re-ranged from the quantile table
+    iso.ql=0.05
+    print('# <test_plot2d_lean>: levels with ql=0.05:', iso.levels)
+
+    return
+
+def test_plot2d_iter_slabs():
+
+    iso=gplot.Isofill(var1, num=10)
+    sizes=[]
+    for (tt, ), slab in gplot.iterSlabs(var1[:4]):
+        # views into var1, no copies
+        assert np.shares_memory(slab, var1)
+        assert np.all(slab == gplot.getSlab(var1, indices={0: tt}))
+        with gplot.RenderContext(figsize=(12,10), dpi=100) as ctx:
+            ctx.plot2(slab, iso, title='slab t=%d' %tt)
+            sizes.append(len(ctx.getBytes('png')[0]))
+
+    print('# <test_plot2d_iter_slabs>: png sizes:', sizes)
+
+    return
+
+def test_plot2d_bytes():
+
+    iso=gplot.Isofill(var1[0])
+    for fmt in ['png', 'webp', 'svg']:
+        result, meta=gplot.plot2Bytes(var1[0], iso, fmt=fmt, dpi=100,
+                title='plot2Bytes %s' %fmt)
+        print('# <test_plot2d_bytes>:', fmt, meta)
+
+    return
+
+def test_plot2d_bytes_cache():
+
+    cache_dir=tempfile.mkdtemp()
+    cache=cache_utils.RenderCache(cache_dir, max_bytes=50*1024**2)
+    for ii in range(2):
+        iso=gplot.Isofill(var1[0])
+        result, meta=gplot.plot2Bytes(var1[0], iso, title='plot2Bytes cache',
+                cache=cache)
+        print('# <test_plot2d_bytes_cache>: cache_hit:', meta['cache_hit'],
+                'time:', meta['total'])
+
+    cache.clear()
+
+    return
+
 def test_plot2d_quiver():
 
     figure=plt.figure(figsize=(12,10),dpi=100)
@@ -218,6 +595,35 @@ def test_plot2d_quiver3():
 
     return
 
+def test_plot2d_curved_quiver_arrows():
+
+    # uniform flow along the diagonal of the data
+    xx=np.linspace(0, 10, 21)
+    yy=np.linspace(0, 10, 21)
+    ones=np.ones([len(yy), len(xx)])
+
+    figure=plt.figure(figsize=(8,8),dpi=100)
+    ax=figure.add_subplot(111)
+    streams=modplot.velovect(ax, xx, yy, ones, ones, grains=5, scale=2)
+
+    def getAngle():
+        figure.canvas.draw()
+        # tip at the origin, the back of the head on the other side
+        verts=streams.arrows.get_paths()[0].vertices
+        back=-(verts[1]+verts[2])/2.
+        return np.degrees(np.arctan2(back[1], back[0]))
+
+    angle1=getAngle()
+    # heads follow the new axis limits
+    ax.set_ylim(0, 100)
+    angle2=getAngle()
+    print('# <test_plot2d_curved_quiver_arrows>: angles:', angle1, angle2)
+    assert abs(angle1-45) < 2
+    assert abs(angle2-np.degrees(np.arctan(0.1))) < 2
+    plt.close(figure)
+
+    return
+
 def test_plot2d_quiver_step():
 
     figure=plt.figure(figsize=(12,10),dpi=100)
@@ -241,6 +647,18 @@ def test_plot2d_quiver_step2():
 
     return
 
+def test_plot2d_quiver_auto_step():
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    ax=figure.add_subplot(111)
+    q=gplot.Quiver(step='auto')
+    pquiver=gplot.Plot2Quiver(u, v, q, ax=ax, title='quiver step=auto')
+    pquiver.plot()
+
+    figure.show()
+
+    return
+
 def test_plot2d_quiver_reso():
 
     figure=plt.figure(figsize=(12,10),dpi=100)
@@ -277,6 +695,38 @@ def test_plot2d_quiver_scale_keylength():
 
     return
 
+def test_plot2d_quiver_fixed_keylength():
+
+    # compute the key length once for all time steps
+    keylength=gplot.getKeyLength(u, v)
+    q=gplot.Quiver(step=5, keylength=keylength)
+
+    figure=plt.figure(figsize=(12,10),dpi=100)
+    for ii in range(2):
+        ax=figure.add_subplot(1,2,ii+1)
+        gplot.plot2(u[ii], q, var_v=v[ii], ax=ax,
+                title='quiver fixed keylength, t=%d' %ii)
+
+    figure.show()
+
+    return
+
+def test_plot2d_keylength_sampling():
+
+    # magnitudes of 1 in even columns, 10 in odd columns. A stride of 2
+    # over the flattened field would only see the even columns.
+    uu=np.ones([200, 100])
+    uu[:, 1::2]=10.
+    vv=np.zeros_like(uu)
+    sketch=gplot.MagnitudeSketch(max_samples=10000)
+    sketch.update(uu, vv)
+    frac=np.mean(sketch.samples == 10.)
+    print('# <test_plot2d_keylength_sampling>: fraction of odd columns:', frac)
+    assert 0.4 < frac < 0.6
+    assert sketch.quantile(80) == 10.
+
+    return
+
 def test_plot2d_quiver_overlay():
 
     figure=plt.figure(figsize=(12,10),dpi=100)
@@ -324,12 +774,31 @@ if __name__=='__main__':
     test_plot2d_default()
     test_plot2d_isofill_overflow()
     test_plot2d_isofill_split()
+    test_plot2d_isofill_tweak()
+    test_plot2d_isofill_stats()
+    test_plot2d_isofill_stats_quantiles()
+    test_plot2d_isofill_stats_file()
+    test_plot2d_isofill_stream()
+    test_plot2d_isofill_workers()
     test_plot2d_boxfill()
     test_plot2d_axes_grid()
     test_plot2d_vertical_legend()
     test_plot2d_subplots()
     test_plot2d_subplots_global_legend()
-
+    test_plot2d_subplots_shared_levels()
+    test_plot2d_subplots_shared_levels_stream()
+    test_plot2d_render_context()
+    test_plot2d_scoped_params()
+    test_plot2d_trace()
+    test_plot2d_release()
+    test_plot2d_release_quantiles()
+    test_plot2d_lean()
+    test_plot2d_iter_slabs()
+    test_plot2d_bytes()
+    test_plot2d_bytes_cache()
+
+    test_plot2d_alternate_ticks()
+    test_plot2d_hatch()
     test_plot2d_label_axes_True()
     test_plot2d_label_axes_False()
     test_plot2d_label_axes_all()
@@ -337,11 +806,15 @@ if __name__=='__main__':
     test_plot2d_quiver()
     test_plot2d_quiver2()
     test_plot2d_quiver3()
+    test_plot2d_curved_quiver_arrows()
     test_plot2d_quiver_step()
     test_plot2d_quiver_step2()
+    test_plot2d_quiver_auto_step()
     test_plot2d_quiver_reso()
     test_plot2d_quiver_scale()
     test_plot2d_quiver_scale_keylength()
+    test_plot2d_quiver_fixed_keylength()
+    test_plot2d_keylength_sampling()
     test_plot2d_quiver_overlay()
     test_plot2d_quiver_overlay2()
     test_plot2d_isofill_split_comparison()
@@ -0,0 +1,58 @@
+'''Tests for the import time of gplot'''
+from __future__ import print_function
+from __future__ import absolute_import
+
+#--------Import modules-------------------------
+import sys
+import subprocess
+
+# modules that should only be imported when first used
+# (not PIL, which matplotlib imports itself)
+LAZY_MODULES=['matplotlib.pyplot', 'matplotlib.figure', 'matplotlib.colorbar',
+        'scipy', 'mpl_toolkits.basemap', 'cartopy', 'netCDF4', 'cdms2',
+        'gplot.lib.modplot']
+
+# max ratio of the time of `import gplot` to that of `import numpy, matplotlib`
+MAX_TIME_RATIO=1.5
+
+NREPEATS=5
+
+
+def getImportTime(statement):
+    '''Get the best time of an import statement in fresh interpreters'''
+
+    code='import time; t0=time.perf_counter(); %s; print(time.perf_counter()-t0)'\
+            %statement
+    times=[float(subprocess.check_output([sys.executable, '-c', code]))
+            for ii in range(NREPEATS)]
+
+    return min(times)
+
+def test_import_lazy_modules():
+
+    code='import sys, gplot; print(",".join(m for m in %r if m in sys.modules))'\
+            %LAZY_MODULES
+    loaded=subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+    print('# <test_import_lazy_modules>: eagerly imported:', loaded or None)
+    assert loaded == '', 'Modules imported by `import gplot`: %s' %loaded
+
+    return
+
+def test_import_time():
+
+    base_time=getImportTime('import numpy, matplotlib')
+    gplot_time=getImportTime('import gplot')
+    ratio=gplot_time/base_time
+    print('# <test_import_time>: numpy+matplotlib: %.3f s, gplot: %.3f s, ratio: %.2f'
+            %(base_time, gplot_time, ratio))
+    assert ratio < MAX_TIME_RATIO,\
+            '`import gplot` takes %.2f times as long as numpy+matplotlib'\
+            %ratio
+
+    return
+
+if __name__=='__main__':
+
+    #----------------------Tests----------------------
+    test_import_lazy_modules()
+    test_import_time()
@@ -2,12 +2,18 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 # --------Import modules-------------------------
+import os
+import json
+import tempfile
+import threading
 import numpy as np
 import matplotlib.pyplot as plt
 #from gplot.lib import gplot
 import gplot
 from gplot.lib.basemap_utils import Plot2Basemap, Plot2QuiverBasemap
 from gplot.lib import netcdf4_utils
+from gplot.lib import server_utils
+from gplot.lib import cli_utils
 
 SAVE = False
 
@@ -287,6 +293,59 @@ def test_basemap_quiver_overlay():
     return
 
 
+def test_basemap_render_server():
+
+    server = server_utils.RenderServer(port=0, verbose=False)
+    thread = threading.Thread(target=server.serveForever)
+    thread.start()
+    url = 'http://%s:%d' % server.server_address[:2]
+
+    try:
+        request = {'file': netcdf4_utils.DATA_FILE_NAME, 'varid': 'msl',
+                   'method': 'Isofill', 'method_kwargs': {'num': 10},
+                   'params': {'projection': 'cyl', 'title': 'render server'}}
+        for ii in range(2):
+            result, meta = server_utils.requestRender(url, request)
+            print('# <test_basemap_render_server>:', meta)
+        assert meta['bmap_reused']
+
+        request = {'file': netcdf4_utils.DATA_FILE_NAME, 'varid': 'u',
+                   'varid_v': 'v', 'method': 'Quiver',
+                   'method_kwargs': {'reso': 5, 'scale': 500},
+                   'params': {'projection': 'cyl'}}
+        result, meta = server_utils.requestRender(url, request)
+        print('# <test_basemap_render_server>:', meta)
+        print('# <test_basemap_render_server>:', server.status())
+    finally:
+        server.shutdown()
+        thread.join()
+
+    return
+
+
+def test_basemap_cli_render():
+
+    # output folder and log not created yet
+    outputdir = os.path.join(tempfile.mkdtemp(), 'out')
+    log_file = os.path.join(outputdir, 'progress.jsonl')
+    argv = ['render', netcdf4_utils.DATA_FILE_NAME, '-v', 'msl',
+            '--time', '0:2', '-o', outputdir, '--workers', '2',
+            '-m', 'num=10', '-p', 'projection=cyl', '--log', log_file]
+
+    # 2nd run skips the existing outputs
+    for ii in range(2):
+        code = cli_utils.main(argv)
+        assert code == 0
+
+    with open(log_file, 'r') as fin:
+        records = [json.loads(lii) for lii in fin]
+    print('# <test_basemap_cli_render>: status:',
+          [rii['status'] for rii in records])
+    assert [rii['status'] for rii in records[-2:]] == ['skipped', 'skipped']
+
+    return
+
+
 if __name__ == '__main__':
 
     var1 = netcdf4_utils.readData('msl')
@@ -315,3 +374,5 @@ if __name__ == '__main__':
     test_basemap_quiver_scale()
     test_basemap_quiver_scale_keylength()
     test_basemap_quiver_overlay()
+    test_basemap_render_server()
+    test_basemap_cli_render()
@@ -0,0 +1,261 @@
+'''Memory soak test of gplot
+
+Renders many plots through plot2 in 1 process, as a long-running renderer
+would, and tracks the resident memory (RSS), the Python heap (tracemalloc)
+and the number of live objects. Reports the memory growth per plot and the
+source lines with the largest allocation growth.
+
+Usage:
+
+    python soak.py -n 2000 --mode context
+    python soak.py -n 2000 --mode pyplot --tracemalloc -o soak.jsonl
+    python soak.py -n 500 --keep --release
+    python soak.py -n 500 --keep --lean
+
+Modes:
+    context: render in a RenderContext, encoded to png in memory.
+    pyplot: render in a pyplot figure, saved to memory then closed.
+    pyplot-noclose: as pyplot, but the figures are not closed, which
+        leaks as pyplot keeps all figures alive. For comparison.
+
+With --keep, the plot objs are kept, as a renderer caching them would, and
+--release calls their release(artists=True) after rendering. --lean renders
+with the 'lean' parameter on, see gplot.useParams().
+'''
+from __future__ import print_function
+from __future__ import absolute_import
+
+#--------Import modules-------------------------
+import os
+import gc
+import io
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import gplot
+
+MODES=['context', 'pyplot', 'pyplot-noclose']
+
+METHODS=['Isofill', 'Isoline', 'Boxfill', 'Pcolor']
+
+
+
+def getRSS():
+    '''Get the current resident set size of the process in bytes
+
+    Uses /proc on Linux. Elsewhere, falls back to the peak RSS.
+    '''
+
+    try:
+        with open('/proc/self/statm', 'r') as fin:
+            pages=int(fin.read().split()[1])
+        return pages*os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        import resource
+        rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # in bytes on macOS, in KB elsewhere
+        return rss if sys.platform=='darwin' else rss*1024
+
+
+def makeData(ii, shape):
+    '''Create the data of the ii-th plot'''
+
+    rng=np.random.RandomState(ii)
+    ny, nx=shape
+    yy, xx=np.meshgrid(np.linspace(-3, 3, ny), np.linspace(0, 6, nx),
+            indexing='ij')
+    var=np.sin(xx+0.1*ii)*np.cos(yy)*10+rng.standard_normal(shape)
+    lats=np.linspace(-60, 60, ny)
+    lons=np.linspace(0, 240, nx)
+
+    return var, lats, lons
+
+
+def renderOne(ii, mode, shape, isgeomap):
+    '''Render the ii-th plot
+
+    Returns:
+        plotobj (Plot2D): the plot obj.
+        nbytes (int): size of the encoded image.
+    '''
+
+    var, lats, lons=makeData(ii, shape)
+    method=getattr(gplot, METHODS[ii%len(METHODS)])(var, verbose=False)
+    title='soak %d' %ii
+
+    if mode=='context':
+        with gplot.RenderContext(figsize=(8, 6), dpi=72) as ctx:
+            plotobj=ctx.plot2(var, method, xarray=lons, yarray=lats,
+                    title=title, isgeomap=isgeomap, nc_interface='netcdf4')
+            result, _=ctx.getBytes('png', compress_level=1)
+    else:
+        import matplotlib.pyplot as plt
+        figure=plt.figure(figsize=(8, 6), dpi=72)
+        ax=figure.add_subplot(111)
+        plotobj=gplot.plot2(var, method, ax, xarray=lons, yarray=lats,
+                title=title, isgeomap=isgeomap, nc_interface='netcdf4')
+        buf=io.BytesIO()
+        figure.savefig(buf, format='png')
+        result=buf.getvalue()
+        if mode=='pyplot':
+            plt.close(figure)
+
+    return plotobj, len(result)
+
+
+def getSlope(xs, ys):
+    '''Least squares slope of ys over xs'''
+
+    if len(xs)<2:
+        return float('nan')
+
+    return float(np.polyfit(np.asarray(xs, dtype='float'),
+        np.asarray(ys, dtype='float'), 1)[0])
+
+
+def runSoak(n=2000, mode='context', shape=(181, 360), isgeomap=False,
+        sample_every=100, warmup=0.2, keep=False, release=False,
+        lean=False, trace_memory=False, ntop=10, log_file=None, verbose=True):
+    '''Render many plots and track the memory usage
+
+    Keyword Args:
+        n (int): number of plots to render.
+        mode (str): 'context', 'pyplot' or 'pyplot-noclose', see module doc.
+        shape (tuple): (ny, nx) shape of the data.
+        isgeomap (bool): whether to plot geographical maps.
+        sample_every (int): record the memory every this number of plots.
+        warmup (float): fraction of <n> ignored when computing the growth,
+            as caches fill up.
+        keep (bool): whether to keep the plot objs.
+        release (bool): whether to call release(artists=True) of the plot
+            objs.
+        lean (bool): whether to render with the 'lean' parameter on.
+        trace_memory (bool): whether to use tracemalloc to report the
+            source lines with the largest growth. Slows down rendering.
+        ntop (int): number of source lines to report.
+        log_file (str or None): if not None, write a json line per sample.
+        verbose (bool): whether to print progress or not.
+    Returns:
+        result (dict): with keys 'samples': list of samples, each with 'plots',
+            'rss', 'heap' (if tracemalloc), 'objects' and 'time',
+            'rss_per_plot' and 'objects_per_plot': growth after warmup,
+            and 'top_growth' (if tracemalloc): list of (source line,
+            size diff, count diff).
+    '''
+
+    if mode not in MODES:
+        raise Exception("<mode> needs to be one of %s." %', '.join(MODES))
+
+    if trace_memory:
+        tracemalloc.start()
+
+    flog=open(log_file, 'w') if log_file is not None else None
+    kept=[]
+    samples=[]
+    snapshot0=None
+    n_warmup=int(n*warmup)
+    t0=time.perf_counter()
+
+    try:
+        for ii in range(n+1):
+            if ii>0:
+                with gplot.useParams(lean=lean):
+                    plotobj, _=renderOne(ii-1, mode, shape, isgeomap)
+                if release:
+                    plotobj.release(artists=True)
+                if keep:
+                    kept.append(plotobj)
+                del plotobj
+
+            if ii%sample_every!=0 and ii!=n:
+                continue
+
+            gc.collect()
+            sample={'plots': ii, 'rss': getRSS(),
+                    'objects': len(gc.get_objects()),
+                    'time': time.perf_counter()-t0}
+            if trace_memory:
+                sample['heap']=tracemalloc.get_traced_memory()[0]
+                if snapshot0 is None and ii>=n_warmup:
+                    snapshot0=tracemalloc.take_snapshot()
+            samples.append(sample)
+
+            if flog is not None:
+                flog.write(json.dumps(sample)+'\n')
+                flog.flush()
+            if verbose:
+                print('# <runSoak>: plots: %d, rss: %.1f MB, objects: %d, time: %.1f s'
+                        %(ii, sample['rss']/1024.**2, sample['objects'],
+                            sample['time']))
+
+        result={'samples': samples}
+        after=[sii for sii in samples if sii['plots']>=n_warmup]
+        xs=[sii['plots'] for sii in after]
+        result['rss_per_plot']=getSlope(xs, [sii['rss'] for sii in after])
+        result['objects_per_plot']=getSlope(xs,
+                [sii['objects'] for sii in after])
+
+        if trace_memory and snapshot0 is not None:
+            snapshot1=tracemalloc.take_snapshot()
+            stats=snapshot1.compare_to(snapshot0, 'lineno')
+            result['top_growth']=[(str(sii.traceback), sii.size_diff,
+                sii.count_diff) for sii in stats[:ntop]]
+    finally:
+        if flog is not None:
+            flog.close()
+        if trace_memory:
+            tracemalloc.stop()
+
+    if verbose:
+        print('# <runSoak>: growth per plot after warmup: rss: %.1f KB, objects: %.1f'
+                %(result['rss_per_plot']/1024., result['objects_per_plot']))
+        for line, size, count in result.get('top_growth', []):
+            print('# <runSoak>: %10.1f KB %8d  %s' %(size/1024., count, line))
+
+    return result
+
+
+def main(argv=None):
+
+    parser=argparse.ArgumentParser(description='Memory soak test of gplot.')
+    parser.add_argument('-n', type=int, default=2000,
+            help='number of plots to render.')
+    parser.add_argument('--mode', default='context', choices=MODES)
+    parser.add_argument('--shape', type=int, nargs=2, default=[181, 360],
+            metavar=('NY', 'NX'), help='shape of the data.')
+    parser.add_argument('--geo', action='store_true',
+            help='plot geographical maps.')
+    parser.add_argument('--sample-every', type=int, default=100)
+    parser.add_argument('--keep', action='store_true',
+            help='keep the plot objs.')
+    parser.add_argument('--release', action='store_true',
+            help='release the data of the plot objs after rendering.')
+    parser.add_argument('--lean', action='store_true',
+            help='render with the lean parameter on.')
+    parser.add_argument('--tracemalloc', action='store_true',
+            help='report the source lines with the largest growth.')
+    parser.add_argument('--max-growth', type=float, default=None,
+            help='fail if the RSS grows more than this many KB per plot.')
+    parser.add_argument('-o', '--output', default=None,
+            help='json lines file to write the samples to.')
+    args=parser.parse_args(argv)
+
+    result=runSoak(n=args.n, mode=args.mode, shape=tuple(args.shape),
+            isgeomap=args.geo, sample_every=args.sample_every, keep=args.keep,
+            release=args.release, lean=args.lean, trace_memory=args.tracemalloc,
+            log_file=args.output)
+
+    if args.max_growth is not None and\
+            result['rss_per_plot']/1024.>args.max_growth:
+        print('# <main>: RSS grows %.1f KB per plot, more than %.1f KB.'
+                %(result['rss_per_plot']/1024., args.max_growth))
+        return 1
+
+    return 0
+
+if __name__=='__main__':
+
+    sys.exit(main())